@@ -0,0 +1,33 @@
+"""Add row versions for compare-and-set transitions
+
+Revision ID: 5b1f9c3e7a2d
+Revises: 027444fe1b1c
+Create Date: 2026-10-18 10:12:31.482913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1f9c3e7a2d'
+down_revision: Union[str, None] = '027444fe1b1c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('vehicles', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('drivers', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('trips', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    # Only mapped by the Page 5 service, which shares this database
+    op.add_column('maintenance_logs', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('maintenance_logs', 'version')
+    op.drop_column('trips', 'version')
+    op.drop_column('drivers', 'version')
+    op.drop_column('vehicles', 'version')
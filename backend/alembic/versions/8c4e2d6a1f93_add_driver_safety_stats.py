@@ -0,0 +1,42 @@
+"""Add driver safety stats and trip deadlines
+
+Revision ID: 8c4e2d6a1f93
+Revises: 5b1f9c3e7a2d
+Create Date: 2026-10-18 15:40:07.215634
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4e2d6a1f93'
+down_revision: Union[str, None] = '5b1f9c3e7a2d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('trips', sa.Column('due_at', sa.DateTime(), nullable=True))
+    op.create_table('driver_safety_stats',
+    sa.Column('driver_id', sa.Integer(), nullable=False),
+    sa.Column('completed_trips', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('cancelled_trips', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('late_trips', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('incidents', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('incident_cost', sa.Float(), server_default='0', nullable=False),
+    sa.Column('fines', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('fine_cost', sa.Float(), server_default='0', nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['driver_id'], ['drivers.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('driver_id')
+    )
+    # Existing scores were never computed; fill them in with:
+    #   python -m app.services.safety_score rebuild
+
+
+def downgrade() -> None:
+    op.drop_table('driver_safety_stats')
+    op.drop_column('trips', 'due_at')
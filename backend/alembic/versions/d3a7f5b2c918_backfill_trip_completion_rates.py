@@ -0,0 +1,32 @@
+"""Backfill stored trip completion rates
+
+Revision ID: d3a7f5b2c918
+Revises: 8c4e2d6a1f93
+Create Date: 2026-10-18 18:12:44.518903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3a7f5b2c918'
+down_revision: Union[str, None] = '8c4e2d6a1f93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The trip endpoints keep the rate current from now on; until here nothing did
+    op.execute("""
+        UPDATE drivers SET trip_completion_rate = COALESCE((
+            SELECT CAST(SUM(CASE WHEN trips.status = 'Completed' THEN 1 ELSE 0 END) AS FLOAT) * 100 / COUNT(trips.id)
+            FROM trips WHERE trips.driver_id = drivers.id
+        ), 100.0)
+    """)
+
+
+def downgrade() -> None:
+    # Data only; the rates stay as they are
+    pass
@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from fastapi.responses import Response
+from sqlalchemy import func, select, case, and_
+from fastapi.responses import Response, FileResponse
+from datetime import date, timedelta
 import csv
 import io
+import os
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.models.finance import MaintenanceLog, FuelLog, ExpenseLog
 from app.models.vehicle import Vehicle
 from app.models.trip import Trip
+from app.services.report_jobs import report_jobs, JobQueueFull, COMPLETED
 
 router = APIRouter()
 
@@ -38,52 +41,163 @@ def get_fleet_roi(db: Session = Depends(get_db)):
 
 @router.get("/fuel-efficiency")
 def get_fuel_efficiency(db: Session = Depends(get_db)):
-    # Fuel Efficiency: km / L. 
-    # Example approach: aggregate total fuel consumed / total km traveled
-    
-    # Get total fuel liters consumed
-    total_liters = db.query(func.sum(FuelLog.quantity_liters)).scalar() or 0.0
+    # Fuel Efficiency: km / L, fill-to-fill.
+    # Full-tank method: the liters bought at a fill were burned over the distance
+    # since the vehicle's previous fill, so each fill after the first one is a
+    # segment of (odometer_reading - previous odometer_reading) km.
+    # The previous reading comes from a LAG() window per vehicle and all totals
+    # (per vehicle, fleet, trailing 30 days) are summed in the same statement.
+    previous_odometer = func.lag(FuelLog.odometer_reading).over(
+        partition_by=FuelLog.vehicle_id,
+        order_by=(FuelLog.date, FuelLog.id)
+    )
+    segments = (
+        select(
+            FuelLog.vehicle_id,
+            FuelLog.date,
+            FuelLog.quantity_liters,
+            (FuelLog.odometer_reading - previous_odometer).label("distance")
+        )
+        .where(FuelLog.odometer_reading.isnot(None))
+        .subquery()
+    )
+
+    # Odometer resets / out-of-order readings do not form a usable segment
+    valid = segments.c.distance > 0
+    rolling = and_(valid, segments.c.date > date.today() - timedelta(days=30))
+
+    def total(condition, value):
+        return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+    distance = total(valid, segments.c.distance)
+    liters = total(valid, segments.c.quantity_liters)
+    rolling_distance = total(rolling, segments.c.distance)
+    rolling_liters = total(rolling, segments.c.quantity_liters)
+
+    rows = db.execute(
+        select(
+            segments.c.vehicle_id,
+            distance.label("distance"),
+            liters.label("liters"),
+            rolling_distance.label("rolling_distance"),
+            rolling_liters.label("rolling_liters"),
+            func.sum(distance).over().label("fleet_distance"),
+            func.sum(liters).over().label("fleet_liters"),
+            func.sum(rolling_distance).over().label("fleet_rolling_distance"),
+            func.sum(rolling_liters).over().label("fleet_rolling_liters")
+        )
+        .group_by(segments.c.vehicle_id)
+        .having(func.sum(case((valid, 1), else_=0)) > 0)
+        .order_by(segments.c.vehicle_id)
+    ).all()
+
+    def km_per_l(km, l):
+        return round(km / l, 2) if l else 0.0
+
+    fleet = rows[0] if rows else None
+    return {
+        "fuel_efficiency_km_per_l": km_per_l(fleet.fleet_distance, fleet.fleet_liters) if fleet else 0.0,
+        "rolling_30d_km_per_l": km_per_l(fleet.fleet_rolling_distance, fleet.fleet_rolling_liters) if fleet else 0.0,
+        "total_distance_km": round(fleet.fleet_distance, 2) if fleet else 0.0,
+        "total_fuel_liters": round(fleet.fleet_liters, 2) if fleet else 0.0,
+        "vehicles": [
+            {
+                "vehicle_id": row.vehicle_id,
+                "distance_km": round(row.distance, 2),
+                "fuel_liters": round(row.liters, 2),
+                "fuel_efficiency_km_per_l": km_per_l(row.distance, row.liters),
+                "rolling_30d_km_per_l": km_per_l(row.rolling_distance, row.rolling_liters)
+            }
+            for row in rows
+        ]
+    }
+
+
+EXPORT_FETCH_ROWS = 1000
+
+
+def _monthly_report_rows(db: Session):
+    # Plain column rows through a server-side cursor; no ORM objects kept around
+    yield ["Record Type", "Vehicle ID", "Cost/Value", "Date", "Details"]
     
-    if total_liters == 0:
-        return {"fuel_efficiency_km_per_l": 0.0}
-        
-    # Get total distance from completed trips where final odometer exists
-    # Simplified mock approach: sum of (final_odometer)
-    # Ideally should be difference between trip start and end odometers, 
-    # or just aggregated from final_odometer entries if starting at 0
-    total_dist = db.query(func.sum(Trip.final_odometer)).filter(Trip.final_odometer.isnot(None)).scalar() or 0.0
+    maintenance_logs = db.query(
+        MaintenanceLog.vehicle_id, MaintenanceLog.cost, MaintenanceLog.date, MaintenanceLog.service_type
+    ).order_by(MaintenanceLog.id)
+    for log in maintenance_logs.yield_per(EXPORT_FETCH_ROWS):
+        yield ["Maintenance", log.vehicle_id, log.cost, log.date.isoformat(), log.service_type]
     
-    if total_dist == 0:
-        return {"fuel_efficiency_km_per_l": 0.0}
-        
-    efficiency = total_dist / total_liters
-    return {"fuel_efficiency_km_per_l": round(efficiency, 2)}
+    fuel_logs = db.query(
+        FuelLog.vehicle_id, FuelLog.total_cost, FuelLog.date, FuelLog.quantity_liters
+    ).order_by(FuelLog.id)
+    for log in fuel_logs.yield_per(EXPORT_FETCH_ROWS):
+        yield ["Fuel", log.vehicle_id, log.total_cost, log.date.isoformat(), f"{log.quantity_liters}L"]
 
 
 @router.get("/export")
 def export_monthly_report(db: Session = Depends(get_db)):
     # Export One-click CSV/PDF for monthly payroll and health audits.
+    # For large fleets prefer POST /export/jobs, which builds the file in the background.
     
     output = io.StringIO()
     writer = csv.writer(output)
-    
-    # Headers
-    writer.writerow(["Record Type", "Vehicle ID", "Cost/Value", "Date", "Details"])
-    
-    # Maintenance logs
-    maintenance_logs = db.query(MaintenanceLog).all()
-    for log in maintenance_logs:
-        writer.writerow(["Maintenance", log.vehicle_id, log.cost, log.date.isoformat(), log.service_type])
-        
-    # Fuel logs
-    fuel_logs = db.query(FuelLog).all()
-    for log in fuel_logs:
-        writer.writerow(["Fuel", log.vehicle_id, log.total_cost, log.date.isoformat(), f"{log.quantity_liters}L"])
-        
-    output.seek(0)
+    writer.writerows(_monthly_report_rows(db))
     
     return Response(
         content=output.getvalue(),
         media_type="text/csv",
         headers={"Content-Disposition": "attachment; filename=monthly_fleet_report.csv"}
     )
+
+
+def _job_status(job):
+    return {
+        "job_id": job.id,
+        "report_type": job.report_type,
+        "status": job.status,
+        "reused": job.reused,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "download_url": f"/api/v1/analytics/export/jobs/{job.id}/download" if job.status == COMPLETED else None
+    }
+
+
+@router.post("/export/jobs", status_code=202)
+def submit_monthly_report_job():
+    # Build the monthly report on the background worker pool; poll the job, then download it.
+    
+    def write(artifact):
+        db = SessionLocal()
+        try:
+            csv.writer(artifact).writerows(_monthly_report_rows(db))
+        finally:
+            db.close()
+    
+    try:
+        job = report_jobs.submit("monthly_report", {}, "monthly_fleet_report.csv", write)
+    except JobQueueFull:
+        raise HTTPException(status_code=429, detail="Too many report jobs pending, retry later")
+    return _job_status(job)
+
+
+@router.get("/export/jobs/{job_id}")
+def get_monthly_report_job(job_id: str):
+    job = report_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return _job_status(job)
+
+
+@router.get("/export/jobs/{job_id}/download")
+def download_monthly_report_job(job_id: str):
+    job = report_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    if job.status != COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Report job is {job.status}")
+    
+    path = report_jobs.artifact_path(job)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Report artifact has been removed, submit the job again")
+    return FileResponse(path, media_type="text/csv", filename=job.filename)
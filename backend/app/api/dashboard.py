@@ -3,40 +3,90 @@ from sqlalchemy.orm import Session
 from typing import Optional
 
 from app.database import get_db
-from app.models.vehicle import Vehicle
-from app.models.trip import Trip
 from app.models.enums import VehicleStatus, VehicleType, TripStatus
-from app.schemas.dashboard import DashboardStats
+from app.schemas.dashboard import DashboardStats, VehicleTypeStats, FleetStateCounts
+from app.services.fleet_state import fleet_state
 
 router = APIRouter()
 
+
+def _utilization(active_fleet: int, total_active_vehicles: int) -> float:
+    if total_active_vehicles > 0:
+        return round((active_fleet / total_active_vehicles) * 100.0, 2)
+    return 0.0
+
+
+def _type_stats(vehicle_type, vehicles, trips) -> VehicleTypeStats:
+    active_fleet = vehicles[(vehicle_type, VehicleStatus.ON_TRIP)]
+    total_active_vehicles = active_fleet + vehicles[(vehicle_type, VehicleStatus.AVAILABLE)]
+    return VehicleTypeStats(
+        vehicle_type=vehicle_type,
+        active_fleet=active_fleet,
+        maintenance_alerts=vehicles[(vehicle_type, VehicleStatus.IN_SHOP)],
+        utilization_rate_percent=_utilization(active_fleet, total_active_vehicles),
+        pending_cargo=trips[(vehicle_type, TripStatus.DRAFT)]
+    )
+
+
 @router.get("/dashboard/stats", response_model=DashboardStats)
 def get_dashboard_stats(
     vehicle_type: Optional[VehicleType] = Query(None, description="Filter by vehicle type"),
     db: Session = Depends(get_db)
 ):
-    vehicle_query = db.query(Vehicle)
-    trip_query = db.query(Trip)
-
-    if vehicle_type:
-        vehicle_query = vehicle_query.filter(Vehicle.type == vehicle_type)
-        trip_query = trip_query.join(Vehicle).filter(Vehicle.type == vehicle_type)
+    # Answered from the in-memory fleet state counters; the database is only
+    # read the first time, to load them.
+    fleet_state.ensure_loaded(db)
+    vehicles, _, trips = fleet_state.snapshot()
 
-    active_fleet = vehicle_query.filter(Vehicle.status == VehicleStatus.ON_TRIP).count()
-    maintenance_alerts = vehicle_query.filter(Vehicle.status == VehicleStatus.IN_SHOP).count()
-    total_active_vehicles = vehicle_query.filter(
-        Vehicle.status.in_([VehicleStatus.AVAILABLE, VehicleStatus.ON_TRIP])
-    ).count()
+    by_vehicle_type = [
+        _type_stats(type_, vehicles, trips)
+        for type_ in ([vehicle_type] if vehicle_type else list(VehicleType))
+    ]
 
-    utilization_rate_percent = 0.0
-    if total_active_vehicles > 0:
-        utilization_rate_percent = (active_fleet / total_active_vehicles) * 100.0
-
-    pending_cargo = trip_query.filter(Trip.status == TripStatus.DRAFT).count()
+    if vehicle_type:
+        totals = by_vehicle_type[0]
+        active_fleet = totals.active_fleet
+        maintenance_alerts = totals.maintenance_alerts
+        total_active_vehicles = active_fleet + vehicles[(vehicle_type, VehicleStatus.AVAILABLE)]
+        pending_cargo = totals.pending_cargo
+    else:
+        # Summed over the counter keys so trips whose vehicle type is not known yet still count
+        active_fleet = sum(n for (_, status), n in vehicles.items() if status == VehicleStatus.ON_TRIP)
+        maintenance_alerts = sum(n for (_, status), n in vehicles.items() if status == VehicleStatus.IN_SHOP)
+        total_active_vehicles = active_fleet + sum(
+            n for (_, status), n in vehicles.items() if status == VehicleStatus.AVAILABLE
+        )
+        pending_cargo = sum(n for (_, status), n in trips.items() if status == TripStatus.DRAFT)
 
     return DashboardStats(
         active_fleet=active_fleet,
         maintenance_alerts=maintenance_alerts,
-        utilization_rate_percent=round(utilization_rate_percent, 2),
-        pending_cargo=pending_cargo
+        utilization_rate_percent=_utilization(active_fleet, total_active_vehicles),
+        pending_cargo=pending_cargo,
+        by_vehicle_type=by_vehicle_type
+    )
+
+
+@router.get("/dashboard/fleet-state", response_model=FleetStateCounts)
+def get_fleet_state(db: Session = Depends(get_db)):
+    fleet_state.ensure_loaded(db)
+    vehicles, drivers, trips = fleet_state.snapshot()
+
+    def label(value):
+        return value.value if value is not None else "unknown"
+
+    vehicle_counts, trip_counts = {}, {}
+    for (type_, status), n in vehicles.items():
+        if n:
+            vehicle_counts.setdefault(label(type_), {})[label(status)] = n
+    for (type_, status), n in trips.items():
+        if n:
+            trip_counts.setdefault(label(type_), {})[label(status)] = n
+
+    return FleetStateCounts(
+        vehicles=vehicle_counts,
+        drivers={label(status): n for status, n in drivers.items() if n},
+        trips=trip_counts,
+        last_reconciled_at=fleet_state.last_reconciled_at,
+        reconcile_drift=fleet_state.reconcile_drift
     )
@@ -1,75 +1,105 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import case, update
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 from app.database import get_db
 from app.models.trip import Trip
 from app.models.vehicle import Vehicle
 from app.models.driver import Driver
-from app.schemas.trip import TripResponse, TripCreate
+from app.schemas.trip import (
+    TripResponse, TripCreate, TripBatchCreate, TripBatchDispatch, TripBatchComplete,
+    TripBatchItemResult, TripBatchResult,
+)
 from app.models.enums import TripStatus, VehicleStatus, DriverStatus
+from app.services.driver_stats import refresh_completion_rates
+from app.services.fleet_state import stage_trip_transition, stage_vehicle_transition
+from app.services.safety_score import record_trip_outcomes
 
 router = APIRouter()
 
-@router.post("/trips/", response_model=TripResponse, status_code=status.HTTP_201_CREATED)
-def create_trip(trip: TripCreate, db: Session = Depends(get_db)):
+def _trip_create_error(trip: TripCreate, vehicle, driver) -> Optional[Tuple[int, str]]:
+    """(status code, detail) that rejects a new trip, or None if it can be created"""
     # Validate Vehicle
-    vehicle = db.query(Vehicle).filter(Vehicle.id == trip.vehicle_id).first()
     if not vehicle:
-        raise HTTPException(status_code=404, detail="Vehicle not found")
+        return 404, "Vehicle not found"
         
     if vehicle.status != VehicleStatus.AVAILABLE:
-        raise HTTPException(status_code=400, detail=f"Vehicle is not available. Status: {vehicle.status.value}")
+        return 400, f"Vehicle is not available. Status: {vehicle.status.value}"
         
     # Validation Rule: Cargo Weight
     if trip.cargo_weight > vehicle.max_capacity:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Cargo weight ({trip.cargo_weight}) exceeds vehicle capacity ({vehicle.max_capacity})"
-        )
+        return 400, f"Cargo weight ({trip.cargo_weight}) exceeds vehicle capacity ({vehicle.max_capacity})"
 
     # Validate Driver
-    driver = db.query(Driver).filter(Driver.id == trip.driver_id).first()
     if not driver:
-        raise HTTPException(status_code=404, detail="Driver not found")
+        return 404, "Driver not found"
         
     if driver.status != DriverStatus.ON_DUTY:
-        raise HTTPException(status_code=400, detail=f"Driver is not on duty. Status: {driver.status.value}")
+        return 400, f"Driver is not on duty. Status: {driver.status.value}"
+
+    return None
+
+@router.post("/trips/", response_model=TripResponse, status_code=status.HTTP_201_CREATED)
+def create_trip(trip: TripCreate, db: Session = Depends(get_db)):
+    vehicle = db.query(Vehicle).filter(Vehicle.id == trip.vehicle_id).first()
+    driver = db.query(Driver).filter(Driver.id == trip.driver_id).first()
+    error = _trip_create_error(trip, vehicle, driver)
+    if error:
+        raise HTTPException(status_code=error[0], detail=error[1])
 
     # Create Draft Trip
     new_trip = Trip(**trip.model_dump())
     db.add(new_trip)
+    db.flush()
+    refresh_completion_rates(db, [new_trip.driver_id])
     db.commit()
     db.refresh(new_trip)
     
     return new_trip
 
+def _transition_conflict(db: Session, trip_id: int, detail: str):
+    """Why a compare-and-set on a trip matched nothing: missing (404) or moved on (409)"""
+    current = db.query(Trip.status).filter(Trip.id == trip_id).scalar()
+    if current is None:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    raise HTTPException(status_code=409, detail=f"{detail}. Status: {current.value}")
+
+
+# Transitions are conditional UPDATEs: each row only changes if it is still in
+# the status the transition expects, so of two concurrent requests exactly one
+# wins and the other gets a 409 instead of double-dispatching a vehicle.
+
 @router.post("/trips/{trip_id}/dispatch", response_model=TripResponse)
 def dispatch_trip(trip_id: int, db: Session = Depends(get_db)):
-    trip = db.query(Trip).filter(Trip.id == trip_id).first()
-    if not trip:
-        raise HTTPException(status_code=404, detail="Trip not found")
-        
-    if trip.status != TripStatus.DRAFT:
-        raise HTTPException(status_code=400, detail="Only DRAFT trips can be dispatched")
-        
-    # Update Statuses
-    trip.status = TripStatus.DISPATCHED
-    
-    vehicle = db.query(Vehicle).filter(Vehicle.id == trip.vehicle_id).first()
-    if vehicle.status != VehicleStatus.AVAILABLE:
-        raise HTTPException(status_code=400, detail="Vehicle is no longer available")
-    vehicle.status = VehicleStatus.ON_TRIP
-    
-    # Ideally update driver status as well to ON_TRIP
-    if trip.driver_id:
-        driver = db.query(Driver).filter(Driver.id == trip.driver_id).first()
-        if driver:
-            driver.status = DriverStatus.ON_TRIP
+    trip = db.execute(
+        update(Trip)
+        .where(Trip.id == trip_id, Trip.status == TripStatus.DRAFT)
+        .values(status=TripStatus.DISPATCHED, version=Trip.version + 1)
+        .returning(Trip)
+    ).scalar_one_or_none()
+    if trip is None:
+        _transition_conflict(db, trip_id, "Only DRAFT trips can be dispatched")
+
+    vehicle_type = db.execute(
+        update(Vehicle)
+        .where(Vehicle.id == trip.vehicle_id, Vehicle.status == VehicleStatus.AVAILABLE)
+        .values(status=VehicleStatus.ON_TRIP, version=Vehicle.version + 1)
+        .returning(Vehicle.type)
+    ).scalar_one_or_none()
+    if vehicle_type is None:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Vehicle is no longer available")
 
+    # The shared driverstatus enum has no "On Trip" value, so the driver
+    # stays On Duty while dispatched (as on Page 4).
+
+    stage_trip_transition(db, trip.vehicle_id, TripStatus.DRAFT, TripStatus.DISPATCHED)
+    stage_vehicle_transition(db, vehicle_type, VehicleStatus.AVAILABLE, VehicleStatus.ON_TRIP)
+    # Serialized before commit expires the instance, saving a reload
+    response = TripResponse.model_validate(trip)
     db.commit()
-    db.refresh(trip)
-    return trip
+    return response
 
 
 from datetime import datetime
@@ -77,29 +107,250 @@ from app.schemas.trip import TripComplete
 
 @router.post("/trips/{trip_id}/complete", response_model=TripResponse)
 def complete_trip(trip_id: int, completion_data: TripComplete, db: Session = Depends(get_db)):
-    trip = db.query(Trip).filter(Trip.id == trip_id).first()
-    if not trip:
+    trip = db.execute(
+        update(Trip)
+        .where(Trip.id == trip_id, Trip.status == TripStatus.DISPATCHED)
+        .values(
+            status=TripStatus.COMPLETED,
+            final_odometer=completion_data.final_odometer,
+            completed_at=datetime.utcnow(),
+            version=Trip.version + 1,
+        )
+        .returning(Trip)
+    ).scalar_one_or_none()
+    if trip is None:
+        _transition_conflict(db, trip_id, "Only DISPATCHED trips can be completed")
+
+    # Release the vehicle only if this trip still has it on the road; a vehicle
+    # that was moved to another status meanwhile is left alone.
+    # Could also log final odometer to vehicle if we add that field later
+    vehicle_type = db.execute(
+        update(Vehicle)
+        .where(Vehicle.id == trip.vehicle_id, Vehicle.status == VehicleStatus.ON_TRIP)
+        .values(status=VehicleStatus.AVAILABLE, version=Vehicle.version + 1)
+        .returning(Vehicle.type)
+    ).scalar_one_or_none()
+
+    # Drivers stay On Duty for the whole trip, so there is nothing to revert;
+    # resetting them here would clear a suspension issued mid-trip.
+
+    stage_trip_transition(db, trip.vehicle_id, TripStatus.DISPATCHED, TripStatus.COMPLETED)
+    if vehicle_type is not None:
+        stage_vehicle_transition(db, vehicle_type, VehicleStatus.ON_TRIP, VehicleStatus.AVAILABLE)
+    record_trip_outcomes(db, [trip])
+    refresh_completion_rates(db, [trip.driver_id])
+    response = TripResponse.model_validate(trip)
+    db.commit()
+    return response
+
+
+@router.post("/trips/{trip_id}/cancel", response_model=TripResponse)
+def cancel_trip(trip_id: int, db: Session = Depends(get_db)):
+    current = db.query(Trip.status).filter(Trip.id == trip_id).scalar()
+    if current is None:
         raise HTTPException(status_code=404, detail="Trip not found")
-        
-    if trip.status != TripStatus.DISPATCHED:
-        raise HTTPException(status_code=400, detail="Only DISPATCHED trips can be completed")
-        
-    trip.status = TripStatus.COMPLETED
-    trip.final_odometer = completion_data.final_odometer
-    trip.completed_at = datetime.utcnow()
-    
-    # Revert vehicle back to available
-    vehicle = db.query(Vehicle).filter(Vehicle.id == trip.vehicle_id).first()
-    if vehicle:
-        vehicle.status = VehicleStatus.AVAILABLE
-        # Could also log final odometer to vehicle if we add that field later
+    if current not in (TripStatus.DRAFT, TripStatus.DISPATCHED):
+        raise HTTPException(status_code=409, detail=f"Only DRAFT or DISPATCHED trips can be cancelled. Status: {current.value}")
+
+    trip = db.execute(
+        update(Trip)
+        .where(Trip.id == trip_id, Trip.status == current)
+        .values(status=TripStatus.CANCELLED, version=Trip.version + 1)
+        .returning(Trip)
+    ).scalar_one_or_none()
+    if trip is None:
+        _transition_conflict(db, trip_id, "Trip changed status while being cancelled")
+
+    # Same rule as complete_trip: only a vehicle still On Trip is released
+    vehicle_type = None
+    if current == TripStatus.DISPATCHED:
+        vehicle_type = db.execute(
+            update(Vehicle)
+            .where(Vehicle.id == trip.vehicle_id, Vehicle.status == VehicleStatus.ON_TRIP)
+            .values(status=VehicleStatus.AVAILABLE, version=Vehicle.version + 1)
+            .returning(Vehicle.type)
+        ).scalar_one_or_none()
+
+    stage_trip_transition(db, trip.vehicle_id, current, TripStatus.CANCELLED)
+    if vehicle_type is not None:
+        stage_vehicle_transition(db, vehicle_type, VehicleStatus.ON_TRIP, VehicleStatus.AVAILABLE)
+    record_trip_outcomes(db, [trip])
+    refresh_completion_rates(db, [trip.driver_id])
+    response = TripResponse.model_validate(trip)
+    db.commit()
+    return response
+
+
+# ----------------- #
+#  Batch endpoints
+# ----------------- #
+
+def _batch_result(size: int, outcomes: Dict[int, object], success_code: int = 200) -> TripBatchResult:
+    """outcomes maps request index -> Trip on success or (status code, detail)"""
+    results = []
+    for index in range(size):
+        outcome = outcomes[index]
+        if isinstance(outcome, tuple):
+            results.append(TripBatchItemResult(index=index, status_code=outcome[0], detail=outcome[1]))
+        else:
+            results.append(TripBatchItemResult(index=index, status_code=success_code, trip=TripResponse.model_validate(outcome)))
+    succeeded = sum(1 for result in results if result.trip is not None)
+    return TripBatchResult(succeeded=succeeded, failed=size - succeeded, results=results)
+
+@router.post("/trips/batch", response_model=TripBatchResult)
+def create_trips_batch(batch: TripBatchCreate, db: Session = Depends(get_db)):
+    """Create many draft trips in one transaction; invalid items are reported, not fatal"""
+    vehicle_ids = {item.vehicle_id for item in batch.trips}
+    driver_ids = {item.driver_id for item in batch.trips}
+    vehicles = {
+        row.id: row
+        for row in db.query(Vehicle.id, Vehicle.status, Vehicle.max_capacity).filter(Vehicle.id.in_(vehicle_ids))
+    }
+    drivers = {row.id: row for row in db.query(Driver.id, Driver.status).filter(Driver.id.in_(driver_ids))}
+
+    outcomes = {}
+    for index, item in enumerate(batch.trips):
+        error = _trip_create_error(item, vehicles.get(item.vehicle_id), drivers.get(item.driver_id))
+        outcomes[index] = error or Trip(**item.model_dump())
+
+    new_trips = [outcome for outcome in outcomes.values() if isinstance(outcome, Trip)]
+    if new_trips:
+        db.add_all(new_trips)
+        db.flush()
+        refresh_completion_rates(db, (trip.driver_id for trip in new_trips))
+    result = _batch_result(len(batch.trips), outcomes, success_code=status.HTTP_201_CREATED)
+    db.commit()
+    return result
+
+@router.post("/trips/batch-dispatch", response_model=TripBatchResult)
+def dispatch_trips_batch(batch: TripBatchDispatch, db: Session = Depends(get_db)):
+    """Dispatch many DRAFT trips with one conditional UPDATE per table"""
+    trips = {
+        row.id: row
+        for row in db.query(Trip.id, Trip.vehicle_id, Trip.status).filter(Trip.id.in_(batch.trip_ids))
+    }
+
+    outcomes = {}
+    candidates = {}  # index -> trip row, at most one per vehicle
+    wanted_vehicles = set()
+    seen = set()
+    for index, trip_id in enumerate(batch.trip_ids):
+        row = trips.get(trip_id)
+        if trip_id in seen:
+            outcomes[index] = (409, "Trip appears more than once in the batch")
+        elif row is None:
+            outcomes[index] = (404, "Trip not found")
+        elif row.status != TripStatus.DRAFT:
+            outcomes[index] = (409, f"Only DRAFT trips can be dispatched. Status: {row.status.value}")
+        elif row.vehicle_id in wanted_vehicles:
+            outcomes[index] = (409, "Vehicle is already dispatched by another trip in this batch")
+        else:
+            candidates[index] = row
+            wanted_vehicles.add(row.vehicle_id)
+        seen.add(trip_id)
+
+    claimed = {}
+    if candidates:
+        claimed = dict(db.execute(
+            update(Vehicle)
+            .where(Vehicle.id.in_(wanted_vehicles), Vehicle.status == VehicleStatus.AVAILABLE)
+            .values(status=VehicleStatus.ON_TRIP, version=Vehicle.version + 1)
+            .returning(Vehicle.id, Vehicle.type)
+        ).all())
+
+    dispatchable = [row.id for row in candidates.values() if row.vehicle_id in claimed]
+    dispatched = {}
+    if dispatchable:
+        dispatched = {
+            trip.id: trip
+            for trip in db.execute(
+                update(Trip)
+                .where(Trip.id.in_(dispatchable), Trip.status == TripStatus.DRAFT)
+                .values(status=TripStatus.DISPATCHED, version=Trip.version + 1)
+                .returning(Trip)
+            ).scalars()
+        }
+
+    # A trip that moved on after it was read must not keep its vehicle on the road
+    stale = [row.vehicle_id for row in candidates.values() if row.vehicle_id in claimed and row.id not in dispatched]
+    if stale:
+        db.execute(
+            update(Vehicle)
+            .where(Vehicle.id.in_(stale))
+            .values(status=VehicleStatus.AVAILABLE, version=Vehicle.version + 1)
+        )
+        for vehicle_id in stale:
+            del claimed[vehicle_id]
+
+    for index, row in candidates.items():
+        if row.id in dispatched:
+            outcomes[index] = dispatched[row.id]
+            stage_trip_transition(db, row.vehicle_id, TripStatus.DRAFT, TripStatus.DISPATCHED)
+        elif row.vehicle_id in stale:
+            outcomes[index] = (409, "Trip changed status while being dispatched")
+        else:
+            outcomes[index] = (409, "Vehicle is no longer available")
+    for vehicle_type in claimed.values():
+        stage_vehicle_transition(db, vehicle_type, VehicleStatus.AVAILABLE, VehicleStatus.ON_TRIP)
+
+    result = _batch_result(len(batch.trip_ids), outcomes)
+    db.commit()
+    return result
+
+@router.post("/trips/batch-complete", response_model=TripBatchResult)
+def complete_trips_batch(batch: TripBatchComplete, db: Session = Depends(get_db)):
+    """Complete many DISPATCHED trips and release their vehicles, one UPDATE per table"""
+    odometers = {}
+    for item in batch.trips:
+        odometers.setdefault(item.trip_id, item.final_odometer)
+
+    completed = {
+        trip.id: trip
+        for trip in db.execute(
+            update(Trip)
+            .where(Trip.id.in_(odometers), Trip.status == TripStatus.DISPATCHED)
+            .values(
+                status=TripStatus.COMPLETED,
+                final_odometer=case(odometers, value=Trip.id),
+                completed_at=datetime.utcnow(),
+                version=Trip.version + 1,
+            )
+            .returning(Trip)
+        ).scalars()
+    }
+
+    if completed:
+        # Same rule as complete_trip: only vehicles still On Trip are released
+        released = db.execute(
+            update(Vehicle)
+            .where(Vehicle.id.in_({trip.vehicle_id for trip in completed.values()}),
+                   Vehicle.status == VehicleStatus.ON_TRIP)
+            .values(status=VehicleStatus.AVAILABLE, version=Vehicle.version + 1)
+            .returning(Vehicle.type)
+        ).scalars().all()
+        for vehicle_type in released:
+            stage_vehicle_transition(db, vehicle_type, VehicleStatus.ON_TRIP, VehicleStatus.AVAILABLE)
+        for trip in completed.values():
+            stage_trip_transition(db, trip.vehicle_id, TripStatus.DISPATCHED, TripStatus.COMPLETED)
+        record_trip_outcomes(db, completed.values())
+        refresh_completion_rates(db, (trip.driver_id for trip in completed.values()))
+
+    missed = [trip_id for trip_id in odometers if trip_id not in completed]
+    statuses = dict(db.query(Trip.id, Trip.status).filter(Trip.id.in_(missed)).all()) if missed else {}
 
-    # Revert driver back to on_duty
-    if trip.driver_id:
-        driver = db.query(Driver).filter(Driver.id == trip.driver_id).first()
-        if driver:
-            driver.status = DriverStatus.ON_DUTY
+    outcomes = {}
+    seen = set()
+    for index, item in enumerate(batch.trips):
+        if item.trip_id in seen:
+            outcomes[index] = (409, "Trip appears more than once in the batch")
+        elif item.trip_id in completed:
+            outcomes[index] = completed[item.trip_id]
+        elif item.trip_id not in statuses:
+            outcomes[index] = (404, "Trip not found")
+        else:
+            outcomes[index] = (409, f"Only DISPATCHED trips can be completed. Status: {statuses[item.trip_id].value}")
+        seen.add(item.trip_id)
 
+    result = _batch_result(len(batch.trips), outcomes)
     db.commit()
-    db.refresh(trip)
-    return trip
+    return result
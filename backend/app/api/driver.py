@@ -29,26 +29,14 @@ def create_driver(driver: DriverCreate, db: Session = Depends(get_db)):
 
 @router.get("/", response_model=List[DriverResponse])
 def read_drivers(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    drivers = db.query(Driver).offset(skip).limit(limit).all()
-    # Auto-suspend drivers with expired licenses on read
-    for driver in drivers:
-        if driver.license_expiry_date < date.today() and driver.status != DriverStatus.SUSPENDED:
-            driver.status = DriverStatus.SUSPENDED
-            db.commit()
-            db.refresh(driver)
-    return drivers
+    # Expired licenses are suspended by the license expiry job, not on read
+    return db.query(Driver).offset(skip).limit(limit).all()
 
 @router.get("/{driver_id}", response_model=DriverResponse)
 def read_driver(driver_id: int, db: Session = Depends(get_db)):
     driver = db.query(Driver).filter(Driver.id == driver_id).first()
     if driver is None:
         raise HTTPException(status_code=404, detail="Driver not found")
-        
-    if driver.license_expiry_date < date.today() and driver.status != DriverStatus.SUSPENDED:
-        driver.status = DriverStatus.SUSPENDED
-        db.commit()
-        db.refresh(driver)
-        
     return driver
 
 @router.patch("/{driver_id}/status", response_model=DriverResponse)
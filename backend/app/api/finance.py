@@ -6,6 +6,7 @@ from app.database import get_db
 from app.models.finance import ExpenseLog, FuelLog
 from app.models.vehicle import Vehicle
 from app.models.trip import Trip
+from app.services.safety_score import record_expense
 from app.schemas.finance import ExpenseLogResponse, ExpenseLogCreate, FuelLogResponse, FuelLogCreate
 
 router = APIRouter()
@@ -15,6 +16,7 @@ def create_expense_log(expense: ExpenseLogCreate, db: Session = Depends(get_db))
     vehicle = db.query(Vehicle).filter(Vehicle.id == expense.vehicle_id).first()
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
+    trip = None
     if expense.trip_id:
         trip = db.query(Trip).filter(Trip.id == expense.trip_id).first()
         if not trip:
@@ -22,6 +24,9 @@ def create_expense_log(expense: ExpenseLogCreate, db: Session = Depends(get_db))
 
     new_expense = ExpenseLog(**expense.model_dump())
     db.add(new_expense)
+    # Incidents and fines on a trip count against its driver's safety score
+    if trip:
+        record_expense(db, trip.driver_id, new_expense.expense_type, new_expense.cost)
     db.commit()
     db.refresh(new_expense)
     return new_expense
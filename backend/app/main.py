@@ -1,6 +1,9 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import api_router
+from app.services.report_jobs import report_jobs
+from app.services.fleet_state import fleet_state_reconciler
+from app.services.license_expiry import license_expiry_scheduler
 
 app = FastAPI(title="FleetFlow - Unified Operations Backend", version="1.0.0")
 
@@ -17,3 +20,16 @@ app.include_router(api_router, prefix="/api/v1")
 @app.get("/health")
 def health_check():
     return {"status": "ok", "service": "fleetflow-monolith"}
+
+
+@app.on_event("startup")
+def on_startup():
+    fleet_state_reconciler.start()
+    license_expiry_scheduler.start()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    fleet_state_reconciler.stop()
+    license_expiry_scheduler.stop()
+    report_jobs.shutdown()
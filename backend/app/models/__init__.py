@@ -1,6 +1,6 @@
 from .enums import VehicleType, VehicleStatus, TripStatus, DriverStatus, FuelType, UserRole
 from .user import User
 from .vehicle import Vehicle
-from .driver import Driver
+from .driver import Driver, DriverSafetyStats
 from .trip import Trip
 from .finance import MaintenanceLog, ExpenseLog, FuelLog
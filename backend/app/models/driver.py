@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, Enum, Date
+from sqlalchemy import Column, Integer, String, Float, Enum, Date, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
+from datetime import datetime
 from app.database import Base
 from app.models.enums import DriverStatus
 
@@ -21,5 +22,29 @@ class Driver(Base):
         default=DriverStatus.ON_DUTY
     )
 
+    # Bumped on every write; state transitions compare-and-set against status
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
+
     # Relationships
     trips = relationship("Trip", back_populates="driver")
+    safety_stats = relationship("DriverSafetyStats", uselist=False, back_populates="driver")
+
+
+class DriverSafetyStats(Base):
+    """Page 7: running aggregates behind Driver.performance_score (see app.services.safety_score)"""
+    __tablename__ = "driver_safety_stats"
+
+    driver_id = Column(Integer, ForeignKey("drivers.id", ondelete="CASCADE"), primary_key=True)
+
+    completed_trips = Column(Integer, nullable=False, default=0, server_default="0")
+    cancelled_trips = Column(Integer, nullable=False, default=0, server_default="0")
+    late_trips = Column(Integer, nullable=False, default=0, server_default="0")  # completed after due_at
+    incidents = Column(Integer, nullable=False, default=0, server_default="0")
+    incident_cost = Column(Float, nullable=False, default=0.0, server_default="0")
+    fines = Column(Integer, nullable=False, default=0, server_default="0")
+    fine_cost = Column(Float, nullable=False, default=0.0, server_default="0")
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    driver = relationship("Driver", back_populates="safety_stats")
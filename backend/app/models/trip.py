@@ -24,8 +24,13 @@ class Trip(Base):
         default=TripStatus.DRAFT
     )
     
+    # Bumped on every write; state transitions compare-and-set against status
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
+
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow)
+    due_at = Column(DateTime, nullable=True)  # Completing after this counts as a late finish
     completed_at = Column(DateTime, nullable=True)
 
     # Relationships
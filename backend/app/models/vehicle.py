@@ -40,6 +40,10 @@ class Vehicle(Base):
         default=VehicleStatus.AVAILABLE
     )
 
+    # Bumped on every write; state transitions compare-and-set against status
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
+
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
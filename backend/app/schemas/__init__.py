@@ -1,4 +1,4 @@
 from .vehicle import VehicleCreate, VehicleResponse, VehicleBase
 from .driver import DriverCreate, DriverResponse, DriverBase
 from .trip import TripCreate, TripResponse, TripBase
-from .dashboard import DashboardStats
+from .dashboard import DashboardStats, VehicleTypeStats, FleetStateCounts
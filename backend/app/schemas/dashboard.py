@@ -1,7 +1,25 @@
 from pydantic import BaseModel
+from typing import Dict, List, Optional
+from datetime import datetime
+from app.models.enums import VehicleType
+
+class VehicleTypeStats(BaseModel):
+    vehicle_type: VehicleType
+    active_fleet: int
+    maintenance_alerts: int
+    utilization_rate_percent: float
+    pending_cargo: int
 
 class DashboardStats(BaseModel):
     active_fleet: int
     maintenance_alerts: int
     utilization_rate_percent: float
     pending_cargo: int
+    by_vehicle_type: List[VehicleTypeStats] = []
+
+class FleetStateCounts(BaseModel):
+    vehicles: Dict[str, Dict[str, int]]  # vehicle type -> status -> count
+    drivers: Dict[str, int]
+    trips: Dict[str, Dict[str, int]]     # vehicle type -> trip status -> count
+    last_reconciled_at: Optional[datetime] = None
+    reconcile_drift: int
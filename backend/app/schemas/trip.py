@@ -1,7 +1,7 @@
-from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import List, Optional
 from app.models.enums import TripStatus
-from datetime import datetime
+from datetime import datetime, timezone
 
 class TripBase(BaseModel):
     vehicle_id: int
@@ -9,6 +9,15 @@ class TripBase(BaseModel):
     cargo_weight: float
     start_location: Optional[str] = None
     end_location: Optional[str] = None
+    due_at: Optional[datetime] = None  # Deadline; finishing later lowers the driver's safety score
+
+    @field_validator("due_at")
+    @classmethod
+    def _due_at_as_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        # Stored naive in UTC, like created_at and completed_at
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
 
 class TripCreate(TripBase):
     pass
@@ -24,3 +33,31 @@ class TripResponse(TripBase):
 
 class TripComplete(BaseModel):
     final_odometer: float
+
+
+# Batch endpoints: every item succeeds or fails on its own
+
+MAX_TRIP_BATCH = 1000
+
+class TripBatchCreate(BaseModel):
+    trips: List[TripCreate] = Field(..., min_length=1, max_length=MAX_TRIP_BATCH)
+
+class TripBatchDispatch(BaseModel):
+    trip_ids: List[int] = Field(..., min_length=1, max_length=MAX_TRIP_BATCH)
+
+class TripBatchCompleteItem(TripComplete):
+    trip_id: int
+
+class TripBatchComplete(BaseModel):
+    trips: List[TripBatchCompleteItem] = Field(..., min_length=1, max_length=MAX_TRIP_BATCH)
+
+class TripBatchItemResult(BaseModel):
+    index: int                  # position in the request
+    status_code: int            # what the single-trip endpoint would have answered
+    trip: Optional[TripResponse] = None
+    detail: Optional[str] = None
+
+class TripBatchResult(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[TripBatchItemResult]
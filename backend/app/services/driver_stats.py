@@ -0,0 +1,39 @@
+"""
+Stored driver trip statistics.
+
+drivers.trip_completion_rate is completed trips / all trips of the driver, in
+% (100 for a driver without trips). The endpoints that create trips or move
+them to Completed or Cancelled call refresh_completion_rates() for the drivers
+involved, so the rate changes in the same transaction as the trips. It is one
+set-based UPDATE over a grouped subquery, however many drivers a batch
+touches.
+
+Page 7 computes the same rate for its roster and can recompute every stored
+rate (python -m app.services.driver_stats refresh, from its backend/).
+"""
+from typing import Iterable
+
+from sqlalchemy import Float, case, cast, func, select, update
+from sqlalchemy.orm import Session
+
+from app.models.driver import Driver
+from app.models.trip import Trip
+from app.models.enums import TripStatus
+
+NO_TRIPS_RATE = 100.0
+
+
+def refresh_completion_rates(db: Session, driver_ids: Iterable[int]) -> int:
+    """Recompute the stored rates of the given drivers with one UPDATE"""
+    driver_ids = sorted(set(driver_ids))
+    if not driver_ids:
+        return 0
+    rate = select(
+        cast(func.sum(case((Trip.status == TripStatus.COMPLETED, 1), else_=0)), Float) * 100 / func.count(Trip.id)
+    ).where(Trip.driver_id == Driver.id).scalar_subquery()
+    return db.execute(
+        update(Driver)
+        .where(Driver.id.in_(driver_ids))
+        .values(trip_completion_rate=func.coalesce(rate, NO_TRIPS_RATE), version=Driver.version + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
@@ -0,0 +1,293 @@
+"""
+In-memory fleet state counters for the Command Center.
+
+Keeps vehicles by (type, status), drivers by status and trips by (vehicle
+type, status) so `/dashboard/stats` can answer without touching the
+database. Every status transition (dispatch, completion, maintenance,
+out-of-service toggles, driver status changes, creations and deletions)
+is picked up from the ORM flush: the deltas are staged on the session and
+applied only when the transaction commits, so rolled-back changes never
+reach the counters.
+
+A background thread reconciles the counters against the database every
+FLEET_STATE_RECONCILE_SECONDS. That also bounds how long this process can
+miss writes made by other workers or by bulk statements that bypass the ORM.
+
+A commit that lands while a reconcile is reading may or may not be in what
+it read, so its delta can be neither applied nor dropped safely. Each
+reconcile bumps an epoch under the counters' lock when it starts reading and
+again when it swaps the counters in, so the epoch is odd during the read.
+Every commit notes the epoch before it commits. A delta whose epoch changed
+by the time it is applied, or was odd, is discarded, and another reconcile
+runs right away. That one starts after those commits, so it reads them.
+"""
+import logging
+import os
+import threading
+from collections import Counter
+from datetime import datetime
+from itertools import chain
+from typing import Dict, Optional
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.vehicle import Vehicle
+from app.models.driver import Driver
+from app.models.trip import Trip
+
+FLEET_STATE_RECONCILE_SECONDS = float(os.getenv("FLEET_STATE_RECONCILE_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+
+
+class FleetState:
+    def __init__(self):
+        self.vehicles: Counter = Counter()  # (VehicleType, VehicleStatus) -> count
+        self.drivers: Counter = Counter()   # DriverStatus -> count
+        self.trips: Counter = Counter()     # (VehicleType, TripStatus) -> count
+        self.vehicle_types: Dict[int, object] = {}  # vehicle id -> VehicleType, to place trips
+        self.last_reconciled_at: Optional[datetime] = None
+        self.reconcile_drift = 0
+        self.resync = threading.Event()  # set when a delta was discarded
+        self._epoch = 0  # odd while a reconcile is reading the database
+        self._lock = threading.Lock()
+        self._reconcile_lock = threading.Lock()  # one reconcile at a time keeps the epoch meaningful
+
+    @property
+    def loaded(self) -> bool:
+        return self.last_reconciled_at is not None
+
+    def snapshot(self):
+        """Consistent copies of the counters"""
+        with self._lock:
+            return Counter(self.vehicles), Counter(self.drivers), Counter(self.trips)
+
+    def epoch(self) -> int:
+        with self._lock:
+            return self._epoch
+
+    def apply(self, delta: "FleetStateDelta", epoch: Optional[int]) -> bool:
+        """Apply a committed delta unless a reconcile overlapped its commit"""
+        with self._lock:
+            if epoch != self._epoch or self._epoch % 2:
+                self.resync.set()
+                return False
+            self.vehicles.update(delta.vehicles)
+            self.drivers.update(delta.drivers)
+            self.trips.update(delta.trips)
+            for vehicle_id, vehicle_type in delta.vehicle_types.items():
+                if vehicle_type is None:
+                    self.vehicle_types.pop(vehicle_id, None)
+                else:
+                    self.vehicle_types[vehicle_id] = vehicle_type
+            return True
+
+    def vehicle_type(self, vehicle_id, pending: "FleetStateDelta"):
+        if vehicle_id in pending.vehicle_types:
+            return pending.vehicle_types[vehicle_id]
+        with self._lock:
+            return self.vehicle_types.get(vehicle_id)
+
+    def reconcile(self, db: Session) -> int:
+        """Reload every counter from the database; returns how far off they were"""
+        with self._reconcile_lock:
+            return self._reconcile(db)
+
+    def _reconcile(self, db: Session) -> int:
+        with self._lock:
+            self._epoch += 1
+        try:
+            vehicle_rows = db.query(Vehicle.id, Vehicle.type, Vehicle.status).all()
+            vehicle_types = {row.id: row.type for row in vehicle_rows}
+            vehicles = Counter((row.type, row.status) for row in vehicle_rows)
+            drivers = Counter({
+                status: count
+                for status, count in db.query(Driver.status, func.count()).group_by(Driver.status)
+            })
+            trips = Counter()
+            for vehicle_id, status, count in (
+                db.query(Trip.vehicle_id, Trip.status, func.count()).group_by(Trip.vehicle_id, Trip.status)
+            ):
+                trips[(vehicle_types.get(vehicle_id), status)] += count
+        except Exception:
+            with self._lock:
+                self._epoch += 1
+            raise
+
+        with self._lock:
+            self._epoch += 1
+            drift = sum(
+                abs(old[key] - new[key])
+                for old, new in ((self.vehicles, vehicles), (self.drivers, drivers), (self.trips, trips))
+                for key in old.keys() | new.keys()
+            ) if self.loaded else 0
+            self.vehicles, self.drivers, self.trips = vehicles, drivers, trips
+            self.vehicle_types = vehicle_types
+            self.last_reconciled_at = datetime.utcnow()
+            self.reconcile_drift = drift
+        if drift:
+            logger.warning("Fleet state counters were off by %d and have been reconciled", drift)
+        return drift
+
+    def ensure_loaded(self, db: Session):
+        if not self.loaded:
+            self.reconcile(db)
+
+
+class FleetStateDelta:
+    def __init__(self):
+        self.vehicles: Counter = Counter()
+        self.drivers: Counter = Counter()
+        self.trips: Counter = Counter()
+        self.vehicle_types: Dict[int, object] = {}
+
+
+fleet_state = FleetState()
+
+
+# ---- Transition tracking ----
+
+def _before_after(obj, *attrs):
+    """(committed values, new values) of the given attributes; None when absent"""
+    state = inspect(obj)
+    before, after = [], []
+    for attr in attrs:
+        history = state.attrs[attr].history
+        current = getattr(obj, attr)
+        after.append(current)
+        if history.deleted:
+            before.append(history.deleted[0])
+        elif history.unchanged:
+            before.append(history.unchanged[0])
+        else:
+            # New (or never loaded) value: nothing was committed before it
+            before.append(None if history.added else current)
+    return tuple(before), tuple(after)
+
+
+def _move(counter: Counter, before, after, was_present: bool, is_present: bool):
+    if was_present:
+        counter[before] -= 1
+    if is_present:
+        counter[after] += 1
+
+
+_DELTA_INFO_KEY = "fleet_state_delta"
+_EPOCH_INFO_KEY = "fleet_state_epoch"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_transitions(session, flush_context):
+    delta = session.info.get(_DELTA_INFO_KEY) or FleetStateDelta()
+    changed = False
+    for obj in chain(session.new, session.dirty, session.deleted):
+        is_new, is_deleted = obj in session.new, obj in session.deleted
+
+        if isinstance(obj, Vehicle):
+            before, after = _before_after(obj, "type", "status")
+            if before != after or is_new or is_deleted:
+                _move(delta.vehicles, before, after, not is_new, not is_deleted)
+                delta.vehicle_types[obj.id] = None if is_deleted else obj.type
+                changed = True
+
+        elif isinstance(obj, Driver):
+            (before,), (after,) = _before_after(obj, "status")
+            if before != after or is_new or is_deleted:
+                _move(delta.drivers, before, after, not is_new, not is_deleted)
+                changed = True
+
+        elif isinstance(obj, Trip):
+            (old_vehicle, old_status), (new_vehicle, new_status) = _before_after(obj, "vehicle_id", "status")
+            if (old_vehicle, old_status) != (new_vehicle, new_status) or is_new or is_deleted:
+                before = (fleet_state.vehicle_type(old_vehicle, delta), old_status)
+                after = (fleet_state.vehicle_type(new_vehicle, delta), new_status)
+                _move(delta.trips, before, after, not is_new, not is_deleted)
+                changed = True
+
+    if changed:
+        session.info[_DELTA_INFO_KEY] = delta
+
+
+def _pending_delta(session) -> FleetStateDelta:
+    return session.info.setdefault(_DELTA_INFO_KEY, FleetStateDelta())
+
+
+# UPDATE statements executed directly (compare-and-set transitions) skip the
+# flush, so their callers stage the move here with the values they got back.
+
+def stage_vehicle_transition(session, vehicle_type, before, after):
+    _move(_pending_delta(session).vehicles, (vehicle_type, before), (vehicle_type, after), True, True)
+
+
+def stage_driver_transition(session, before, after, count: int = 1):
+    drivers = _pending_delta(session).drivers
+    drivers[before] -= count
+    drivers[after] += count
+
+
+def stage_trip_transition(session, vehicle_id, before, after):
+    delta = _pending_delta(session)
+    vehicle_type = fleet_state.vehicle_type(vehicle_id, delta)
+    _move(delta.trips, (vehicle_type, before), (vehicle_type, after), True, True)
+
+
+@event.listens_for(Session, "before_commit")
+def _note_epoch(session):
+    session.info[_EPOCH_INFO_KEY] = fleet_state.epoch()
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed(session):
+    delta = session.info.pop(_DELTA_INFO_KEY, None)
+    epoch = session.info.pop(_EPOCH_INFO_KEY, None)
+    if delta is not None and fleet_state.loaded:
+        fleet_state.apply(delta, epoch)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop(_DELTA_INFO_KEY, None)
+    session.info.pop(_EPOCH_INFO_KEY, None)
+
+
+# ---- Periodic reconciliation ----
+
+class FleetStateReconciler:
+    def __init__(self, session_factory, interval: float = FLEET_STATE_RECONCILE_SECONDS):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="fleet-state-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        fleet_state.resync.set()
+
+    def reconcile_once(self):
+        db = self.session_factory()
+        try:
+            return fleet_state.reconcile(db)
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Cleared first, so a delta discarded during this run asks for another
+            fleet_state.resync.clear()
+            try:
+                self.reconcile_once()
+            except Exception:
+                logger.exception("Fleet state reconciliation failed")
+            fleet_state.resync.wait(self.interval)
+
+
+fleet_state_reconciler = FleetStateReconciler(SessionLocal)
@@ -0,0 +1,187 @@
+"""
+Background enforcement of driver license expiry.
+
+A driver whose license_expiry_date has passed must be SUSPENDED. Reads no
+longer check this; a background job suspends expired drivers in bulk
+instead. At each date boundary where some license runs out, it runs one
+set-based UPDATE per prior status (On Duty, Off Duty), so no driver is
+written on its own and reads stay pure SELECTs.
+
+The job keeps a min-heap of the upcoming days on which a license lapses
+(the day after license_expiry_date) and sleeps until the earliest one.
+Drivers created or edited in this process push their day onto the heap
+when the transaction commits, and wake the job if that day comes sooner.
+The heap is rebuilt from the database every LICENSE_EXPIRY_RELOAD_SECONDS,
+which also picks up writes made by other workers. Several workers can run
+the job safely, because the UPDATE only matches drivers that are not
+suspended yet.
+"""
+import heapq
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta
+from itertools import chain
+from typing import List, Optional, Set
+
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.driver import Driver
+from app.models.enums import DriverStatus
+from app.services.fleet_state import stage_driver_transition
+
+LICENSE_EXPIRY_RELOAD_SECONDS = float(os.getenv("LICENSE_EXPIRY_RELOAD_SECONDS", "3600"))
+
+logger = logging.getLogger(__name__)
+
+
+def lapse_day(license_expiry_date: date) -> date:
+    """First day on which the license counts as expired"""
+    return license_expiry_date + timedelta(days=1)
+
+
+def suspend_expired_drivers(db: Session, today: Optional[date] = None) -> int:
+    """Suspend every driver whose license expired before today; returns how many were suspended"""
+    today = today or date.today()
+    suspended = 0
+    for status in DriverStatus:
+        if status == DriverStatus.SUSPENDED:
+            continue
+        result = db.execute(
+            update(Driver)
+            .where(Driver.license_expiry_date < today, Driver.status == status)
+            .values(status=DriverStatus.SUSPENDED, version=Driver.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            stage_driver_transition(db, status, DriverStatus.SUSPENDED, result.rowcount)
+            suspended += result.rowcount
+    db.commit()
+    return suspended
+
+
+class LicenseExpiryScheduler:
+    def __init__(self, session_factory, reload_interval: float = LICENSE_EXPIRY_RELOAD_SECONDS):
+        self.session_factory = session_factory
+        self.reload_interval = reload_interval
+        self.last_run_at: Optional[datetime] = None
+        self._days: List[date] = []   # min-heap of upcoming lapse days
+        self._queued: Set[date] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="license-expiry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def schedule(self, day: date):
+        """Make sure the job runs on `day`"""
+        with self._lock:
+            if day in self._queued:
+                return
+            heapq.heappush(self._days, day)
+            self._queued.add(day)
+            sooner = self._days[0] == day
+        if sooner:
+            self._wake.set()
+
+    def next_day(self) -> Optional[date]:
+        with self._lock:
+            return self._days[0] if self._days else None
+
+    def reload(self, db: Session):
+        """Rebuild the heap from the licenses of drivers that are not suspended"""
+        today = date.today()
+        rows = db.query(Driver.license_expiry_date).filter(
+            Driver.status != DriverStatus.SUSPENDED,
+            Driver.license_expiry_date >= today,
+        ).distinct().all()
+        days = [lapse_day(row.license_expiry_date) for row in rows]
+        heapq.heapify(days)
+        with self._lock:
+            self._days, self._queued = days, set(days)
+
+    def _pop_due(self, today: date) -> bool:
+        due = False
+        with self._lock:
+            while self._days and self._days[0] <= today:
+                self._queued.discard(heapq.heappop(self._days))
+                due = True
+        return due
+
+    def run_once(self, reload: bool = False) -> int:
+        """Suspend expired drivers if a lapse day has come (always when reloading)"""
+        db = self.session_factory()
+        try:
+            suspended = 0
+            if reload or self._pop_due(date.today()):
+                suspended = suspend_expired_drivers(db)
+                self.last_run_at = datetime.now()
+                if suspended:
+                    logger.info("Suspended %d driver(s) with an expired license", suspended)
+            if reload:
+                self.reload(db)
+            return suspended
+        finally:
+            db.close()
+
+    def _seconds_until_due(self) -> float:
+        day = self.next_day()
+        if day is None:
+            return self.reload_interval
+        until = (datetime.combine(day, datetime.min.time()) - datetime.now()).total_seconds()
+        return max(0.0, min(until, self.reload_interval))
+
+    def _run(self):
+        reload_due = datetime.now()
+        while not self._stop.is_set():
+            reload = datetime.now() >= reload_due
+            if reload:
+                reload_due = datetime.now() + timedelta(seconds=self.reload_interval)
+            try:
+                self.run_once(reload)
+            except Exception:
+                logger.exception("License expiry job failed")
+            self._wake.clear()
+            wait = min(self._seconds_until_due(), (reload_due - datetime.now()).total_seconds())
+            self._wake.wait(max(wait, 0.0))
+
+
+license_expiry_scheduler = LicenseExpiryScheduler(SessionLocal)
+
+
+# ---- Following license edits ----
+
+_PENDING_INFO_KEY = "license_lapse_days"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_lapse_days(session, flush_context):
+    days = None
+    for obj in chain(session.new, session.dirty):
+        if isinstance(obj, Driver) and obj.license_expiry_date is not None:
+            if days is None:
+                days = session.info.setdefault(_PENDING_INFO_KEY, set())
+            days.add(lapse_day(obj.license_expiry_date))
+
+
+@event.listens_for(Session, "after_commit")
+def _schedule_lapse_days(session):
+    for day in session.info.pop(_PENDING_INFO_KEY, ()):
+        license_expiry_scheduler.schedule(day)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_lapse_days(session):
+    session.info.pop(_PENDING_INFO_KEY, None)
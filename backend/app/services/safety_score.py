@@ -0,0 +1,303 @@
+"""
+Driver safety score (Driver.performance_score).
+
+Each driver has one driver_safety_stats row of running aggregates: trips
+completed, cancelled and finished late (completed after due_at), plus the
+number and cost of incident and fine expenses logged against their trips.
+The score depends on those aggregates only:
+
+    100 - 25 x cancelled share of finished trips
+        - 25 x late share of completed trips
+        - 40 x incidents per finished trip (counted up to 1)
+        - 10 x fines per finished trip (counted up to 1)
+
+so an event is folded in O(1): one upsert that adds to the driver's
+counters and returns them, and one UPDATE of the driver's score, inside
+the transaction that records the event. The trip endpoints call
+record_trip_outcomes() and the expense endpoint calls record_expense().
+
+The trips and expense_logs tables are the event history. Other services
+write to them too, without going through this module, so the aggregates
+can be checked against a full replay and rebuilt from it. The replay reads
+both tables in batches of SAFETY_REBUILD_BATCH_ROWS rows and sums each
+batch per driver with numpy. From backend/:
+    python -m app.services.safety_score check     # report drivers that are off
+    python -m app.services.safety_score rebuild   # rewrite every aggregate and score
+"""
+import argparse
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import bindparam, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.driver import Driver, DriverSafetyStats
+from app.models.finance import ExpenseLog
+from app.models.trip import Trip
+from app.models.enums import TripStatus
+
+SAFETY_REBUILD_BATCH_ROWS = int(os.getenv("SAFETY_REBUILD_BATCH_ROWS", "10000"))
+
+MAX_SCORE = 100.0
+CANCELLED_WEIGHT = 25.0
+LATE_WEIGHT = 25.0
+INCIDENT_WEIGHT = 40.0
+FINE_WEIGHT = 10.0
+
+# expense_type values (compared lower-case, trimmed) that count against the driver
+INCIDENT_EXPENSE_TYPES = {"incident", "accident", "damage", "collision"}
+FINE_EXPENSE_TYPES = {"fine", "traffic fine", "penalty", "challan"}
+
+COUNTERS = ("completed_trips", "cancelled_trips", "late_trips", "incidents", "fines")
+COSTS = ("incident_cost", "fine_cost")
+AGGREGATES = COUNTERS + COSTS
+
+_UPSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def safety_score(completed_trips, cancelled_trips, late_trips, incidents, fines):
+    """Score from the aggregates; takes numbers or numpy arrays of one shape"""
+    finished = np.maximum(np.add(completed_trips, cancelled_trips), 1)
+    penalty = (
+        CANCELLED_WEIGHT * np.divide(cancelled_trips, finished)
+        + LATE_WEIGHT * np.divide(late_trips, np.maximum(completed_trips, 1))
+        + INCIDENT_WEIGHT * np.minimum(np.divide(incidents, finished), 1)
+        + FINE_WEIGHT * np.minimum(np.divide(fines, finished), 1)
+    )
+    return np.round(np.clip(MAX_SCORE - penalty, 0, MAX_SCORE), 2)
+
+
+def expense_kind(expense_type: str) -> Optional[str]:
+    """"incident", "fine" or None for expenses that say nothing about driving"""
+    kind = expense_type.strip().lower()
+    if kind in INCIDENT_EXPENSE_TYPES:
+        return "incident"
+    if kind in FINE_EXPENSE_TYPES:
+        return "fine"
+    return None
+
+
+def is_late(trip) -> bool:
+    return trip.due_at is not None and trip.completed_at is not None and trip.completed_at > trip.due_at
+
+
+# ---- Folding events in ----
+
+def _fold(db: Session, driver_id: int, increments: Dict[str, float]) -> float:
+    """Add to one driver's aggregates and rescore them; returns the new score"""
+    stats = DriverSafetyStats.__table__
+    insert = _UPSERTS[db.get_bind().dialect.name]
+    statement = insert(stats).values(driver_id=driver_id, updated_at=datetime.utcnow(), **increments)
+    statement = statement.on_conflict_do_update(
+        index_elements=[stats.c.driver_id],
+        set_={
+            **{name: stats.c[name] + statement.excluded[name] for name in increments},
+            "updated_at": statement.excluded.updated_at,
+        },
+    ).returning(*(stats.c[name] for name in COUNTERS))
+    row = db.execute(statement).one()
+
+    score = float(safety_score(*row))
+    db.execute(
+        update(Driver)
+        .where(Driver.id == driver_id)
+        .values(performance_score=score, version=Driver.version + 1)
+    )
+    return score
+
+
+def record_trip_outcomes(db: Session, trips: Iterable[Trip]):
+    """Fold completed and cancelled trips in, one upsert per driver"""
+    increments: Dict[int, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for trip in trips:
+        if trip.status == TripStatus.COMPLETED:
+            increments[trip.driver_id]["completed_trips"] += 1
+            increments[trip.driver_id]["late_trips"] += int(is_late(trip))
+        elif trip.status == TripStatus.CANCELLED:
+            increments[trip.driver_id]["cancelled_trips"] += 1
+    for driver_id in sorted(increments):  # one lock order for concurrent batches
+        _fold(db, driver_id, increments[driver_id])
+
+
+def record_expense(db: Session, driver_id: int, expense_type: str, cost: float):
+    """Fold in an expense logged against one of the driver's trips"""
+    kind = expense_kind(expense_type)
+    if kind == "incident":
+        _fold(db, driver_id, {"incidents": 1, "incident_cost": cost})
+    elif kind == "fine":
+        _fold(db, driver_id, {"fines": 1, "fine_cost": cost})
+
+
+# ---- Replaying the history ----
+
+class Replay:
+    """Aggregates and scores of every driver, recomputed from trips and expense_logs"""
+
+    def __init__(self, driver_ids: np.ndarray):
+        self.driver_ids = driver_ids  # sorted
+        self.totals = {name: np.zeros(len(driver_ids)) for name in AGGREGATES}
+
+    def _add(self, name: str, driver_ids: np.ndarray, mask: np.ndarray, weights: Optional[np.ndarray] = None):
+        slots = np.searchsorted(self.driver_ids, driver_ids)
+        known = mask & (slots < len(self.driver_ids))
+        known[known] &= self.driver_ids[slots[known]] == driver_ids[known]
+        self.totals[name] += np.bincount(
+            slots[known],
+            weights=None if weights is None else weights[known],
+            minlength=len(self.driver_ids),
+        )
+
+    def add_trips(self, rows: List):
+        driver_ids, statuses, completed_at, due_at = (np.array(column, dtype=object) for column in zip(*rows))
+        driver_ids = driver_ids.astype(np.int64)
+        # Against the plain value: numpy would turn the enum member into "TripStatus.COMPLETED"
+        completed = statuses == TripStatus.COMPLETED.value
+        completed_at = completed_at.astype("datetime64[us]")
+        due_at = due_at.astype("datetime64[us]")
+        self._add("completed_trips", driver_ids, completed)
+        self._add("cancelled_trips", driver_ids, statuses == TripStatus.CANCELLED.value)
+        # Comparisons with NaT (no deadline or no finish time) are False
+        self._add("late_trips", driver_ids, completed & (completed_at > due_at))
+
+    def add_expenses(self, rows: List):
+        driver_ids, expense_types, costs = (np.array(column, dtype=object) for column in zip(*rows))
+        driver_ids = driver_ids.astype(np.int64)
+        kinds = np.char.lower(np.char.strip(expense_types.astype(str)))
+        costs = costs.astype(float)
+        incident = np.isin(kinds, list(INCIDENT_EXPENSE_TYPES))
+        fine = np.isin(kinds, list(FINE_EXPENSE_TYPES))
+        self._add("incidents", driver_ids, incident)
+        self._add("incident_cost", driver_ids, incident, costs)
+        self._add("fines", driver_ids, fine)
+        self._add("fine_cost", driver_ids, fine, costs)
+
+    def counters(self, name: str) -> np.ndarray:
+        return self.totals[name].round().astype(np.int64)
+
+    def scores(self) -> np.ndarray:
+        return safety_score(*(self.counters(name) for name in COUNTERS))
+
+
+def replay(db: Session, batch_rows: int = SAFETY_REBUILD_BATCH_ROWS) -> Replay:
+    driver_ids = np.array(db.scalars(select(Driver.id).order_by(Driver.id)).all(), dtype=np.int64)
+    result = Replay(driver_ids)
+
+    trips = select(Trip.driver_id, Trip.status, Trip.completed_at, Trip.due_at).where(
+        Trip.status.in_([TripStatus.COMPLETED, TripStatus.CANCELLED])
+    )
+    for rows in db.execute(trips.execution_options(yield_per=batch_rows)).partitions():
+        result.add_trips(rows)
+
+    # Only expenses linked to a trip can be put on a driver
+    expenses = select(Trip.driver_id, ExpenseLog.expense_type, ExpenseLog.cost).join(
+        Trip, ExpenseLog.trip_id == Trip.id
+    )
+    for rows in db.execute(expenses.execution_options(yield_per=batch_rows)).partitions():
+        result.add_expenses(rows)
+    return result
+
+
+def _stored(db: Session, driver_ids: np.ndarray):
+    """Stored aggregates (zeros for drivers without a row) and scores, aligned with driver_ids"""
+    slots = {driver_id: slot for slot, driver_id in enumerate(driver_ids.tolist())}
+    totals = {name: np.zeros(len(driver_ids)) for name in AGGREGATES}
+    for row in db.execute(select(DriverSafetyStats.driver_id, *(getattr(DriverSafetyStats, n) for n in AGGREGATES))):
+        slot = slots.get(row.driver_id)
+        if slot is not None:
+            for name in AGGREGATES:
+                totals[name][slot] = getattr(row, name)
+    scores = np.full(len(driver_ids), np.nan)
+    for driver_id, score in db.execute(select(Driver.id, Driver.performance_score)):
+        if score is not None:
+            scores[slots[driver_id]] = score
+    return totals, scores
+
+
+def _differences(result: Replay, totals, scores) -> np.ndarray:
+    """Mask of drivers whose stored aggregates or score differ from the replay"""
+    off = ~np.isclose(scores, result.scores())
+    for name in AGGREGATES:
+        off |= ~np.isclose(totals[name], result.totals[name])
+    return off
+
+
+def check(db: Session) -> List[int]:
+    """Ids of drivers whose stored aggregates or score do not match a replay"""
+    result = replay(db)
+    totals, scores = _stored(db, result.driver_ids)
+    return result.driver_ids[_differences(result, totals, scores)].tolist()
+
+
+def _lock_stats(db: Session):
+    """Hold back concurrent folds until the rebuild commits, so none is lost or counted twice"""
+    if db.get_bind().dialect.name != "postgresql":
+        return  # SQLite runs one writer at a time anyway
+    db.execute(text(f"LOCK TABLE {DriverSafetyStats.__tablename__} IN EXCLUSIVE MODE"))
+
+
+def rebuild(db: Session) -> int:
+    """Replace every driver's aggregates and score with a replay; returns how many drivers changed"""
+    _lock_stats(db)
+    result = replay(db)
+    totals, scores = _stored(db, result.driver_ids)
+    changed = _differences(result, totals, scores)
+    counters = {name: result.counters(name) for name in COUNTERS}
+    new_scores = result.scores()
+    now = datetime.utcnow()
+
+    stats = DriverSafetyStats.__table__
+    db.execute(stats.delete())
+    has_events = np.logical_or.reduce([result.totals[name] != 0 for name in AGGREGATES])
+    rows = [
+        {
+            "driver_id": int(result.driver_ids[slot]),
+            **{name: int(counters[name][slot]) for name in COUNTERS},
+            **{name: float(result.totals[name][slot]) for name in COSTS},
+            "updated_at": now,
+        }
+        for slot in np.flatnonzero(has_events)
+    ]
+    if rows:
+        db.execute(stats.insert(), rows)
+
+    drivers = Driver.__table__
+    rescored = [
+        {"b_id": int(result.driver_ids[slot]), "b_score": float(new_scores[slot])}
+        for slot in np.flatnonzero(changed)
+    ]
+    if rescored:
+        db.execute(
+            drivers.update()
+            .where(drivers.c.id == bindparam("b_id"))
+            .values(performance_score=bindparam("b_score"), version=drivers.c.version + 1),
+            rescored,
+        )
+    db.commit()
+    return int(changed.sum())
+
+
+def main():
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Check or rebuild driver safety scores from trip and expense history")
+    parser.add_argument("command", choices=["check", "rebuild"])
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "check":
+            off = check(db)
+            print(f"{len(off)} driver(s) differ from a replay" + (f": {off}" if off else "."))
+            raise SystemExit(1 if off else 0)
+        changed = rebuild(db)
+        print(f"Rebuilt safety scores; {changed} driver(s) changed.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
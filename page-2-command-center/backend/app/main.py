@@ -2,7 +2,8 @@ from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from app.database import Base, engine, get_db
-from app.routes import dashboard
+from app.routes import dashboard, live
+from app.services.live_stats import live_stats
 
 # Create tables if they do not exist
 try:
@@ -23,6 +24,11 @@ app.add_middleware(
 
 # Include routes
 app.include_router(dashboard.router)
+app.include_router(live.router)
+
+@app.on_event("shutdown")
+def stop_live_stats():
+    live_stats.stop()
 
 @app.get("/health")
 def health_check():
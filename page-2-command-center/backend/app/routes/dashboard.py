@@ -7,48 +7,77 @@ from app.database import get_db
 from app.models.vehicle import Vehicle
 from app.models.trip import Trip
 from app.models.enums import VehicleStatus, VehicleType, TripStatus
-from app.schemas.dashboard import DashboardStats
+from app.schemas.dashboard import DashboardStats, VehicleTypeStats
 
 router = APIRouter(prefix="/api/dashboard", tags=["Dashboard"])
 
-@router.get("/stats", response_model=DashboardStats)
-def get_dashboard_stats(
-    vehicle_type: Optional[VehicleType] = Query(None, description="Filter by vehicle type"),
-    db: Session = Depends(get_db)
-):
-    # Base queries allowing for optional filtering
-    vehicle_query = db.query(Vehicle)
-    trip_query = db.query(Trip)
 
-    if vehicle_type:
-        vehicle_query = vehicle_query.filter(Vehicle.type == vehicle_type)
-        # Note: Filtering trips by vehicle_type requires a join
-        trip_query = trip_query.join(Vehicle).filter(Vehicle.type == vehicle_type)
+def _utilization(active_fleet: int, total_active_vehicles: int) -> float:
+    # (On Trip) / (Available + On Trip) * 100
+    if total_active_vehicles > 0:
+        return round((active_fleet / total_active_vehicles) * 100.0, 2)
+    return 0.0
 
-    # 1. Active Fleet: vehicles currently "On Trip"
-    active_fleet = vehicle_query.filter(Vehicle.status == VehicleStatus.ON_TRIP).count()
 
-    # 2. Maintenance Alerts: vehicles marked "In Shop"
-    maintenance_alerts = vehicle_query.filter(Vehicle.status == VehicleStatus.IN_SHOP).count()
+def compute_dashboard_stats(db: Session, vehicle_type: Optional[VehicleType] = None) -> DashboardStats:
+    # All KPIs come from one pass over vehicles: conditional counts per
+    # vehicle type, with draft trips pre-counted per vehicle and joined in.
+    pending_by_vehicle = (
+        db.query(Trip.vehicle_id, func.count().label("pending"))
+        .filter(Trip.status == TripStatus.DRAFT)
+        .group_by(Trip.vehicle_id)
+        .subquery()
+    )
 
-    # 3. Utilization Rate: % of fleet assigned vs. idle
-    # "Assigned" could mean ON_TRIP. "Idle" could mean AVAILABLE. 
-    # Let's define it as: (On Trip) / (Available + On Trip) * 100
-    # or (On Trip) / Total Active Vehicles
-    total_active_vehicles = vehicle_query.filter(
-        Vehicle.status.in_([VehicleStatus.AVAILABLE, VehicleStatus.ON_TRIP])
-    ).count()
+    query = (
+        db.query(
+            Vehicle.type,
+            # 1. Active Fleet: vehicles currently "On Trip"
+            func.count().filter(Vehicle.status == VehicleStatus.ON_TRIP).label("active_fleet"),
+            # 2. Maintenance Alerts: vehicles marked "In Shop"
+            func.count().filter(Vehicle.status == VehicleStatus.IN_SHOP).label("maintenance_alerts"),
+            # 3. Utilization Rate denominator: Available + On Trip
+            func.count().filter(
+                Vehicle.status.in_([VehicleStatus.AVAILABLE, VehicleStatus.ON_TRIP])
+            ).label("total_active_vehicles"),
+            # 4. Pending Cargo: Shipments waiting for assignment (draft trips)
+            func.coalesce(func.sum(pending_by_vehicle.c.pending), 0).label("pending_cargo"),
+        )
+        .outerjoin(pending_by_vehicle, pending_by_vehicle.c.vehicle_id == Vehicle.id)
+        .group_by(Vehicle.type)
+    )
+    if vehicle_type:
+        query = query.filter(Vehicle.type == vehicle_type)
 
-    utilization_rate_percent = 0.0
-    if total_active_vehicles > 0:
-        utilization_rate_percent = (active_fleet / total_active_vehicles) * 100.0
+    rows = {row.type: row for row in query}
+
+    # Every type is listed (zeros included) so the breakdown has a stable shape
+    by_vehicle_type = []
+    for type_ in ([vehicle_type] if vehicle_type else list(VehicleType)):
+        row = rows.get(type_)
+        by_vehicle_type.append(VehicleTypeStats(
+            vehicle_type=type_,
+            active_fleet=row.active_fleet if row else 0,
+            maintenance_alerts=row.maintenance_alerts if row else 0,
+            utilization_rate_percent=_utilization(row.active_fleet, row.total_active_vehicles) if row else 0.0,
+            pending_cargo=row.pending_cargo if row else 0
+        ))
 
-    # 4. Pending Cargo: Shipments waiting for assignment (draft trips)
-    pending_cargo = trip_query.filter(Trip.status == TripStatus.DRAFT).count()
+    active_fleet = sum(row.active_fleet for row in rows.values())
+    total_active_vehicles = sum(row.total_active_vehicles for row in rows.values())
 
     return DashboardStats(
         active_fleet=active_fleet,
-        maintenance_alerts=maintenance_alerts,
-        utilization_rate_percent=round(utilization_rate_percent, 2),
-        pending_cargo=pending_cargo
+        maintenance_alerts=sum(row.maintenance_alerts for row in rows.values()),
+        utilization_rate_percent=_utilization(active_fleet, total_active_vehicles),
+        pending_cargo=sum(row.pending_cargo for row in rows.values()),
+        by_vehicle_type=by_vehicle_type
     )
+
+
+@router.get("/stats", response_model=DashboardStats)
+def get_dashboard_stats(
+    vehicle_type: Optional[VehicleType] = Query(None, description="Filter by vehicle type"),
+    db: Session = Depends(get_db)
+):
+    return compute_dashboard_stats(db, vehicle_type)
@@ -0,0 +1,32 @@
+import asyncio
+
+from fastapi import APIRouter, WebSocket
+
+from app.services.live_stats import live_stats
+
+router = APIRouter(prefix="/api/dashboard", tags=["Dashboard"])
+
+@router.websocket("/live")
+async def live_dashboard(websocket: WebSocket):
+    # Full KPI snapshot on connect, then coalesced deltas (see app/services/live_stats.py)
+    await websocket.accept()
+    subscriber = await live_stats.subscribe(websocket)
+
+    async def drain_client():
+        # Incoming messages are ignored; this only notices the disconnect
+        while True:
+            await websocket.receive_text()
+
+    sender = asyncio.create_task(subscriber.run())
+    receiver = asyncio.create_task(drain_client())
+    try:
+        await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        live_stats.unsubscribe(subscriber)
+        for task in (sender, receiver):
+            task.cancel()
+        for task in (sender, receiver):
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
@@ -1,7 +1,17 @@
 from pydantic import BaseModel
+from typing import List
+from app.models.enums import VehicleType
+
+class VehicleTypeStats(BaseModel):
+    vehicle_type: VehicleType
+    active_fleet: int
+    maintenance_alerts: int
+    utilization_rate_percent: float
+    pending_cargo: int
 
 class DashboardStats(BaseModel):
     active_fleet: int
     maintenance_alerts: int
     utilization_rate_percent: float
     pending_cargo: int
+    by_vehicle_type: List[VehicleTypeStats] = []
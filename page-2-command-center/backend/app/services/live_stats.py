@@ -0,0 +1,144 @@
+"""
+Live Command Center KPIs pushed to WebSocket subscribers.
+
+Vehicle, trip and driver statuses are written to the shared database by the
+other FleetFlow services, so one broadcaster per process polls the dashboard
+query every LIVE_STATS_POLL_SECONDS (only while someone is subscribed),
+diffs it with the previous snapshot and fans the changed fields out to every
+subscriber. One query per interval replaces one query per open dashboard.
+
+Each subscriber gets the full snapshot when it connects, then at most one
+delta message per LIVE_STATS_MIN_INTERVAL seconds; changes that land in
+between are merged into the pending delta, so a burst of transitions or a
+slow client never builds up a queue.
+
+Messages:
+    {"type": "snapshot", "seq": 7, "data": {...DashboardStats...}}
+    {"type": "delta", "seq": 9, "changes": {"active_fleet": 12,
+                                           "by_vehicle_type.Truck.active_fleet": 5}}
+Delta keys are dotted paths into the snapshot; values are absolute, so a
+delta can safely be applied on top of a newer snapshot.
+"""
+import asyncio
+import logging
+import os
+from typing import Dict, Optional, Set
+
+from app.database import SessionLocal
+from app.routes.dashboard import compute_dashboard_stats
+
+LIVE_STATS_POLL_SECONDS = float(os.getenv("LIVE_STATS_POLL_SECONDS", "1.0"))
+LIVE_STATS_MIN_INTERVAL = float(os.getenv("LIVE_STATS_MIN_INTERVAL", "1.0"))
+
+logger = logging.getLogger(__name__)
+
+
+def flatten(data: dict) -> Dict[str, object]:
+    """Dotted-path view of a dashboard snapshot, used to diff and address fields"""
+    flat = {key: value for key, value in data.items() if key != "by_vehicle_type"}
+    for entry in data.get("by_vehicle_type", []):
+        vehicle_type = entry["vehicle_type"]
+        for key, value in entry.items():
+            if key != "vehicle_type":
+                flat[f"by_vehicle_type.{vehicle_type}.{key}"] = value
+    return flat
+
+
+class Subscriber:
+    def __init__(self, websocket, min_interval: float):
+        self.websocket = websocket
+        self.min_interval = min_interval
+        self.pending: Dict[str, object] = {}
+        self.seq = 0
+        self._wake = asyncio.Event()
+
+    def push(self, changes: Dict[str, object], seq: int):
+        # Later values overwrite earlier ones: one merged delta per send
+        self.pending.update(changes)
+        self.seq = seq
+        self._wake.set()
+
+    async def run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            changes, self.pending = self.pending, {}
+            await self.websocket.send_json({"type": "delta", "seq": self.seq, "changes": changes})
+            await asyncio.sleep(self.min_interval)
+
+
+class LiveStatsBroadcaster:
+    def __init__(self, session_factory, poll_interval: float = LIVE_STATS_POLL_SECONDS,
+                 min_interval: float = LIVE_STATS_MIN_INTERVAL):
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self.min_interval = min_interval
+        self.subscribers: Set[Subscriber] = set()
+        self.snapshot: Optional[dict] = None
+        self.seq = 0
+        self.polls = 0
+        self._flat: Dict[str, object] = {}
+        self._refresh_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def subscribe(self, websocket) -> Subscriber:
+        """Register a subscriber and send it the current snapshot"""
+        self._ensure_running()
+        if self.snapshot is None:
+            await self.refresh()
+        subscriber = Subscriber(websocket, self.min_interval)
+        # Registered before the snapshot goes out, so a refresh that lands
+        # while it is being sent still reaches this subscriber as a delta.
+        self.subscribers.add(subscriber)
+        await websocket.send_json({"type": "snapshot", "seq": self.seq, "data": self.snapshot})
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def refresh(self):
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            stats = await asyncio.to_thread(self._load)
+            self.polls += 1
+            data = stats.model_dump(mode="json")
+            flat = flatten(data)
+            changes = {key: value for key, value in flat.items() if self._flat.get(key) != value}
+            had_snapshot = self.snapshot is not None
+            self.snapshot, self._flat = data, flat
+            if changes and had_snapshot:
+                self.seq += 1
+                for subscriber in list(self.subscribers):
+                    subscriber.push(changes, self.seq)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _load(self):
+        db = self.session_factory()
+        try:
+            return compute_dashboard_stats(db)
+        finally:
+            db.close()
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if not self.subscribers:
+                # Nobody is watching: skip the query and reload on the next subscribe
+                self.snapshot, self._flat = None, {}
+                continue
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Live stats refresh failed")
+
+
+live_stats = LiveStatsBroadcaster(SessionLocal)
@@ -0,0 +1 @@
+# Benchmarks for Page 2 command center
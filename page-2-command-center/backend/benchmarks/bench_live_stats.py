@@ -0,0 +1,184 @@
+"""
+Load test: many concurrent subscribers on the live dashboard WebSocket.
+
+Seeds a throwaway database, starts the Command Center app under uvicorn in a
+child process, connects N WebSocket clients from this process and then
+flips vehicle / trip statuses in bursts. Reports how long the snapshots took
+to reach everyone, the fan-out latency from a committed change to each
+client's delta, and how many messages each client received (coalescing keeps
+it at one per LIVE_STATS_MIN_INTERVAL however many changes a burst holds).
+
+Usage (from page-2-command-center/backend):
+    python -m benchmarks.bench_live_stats --clients 2000 --bursts 5
+
+DATABASE_URL defaults to a local SQLite file so the script never touches a
+shared database by accident. Needs the `websockets` package.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench_command_center.db")
+
+import websockets
+
+from app.database import Base, SessionLocal, engine
+from app.models.vehicle import Vehicle
+from app.models.trip import Trip
+from app.models.enums import VehicleType, VehicleStatus, TripStatus
+
+
+def seed(vehicles: int, trips: int):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(Vehicle, [
+            {
+                "id": vid,
+                "name": f"Vehicle {vid}",
+                "license_plate": f"BENCH-{vid:06d}",
+                "max_capacity": 1000,
+                "type": rng.choice(list(VehicleType)),
+                "status": VehicleStatus.AVAILABLE,
+            }
+            for vid in range(1, vehicles + 1)
+        ])
+        db.bulk_insert_mappings(Trip, [
+            {
+                "vehicle_id": rng.randint(1, vehicles),
+                "driver_id": 1,
+                "cargo_weight": 100,
+                "status": TripStatus.DRAFT,
+            }
+            for _ in range(trips)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def change_statuses(rng: random.Random, vehicles: int, changes: int):
+    """One burst of vehicle status transitions, committed together"""
+    db = SessionLocal()
+    try:
+        for vid in rng.sample(range(1, vehicles + 1), changes):
+            vehicle = db.get(Vehicle, vid)
+            vehicle.status = rng.choice([VehicleStatus.AVAILABLE, VehicleStatus.ON_TRIP, VehicleStatus.IN_SHOP])
+        db.commit()
+    finally:
+        db.close()
+
+
+class Client:
+    def __init__(self):
+        self.snapshot_at = None
+        self.messages = 0
+        self.delta_times = []
+
+    async def run(self, url: str, done: asyncio.Event):
+        async with websockets.connect(url, open_timeout=60, max_queue=None) as ws:
+            while not done.is_set():
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+                message = json.loads(raw)
+                self.messages += 1
+                if message["type"] == "snapshot":
+                    self.snapshot_at = time.perf_counter()
+                else:
+                    self.delta_times.append(time.perf_counter())
+
+
+async def run_clients(args, url: str):
+    clients = [Client() for _ in range(args.clients)]
+    done = asyncio.Event()
+    started = time.perf_counter()
+    tasks = []
+    for client in clients:
+        tasks.append(asyncio.create_task(client.run(url, done)))
+        await asyncio.sleep(0)
+    while sum(1 for c in clients if c.snapshot_at) < args.clients:
+        if any(t.done() and t.exception() for t in tasks):
+            raise next(t.exception() for t in tasks if t.done() and t.exception())
+        await asyncio.sleep(0.05)
+    connected = time.perf_counter() - started
+    print(f"{args.clients} subscribers connected, snapshot delivered to all in {connected:.2f} s")
+
+    rng = random.Random(7)
+    latencies = []
+    for burst in range(args.bursts):
+        seen = [len(c.delta_times) for c in clients]
+        await asyncio.to_thread(change_statuses, rng, args.vehicles, args.changes)
+        committed = time.perf_counter()
+        deadline = committed + args.poll * 2 + args.min_interval + 10
+        while time.perf_counter() < deadline:
+            if all(len(c.delta_times) > n for c, n in zip(clients, seen)):
+                break
+            await asyncio.sleep(0.01)
+        burst_latencies = [c.delta_times[n] - committed for c, n in zip(clients, seen) if len(c.delta_times) > n]
+        latencies.extend(burst_latencies)
+        print(
+            f"burst {burst + 1}: {args.changes} status changes -> delta at {len(burst_latencies)}/{args.clients} "
+            f"clients, p50 {statistics.median(burst_latencies) * 1000:.0f} ms, "
+            f"max {max(burst_latencies) * 1000:.0f} ms"
+        )
+        await asyncio.sleep(args.min_interval)
+
+    done.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    per_client = [c.messages for c in clients]
+    print(
+        f"messages per client: min {min(per_client)}, max {max(per_client)} "
+        f"(1 snapshot + at most 1 delta per burst)"
+    )
+    # Latency includes up to one poll interval of waiting for the next tick
+    print(f"fan-out latency over all bursts: p50 {statistics.median(latencies) * 1000:.0f} ms, "
+          f"p99 {statistics.quantiles(latencies, n=100)[98] * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--vehicles", type=int, default=500)
+    parser.add_argument("--trips", type=int, default=2000)
+    parser.add_argument("--bursts", type=int, default=5)
+    parser.add_argument("--changes", type=int, default=50, help="status changes per burst")
+    parser.add_argument("--poll", type=float, default=1.0, help="LIVE_STATS_POLL_SECONDS for the server")
+    parser.add_argument("--min-interval", type=float, default=1.0, help="LIVE_STATS_MIN_INTERVAL for the server")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    # Each subscriber holds a socket on both ends
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, max(soft, args.clients * 2 + 256))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+    print(f"Seeding {args.vehicles} vehicles / {args.trips} trips into {engine.url} ...")
+    seed(args.vehicles, args.trips)
+
+    env = dict(os.environ, LIVE_STATS_POLL_SECONDS=str(args.poll), LIVE_STATS_MIN_INTERVAL=str(args.min_interval))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port),
+         "--log-level", "warning", "--backlog", str(args.clients)],
+        env=env,
+    )
+    try:
+        time.sleep(2)
+        asyncio.run(run_clients(args, f"ws://127.0.0.1:{args.port}/api/dashboard/live"))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
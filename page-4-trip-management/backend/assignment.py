@@ -0,0 +1,286 @@
+"""
+Automatic assignment of pending DRAFT trips to available vehicles and drivers.
+
+A trip fits a vehicle when cargo_weight <= max_capacity; the cost of the pair
+is the capacity left unused. The plan first serves as many trips as possible,
+then minimizes the total unused capacity. A vehicle can only be used if an
+on-duty driver whose license_category matches its type is free to drive it.
+
+The cost is separable (capacity of the vehicles used minus cargo carried) and
+feasibility is a threshold, so without driver limits the optimum needs no
+general assignment solver (a Hungarian solve of the dense 5,000 x 3,000
+matrix takes ~20 s):
+
+- the trips to serve are the heaviest set that can still be matched, picked
+  greedily by weight;
+- the vehicles to use are the smallest set of the same size that can be
+  matched, picked greedily by capacity;
+- both sets sorted by size pair up feasibly (Mendelsohn-Dulmage), so the
+  final pairing is a zip.
+
+Each greedy pass is a sort, a searchsorted and a cumulative minimum. If that
+plan uses no more vehicles of a type than there are free licensed drivers it
+is also optimal with the limits. Otherwise the greedy choice no longer holds
+(it can pay to switch to a lighter trip), and the plan is solved exactly as a
+min-cost flow in which each type passes at most as many loads as it has
+drivers; see match_with_limits.
+"""
+from collections import Counter
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def _greedy_keep(limits: np.ndarray) -> np.ndarray:
+    """Greedy scan over sorted items: item i is kept while fewer than limits[i] are kept.
+
+    limits must be non-decreasing. kept_i = min(kept_{i-1} + 1, limits_i) unrolls
+    to kept_i = i + min(0, min_{j<=i}(limits_j - j)).
+    """
+    index = np.arange(1, len(limits) + 1)
+    kept = index + np.minimum(0, np.minimum.accumulate(limits - index))
+    return np.diff(kept, prepend=0) == 1
+
+
+def match_capacity(weights: np.ndarray, capacities: np.ndarray):
+    """Maximum matching of loads to capacities with the least unused capacity.
+
+    Returns (load indices, capacity indices), paired position by position.
+    """
+    if len(weights) == 0 or len(capacities) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    # Heaviest loads first; each is kept while fewer are kept than vehicles can carry it
+    trip_order = np.argsort(-weights, kind="stable")
+    sorted_capacities = np.sort(capacities)
+    fitting_vehicles = len(capacities) - np.searchsorted(sorted_capacities, weights[trip_order], side="left")
+    trips = trip_order[_greedy_keep(fitting_vehicles)]
+
+    # Smallest vehicles first; each is kept while fewer are kept than loads fit in it
+    vehicle_order = np.argsort(capacities, kind="stable")
+    fitting_trips = np.searchsorted(np.sort(weights), capacities[vehicle_order], side="right")
+    vehicles = vehicle_order[_greedy_keep(fitting_trips)][:len(trips)]
+
+    # Largest vehicle takes the heaviest load, and so on down
+    vehicles = vehicles[np.argsort(-capacities[vehicles], kind="stable")]
+    return trips, vehicles
+
+
+def _chain_closure(base: np.ndarray, segment_start: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Distances after free moves along the level chain.
+
+    Moving up is always free; moving down only within a run of chain edges
+    that carry flow. Level l is reachable from l' iff l >= segment_start[l'].
+    """
+    lowest = np.full(len(base), np.inf)
+    lowest[starts] = np.minimum.reduceat(base, starts)
+    return np.minimum.accumulate(lowest)
+
+
+def _cancel_cycles(moves: List[List[int]], hops: List[int]):
+    """Cut zero-cost cycles out of a shortest walk until it is a simple path.
+
+    The walk is moves[0], hops[0], moves[1], ..., hops[-1]: chain moves
+    [from, to] between visits of the group nodes in hops. A repeated group or
+    two moves over a common level close a cycle.
+    """
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(moves)):
+            for j in range(i + 1, len(moves)):
+                low_i, high_i = sorted(moves[i])
+                low_j, high_j = sorted(moves[j])
+                if low_i <= high_j and low_j <= high_i:
+                    moves[i:j + 1] = [[moves[i][0], moves[j][1]]]
+                    hops[i:j] = []
+                    changed = True
+                    break
+                if hops[i] == hops[j]:
+                    moves[i + 1:j + 1] = []
+                    hops[i:j] = []
+                    changed = True
+                    break
+            if changed:
+                break
+
+
+def match_with_limits(weights: np.ndarray, capacities: np.ndarray, groups: np.ndarray,
+                      limits: Sequence[int]):
+    """match_capacity with at most limits[g] vehicles used from group g.
+
+    Solved as a min-cost flow with successive shortest paths. Nodes are the
+    distinct capacity levels, the groups and a sink: a load enters at the
+    smallest level that fits it, moves up the levels for free, crosses into a
+    group through a vehicle of that level (cost: its capacity) and reaches the
+    sink through its group (capacity: the limit). Entry costs max(weights) -
+    weight, so among flows of the same size the cheapest wastes the least; the
+    flow is augmented until no path is left, which serves as many loads as
+    possible. Returns (load indices, capacity indices), paired position by
+    position.
+
+    A shortest path visits each group at most once, so with the handful of
+    vehicle types it is found by a few rounds of Bellman-Ford over whole
+    numpy arrays (chain closure, level -> group, group -> level) instead of a
+    Dijkstra over individual nodes.
+    """
+    if len(weights) == 0 or len(capacities) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    levels, vehicle_level = np.unique(capacities, return_inverse=True)
+    n_levels, n_groups = len(levels), len(limits)
+    free = np.zeros((n_groups, n_levels), dtype=np.int64)  # unused vehicles per group and level
+    np.add.at(free, (groups, vehicle_level), 1)
+    taken = np.zeros_like(free)  # vehicles in use per group and level
+    remaining = np.array(limits, dtype=np.int64)  # vehicles each group may still use
+    chain_flow = np.zeros(max(n_levels - 1, 0), dtype=np.int64)  # loads moved from level l to l + 1
+    level_index = np.arange(n_levels)
+
+    # Loads grouped by entry level, heaviest first; a level's next load is its head
+    trip_level = np.searchsorted(levels, weights, side="left")
+    order = np.lexsort((-weights, trip_level))
+    order = order[trip_level[order] < n_levels]
+    bounds = np.searchsorted(trip_level[order], np.arange(n_levels + 1))
+    head, end = bounds[:-1].copy(), bounds[1:]
+    entry_cost = weights.max() - weights[order]
+    entry = np.full(n_levels, np.inf)
+    has_load = head < end
+    entry[has_load] = entry_cost[head[has_load]]
+
+    while True:
+        is_start = np.ones(n_levels, dtype=bool)
+        is_start[1:] = chain_flow == 0
+        starts = np.flatnonzero(is_start)
+        segment_start = np.maximum.accumulate(np.where(is_start, level_index, 0))
+
+        # Round k: shortest distances through at most k groups
+        bases, closed, through = [entry], [_chain_closure(entry, segment_start, starts)], []
+        while True:
+            into = np.where(free > 0, closed[-1] + levels, np.inf)
+            through.append(into.min(axis=1))
+            if len(through) == n_groups:
+                break
+            back = np.where(taken > 0, through[-1][:, None] - levels, np.inf).min(axis=0)
+            if not (back < closed[-1]).any():
+                break
+            bases.append(np.minimum(closed[-1], back))
+            closed.append(_chain_closure(bases[-1], segment_start, starts))
+
+        open_groups = np.flatnonzero(remaining > 0)
+        if not len(open_groups):
+            break
+        last = open_groups[np.argmin(through[-1][open_groups])]
+        if through[-1][last] == np.inf:
+            break
+
+        # Walk back from the sink to the load that enters
+        moves: List[List[int]] = []
+        hops = [int(last)]
+        k = len(through) - 1
+        group = last
+        level = int(np.flatnonzero((free[group] > 0) & (closed[k] + levels == through[k][group]))[0])
+        target = level
+        while True:
+            value = closed[k][level]
+            level = int(np.flatnonzero((bases[k] == value) & (segment_start <= level))[0])
+            if k == 0:
+                moves.insert(0, [level, target])
+                break
+            if closed[k - 1][level] == value:
+                k -= 1
+                continue
+            moves.insert(0, [level, target])
+            group = int(np.flatnonzero((taken[:, level] > 0) & (through[k - 1] - levels[level] == value))[0])
+            hops.insert(0, group)
+            k -= 1
+            level = int(np.flatnonzero((free[group] > 0) & (closed[k] + levels == through[k][group]))[0])
+            target = level
+        _cancel_cycles(moves, hops)
+
+        source = moves[0][0]
+        head[source] += 1
+        entry[source] = entry_cost[head[source]] if head[source] < end[source] else np.inf
+        for i, (start, stop) in enumerate(moves):
+            if stop > start:
+                chain_flow[start:stop] += 1
+            elif stop < start:
+                chain_flow[stop:start] -= 1
+            if i:
+                free[hops[i - 1], start] += 1
+                taken[hops[i - 1], start] -= 1
+            free[hops[i], stop] -= 1
+            taken[hops[i], stop] += 1
+        remaining[hops[-1]] -= 1
+
+    trips = np.concatenate([order[bounds[level]:head[level]] for level in range(n_levels)])
+    vehicles = []
+    for group, level in zip(*np.nonzero(taken)):
+        vehicles.extend(np.flatnonzero((vehicle_level == level) & (groups == group))[:taken[group, level]].tolist())
+    vehicles = np.array(vehicles, dtype=np.intp)
+
+    # The chosen sets can be matched, so sorted by size they pair up feasibly
+    trips = trips[np.argsort(-weights[trips], kind="stable")]
+    vehicles = vehicles[np.argsort(-capacities[vehicles], kind="stable")]
+    return trips.astype(np.intp), vehicles
+
+
+def _license_key(value) -> str:
+    value = getattr(value, "value", value)
+    return str(value).strip().lower()
+
+
+def propose_assignments(trips: Sequence, vehicles: Sequence, drivers: Sequence,
+                        today: Optional[date] = None) -> dict:
+    """Plan trip -> (vehicle, driver) assignments.
+
+    trips need id/cargo_weight, vehicles id/max_capacity/type, drivers
+    id/license_category/license_expiry_date/performance_score. Drivers with an
+    expired license are skipped. Returns a dict shaped like AssignmentPlan.
+    """
+    today = today or date.today()
+    drivers_by_type: Dict[str, List] = {}
+    for driver in drivers:
+        if driver.license_expiry_date >= today:
+            drivers_by_type.setdefault(_license_key(driver.license_category), []).append(driver)
+    for pool in drivers_by_type.values():
+        pool.sort(key=lambda d: -(d.performance_score or 0))
+
+    weights = np.array([t.cargo_weight for t in trips], dtype=float)
+    capacities = np.array([v.max_capacity for v in vehicles], dtype=float)
+    types = np.array([_license_key(v.type) for v in vehicles], dtype=object)
+    driver_counts = {key: len(pool) for key, pool in drivers_by_type.items()}
+
+    # Vehicles nobody is licensed to drive never enter the pool
+    pool = np.flatnonzero([driver_counts.get(key, 0) > 0 for key in types])
+    trip_idx, pool_idx = match_capacity(weights, capacities[pool])
+    used = Counter(types[pool[pool_idx]])
+    if any(count > driver_counts[key] for key, count in used.items()):
+        keys, groups = np.unique(types[pool], return_inverse=True)
+        trip_idx, pool_idx = match_with_limits(
+            weights, capacities[pool], groups, [driver_counts[key] for key in keys])
+    vehicle_idx = pool[pool_idx]
+
+    # Within a type, the heaviest loads go to the best-scored drivers
+    order = np.argsort(-weights[trip_idx], kind="stable")
+    next_driver = dict.fromkeys(driver_counts, 0)
+    assignments = []
+    for t, v in zip(trip_idx[order], vehicle_idx[order]):
+        key = types[v]
+        driver = drivers_by_type[key][next_driver[key]]
+        next_driver[key] += 1
+        assignments.append({
+            "trip_id": trips[t].id,
+            "vehicle_id": vehicles[v].id,
+            "driver_id": driver.id,
+            "cargo_weight": float(weights[t]),
+            "max_capacity": float(capacities[v]),
+            "unused_capacity": float(capacities[v] - weights[t]),
+        })
+
+    assigned = set(trip_idx.tolist())
+    return {
+        "assignments": assignments,
+        "unassigned_trip_ids": [trip.id for i, trip in enumerate(trips) if i not in assigned],
+        "total_unused_capacity": float((capacities[vehicle_idx] - weights[trip_idx]).sum()),
+    }
@@ -0,0 +1,194 @@
+"""
+Load test: fan-out of fleet updates to many WebSocket clients.
+
+Starts this module's app (the real /ws router and hub, no database) under
+uvicorn in a child process and connects N clients spread over a few client
+processes. Events are then pushed through PubSubManager.publish_update
+from a worker thread at a fixed rate, just like the dispatcher routes do.
+The benchmark reports how many events reached the clients, the end-to-end
+latency from publish to receipt, and how many frames each client got
+(senders coalesce one frame per FANOUT_FLUSH_SECONDS). Latency is measured
+on the newest event of each frame.
+
+Usage (from page-4-trip-management):
+    python -m backend.benchmarks.bench_fanout --clients 5000 --rate 1000 --seconds 10
+    python -m backend.benchmarks.bench_fanout --clients 5000 --subscribe 40   # topic-filtered
+
+Needs the `websockets` package. REDIS_URL is cleared for the server, so
+events go through the in-process bridge.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+from fastapi import FastAPI
+
+from ..redis_client import PubSubManager
+from ..routers import websockets as ws_router
+
+app = FastAPI()
+app.include_router(ws_router.router)
+
+
+@app.post("/bench/start")
+def start_publishing(rate: int, seconds: float, vehicles: int = 1000):
+    """Publish `rate` events per second for `seconds`, from a worker thread"""
+    def publish():
+        tick = 0.01
+        per_tick = rate * tick
+        started = time.perf_counter()
+        sent = 0
+        while time.perf_counter() - started < seconds:
+            due = int((time.perf_counter() - started) / tick * per_tick) + 1
+            while sent < min(due, int(rate * seconds)):
+                PubSubManager.publish_update("fleet_updates", {
+                    "event": "bench", "vehicle_id": sent % vehicles, "seq": sent, "ts": time.time()
+                })
+                sent += 1
+            time.sleep(tick)
+
+    threading.Thread(target=publish, daemon=True).start()
+    return {"rate": rate, "seconds": seconds}
+
+
+# ---- Client side ----
+
+def run_clients(url: str, count: int, ready, go, duration: float, results, vehicles: int, subscribe: int, seed: int):
+    import random
+    import websockets
+
+    rng = random.Random(seed)
+
+    async def client(stats, done):
+        async with websockets.connect(url, open_timeout=120, max_queue=None, ping_interval=None) as ws:
+            if subscribe:
+                vehicle_ids = rng.sample(range(vehicles), subscribe)
+                await ws.send(json.dumps({"action": "subscribe", "vehicle_ids": vehicle_ids}))
+            stats["connected"] += 1
+            while not done.is_set():
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+                received = time.time()
+                stats["frames"] += 1
+                # Clients stay cheap so the server is what gets measured: count
+                # events without decoding the frame, decode only the newest one
+                stats["events"] += raw.count('"seq"')
+                if '"ping"' in raw:
+                    await ws.send("pong")
+                if '"gap"' in raw:
+                    stats["missed"] += sum(e["missed"] for e in json.loads(raw) if e.get("type") == "gap")
+                last = raw.rfind('{"event"')
+                if last != -1:
+                    stats["latencies"].append(received - json.loads(raw[last:-1])["ts"])
+
+    async def main():
+        stats = {"connected": 0, "frames": 0, "events": 0, "missed": 0, "latencies": []}
+        done = asyncio.Event()
+        tasks = []
+        for _ in range(count):
+            tasks.append(asyncio.create_task(client(stats, done)))
+            await asyncio.sleep(0.001)
+        while stats["connected"] < count:
+            if any(t.done() for t in tasks):
+                break
+            await asyncio.sleep(0.05)
+        ready.put(stats["connected"])
+        await asyncio.to_thread(go.wait)
+        await asyncio.sleep(duration)
+        done.set()
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        stats["errors"] = sum(1 for outcome in outcomes if isinstance(outcome, Exception))
+        results.put(stats)
+
+    asyncio.run(main())
+
+
+def raise_fd_limit(wanted: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, wanted)), hard))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--rate", type=int, default=1000, help="events published per second")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--client-procs", type=int, default=4)
+    parser.add_argument("--flush", type=float, default=0.1, help="FANOUT_FLUSH_SECONDS for the server")
+    parser.add_argument("--vehicles", type=int, default=1000, help="distinct vehicle ids in the events")
+    parser.add_argument("--subscribe", type=int, default=0,
+                        help="vehicles each client subscribes to (0: every client gets every event)")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    raise_fd_limit(args.clients * 2 + 256)
+    env = dict(os.environ, FANOUT_FLUSH_SECONDS=str(args.flush))
+    env.pop("REDIS_URL", None)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.benchmarks.bench_fanout:app", "--port", str(args.port),
+         "--log-level", "warning", "--backlog", str(args.clients), "--ws-per-message-deflate", "false"],
+        env=env,
+    )
+    procs = []
+    try:
+        time.sleep(2)
+        ready, results, go = multiprocessing.Queue(), multiprocessing.Queue(), multiprocessing.Event()
+        url = f"ws://127.0.0.1:{args.port}/ws"
+        per_proc = [args.clients // args.client_procs + (i < args.clients % args.client_procs)
+                    for i in range(args.client_procs)]
+        started = time.perf_counter()
+        for seed, count in enumerate(per_proc):
+            proc = multiprocessing.Process(
+                target=run_clients,
+                args=(url, count, ready, go, args.seconds + 2, results, args.vehicles, args.subscribe, seed),
+            )
+            proc.start()
+            procs.append(proc)
+        connected = sum(ready.get() for _ in procs)
+        print(f"{connected}/{args.clients} clients connected in {time.perf_counter() - started:.1f} s")
+
+        go.set()
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{args.port}/bench/start?rate={args.rate}&seconds={args.seconds}&vehicles={args.vehicles}",
+            method="POST",
+        )
+        urllib.request.urlopen(request).read()
+        stats = [results.get() for _ in procs]
+
+        published = int(args.rate * args.seconds)
+        events = sum(s["events"] for s in stats)
+        frames = sum(s["frames"] for s in stats)
+        missed = sum(s["missed"] for s in stats)
+        latencies = sorted(l for s in stats for l in s["latencies"])
+        print(f"published {published} events ({args.rate}/s for {args.seconds:.0f} s) to {connected} clients")
+        # Every client sees every event, or only those of the vehicles it subscribed to
+        expected = published * connected if not args.subscribe else published * connected * args.subscribe // args.vehicles
+        print(f"delivered {events} of {expected} expected events "
+              f"({events / max(1, expected):.1%}), {missed} skipped by backpressure, "
+              f"{sum(s['errors'] for s in stats)} client errors")
+        print(f"throughput {events / args.seconds:,.0f} events/s in {frames / args.seconds:,.0f} frames/s "
+              f"({frames / max(1, connected) / args.seconds:.1f} frames/s per client)")
+        if latencies:
+            print(f"publish -> receive latency: p50 {statistics.median(latencies) * 1000:.0f} ms, "
+                  f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.0f} ms, "
+                  f"max {latencies[-1] * 1000:.0f} ms")
+    finally:
+        for proc in procs:
+            proc.join(timeout=10)
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
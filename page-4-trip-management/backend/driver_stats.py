@@ -0,0 +1,32 @@
+"""
+Stored driver trip statistics.
+
+drivers.trip_completion_rate is completed trips / all trips of the driver, in
+% (100 for a driver without trips). A new trip changes it, so create_trip
+recomputes its driver's rate in the same transaction, with the same UPDATE
+the main backend runs on its trip transitions.
+"""
+from typing import Iterable
+
+from sqlalchemy import Float, case, cast, func, select, update
+from sqlalchemy.orm import Session
+
+from .models import Driver, Trip, TripStatus
+
+NO_TRIPS_RATE = 100.0
+
+
+def refresh_completion_rates(db: Session, driver_ids: Iterable[int]) -> int:
+    """Recompute the stored rates of the given drivers with one UPDATE"""
+    driver_ids = sorted(set(driver_ids))
+    if not driver_ids:
+        return 0
+    rate = select(
+        cast(func.sum(case((Trip.status == TripStatus.COMPLETED, 1), else_=0)), Float) * 100 / func.count(Trip.id)
+    ).where(Trip.driver_id == Driver.id).scalar_subquery()
+    return db.execute(
+        update(Driver)
+        .where(Driver.id.in_(driver_ids))
+        .values(trip_completion_rate=func.coalesce(rate, NO_TRIPS_RATE))
+        .execution_options(synchronize_session=False)
+    ).rowcount
@@ -0,0 +1,408 @@
+"""
+WebSocket broadcast hub for fleet updates.
+
+Every published event is serialized once and appended to a shared, bounded
+event log. Each connection has its own cursor into that log and its own
+sender task, so the outbound queue of a connection is the stretch between
+its cursor and the head of the log, capped at FANOUT_QUEUE_SIZE events.
+Publishing is O(1) however many sockets are open; the per-connection work
+happens in the sender tasks, and one slow client only holds up its own task.
+
+Senders coalesce: everything that arrived since the last send goes out as
+one frame (a JSON array of events), at most one frame per connection every
+FANOUT_FLUSH_SECONDS. Senders that have just sent wait on one shared flush
+tick rather than a timer each.
+
+Backpressure: a client that falls more than FANOUT_QUEUE_SIZE events behind
+skips ahead to the oldest retained event and gets a {"type": "gap",
+"missed": n} marker so it can reload. Once it has missed more than
+FANOUT_MAX_MISSED events in a row, or a single send has been stuck for longer
+than FANOUT_SEND_TIMEOUT (checked on each heartbeat), the connection is
+closed with 1013 (try again later).
+
+Topics: a new connection receives every event. Clients narrow that down by
+sending {"action": "subscribe", "vehicle_ids": [...], "driver_ids": [...],
+"vehicle_types": [...], "events": [...]} (and "unsubscribe" with the same
+keys); the first subscribe replaces "everything" with the named topics, and
+{"action": "subscribe", "all": true} restores it. An event matches the
+topics of its vehicle_id, driver_id, vehicle_type and event fields. Filtered
+connections are found through a topic -> connections index and get the
+event appended to their own bounded queue, so publishing costs
+O(subscribers of the event's topics) on top of the O(1) log append.
+
+Heartbeat: {"type": "ping"} is broadcast every FANOUT_HEARTBEAT_SECONDS.
+Clients reply with any message; connections silent for FANOUT_IDLE_SECONDS
+are closed with 1001.
+
+Dispatchers: the hub counts open connections per dispatcher_id, so the /ws
+endpoint releases a dispatcher's vehicle locks only when their last
+connection in this worker closes.
+
+For large audiences run uvicorn with --ws-per-message-deflate false:
+compression state is per connection, so every frame would be compressed
+once per client (about 3.5x less throughput in benchmarks/bench_fanout.py).
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+FANOUT_QUEUE_SIZE = int(os.getenv("FANOUT_QUEUE_SIZE", "1000"))
+FANOUT_MAX_MISSED = int(os.getenv("FANOUT_MAX_MISSED", "5000"))
+FANOUT_FLUSH_SECONDS = float(os.getenv("FANOUT_FLUSH_SECONDS", "0.1"))
+FANOUT_SEND_TIMEOUT = float(os.getenv("FANOUT_SEND_TIMEOUT", "10"))
+FANOUT_HEARTBEAT_SECONDS = float(os.getenv("FANOUT_HEARTBEAT_SECONDS", "20"))
+FANOUT_IDLE_SECONDS = float(os.getenv("FANOUT_IDLE_SECONDS", "60"))
+
+CLOSE_GOING_AWAY = 1001
+CLOSE_TRY_AGAIN_LATER = 1013
+
+PING = json.dumps({"type": "ping"})
+
+logger = logging.getLogger(__name__)
+
+# Subscription keys -> topic prefix; an event's topics come from the matching fields
+TOPIC_KEYS = {
+    "vehicle_ids": "vehicle",
+    "driver_ids": "driver",
+    "vehicle_types": "vehicle_type",
+    "events": "event",
+}
+TOPIC_FIELDS = {"vehicle_id": "vehicle", "driver_id": "driver", "vehicle_type": "vehicle_type", "event": "event"}
+
+
+def event_topics(message: dict) -> List[str]:
+    return [
+        f"{prefix}:{message[field]}"
+        for field, prefix in TOPIC_FIELDS.items()
+        if message.get(field) is not None
+    ]
+
+
+def requested_topics(request: dict) -> Set[str]:
+    """Topics named in a subscribe/unsubscribe request"""
+    return {
+        f"{prefix}:{value}"
+        for key, prefix in TOPIC_KEYS.items()
+        for value in request.get(key) or ()
+    }
+
+
+class Connection:
+    def __init__(self, hub: "FanoutHub", websocket, dispatcher_id: Optional[int] = None):
+        self.hub = hub
+        self.websocket = websocket
+        self.dispatcher_id = dispatcher_id
+        self.topics: Optional[Set[str]] = None  # None: every event, from the shared log
+        self.cursor = hub.head  # next shared-log event to send
+        self.pending: Deque[str] = deque()  # topic matches and direct replies
+        self.dropped = 0        # pending events dropped since the last send
+        self.missed = 0         # events skipped since the client last caught up
+        self.frames_sent = 0
+        self.send_started: Optional[float] = None  # set while a send is in flight
+        self.last_seen = time.monotonic()
+        self.closed = False
+        self.evicted = False    # closed by the hub rather than by the client
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def filtered(self) -> bool:
+        return self.topics is not None
+
+    def touch(self):
+        """The client sent something: it is alive"""
+        self.last_seen = time.monotonic()
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def push(self, text: str):
+        """Queue an event for this connection only"""
+        if len(self.pending) >= self.hub.queue_size:
+            self.pending.popleft()
+            self.dropped += 1
+        self.pending.append(text)
+        self.wake()
+
+    def wake(self):
+        if self.filtered:
+            self._wake.set()
+        else:
+            # Unfiltered senders sleep on the hub's shared waiter
+            self.hub.wake_all()
+
+    async def close(self, code: int):
+        if self.closed:
+            return
+        self.evicted = True
+        self.hub.disconnect(self)
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), self.hub.send_timeout)
+        except Exception:
+            pass  # already gone
+
+    def _take(self) -> Optional[Tuple[List[str], int]]:
+        """(events to send, events missed) or None if there is nothing yet"""
+        events, missed = list(self.pending), self.dropped
+        self.pending.clear()
+        self.dropped = 0
+        if not self.filtered and self.cursor != self.hub.head:
+            shared, self.cursor, skipped = self.hub.read(self.cursor)
+            events += shared
+            missed += skipped
+        return (events, missed) if events or missed else None
+
+    async def _run(self):
+        try:
+            while not self.closed:
+                batch = self._take()
+                if batch is None:
+                    if self.filtered:
+                        self._wake.clear()
+                        await self._wake.wait()
+                    else:
+                        await self.hub.wait_for_events()
+                    continue
+
+                events, missed = batch
+                if missed:
+                    self.missed += missed
+                    if self.missed > self.hub.max_missed:
+                        await self.close(CLOSE_TRY_AGAIN_LATER)
+                        return
+                    events.insert(0, json.dumps({"type": "gap", "missed": missed}))
+                else:
+                    self.missed = 0
+
+                frame = "[" + ",".join(events) + "]"
+                # No wait_for here: it costs a task per send. Stuck sends
+                # are closed by the heartbeat instead.
+                self.send_started = time.monotonic()
+                await self.websocket.send_text(frame)
+                self.send_started = None
+                self.frames_sent += 1
+                # Events published while we wait ride in the next frame
+                await self.hub.next_flush()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Client went away mid-send; the receive loop cleans up too
+            self.hub.disconnect(self)
+
+
+class FanoutHub:
+    def __init__(self, queue_size: int = FANOUT_QUEUE_SIZE, max_missed: int = FANOUT_MAX_MISSED,
+                 flush_interval: float = FANOUT_FLUSH_SECONDS, send_timeout: float = FANOUT_SEND_TIMEOUT,
+                 heartbeat_interval: float = FANOUT_HEARTBEAT_SECONDS, idle_timeout: float = FANOUT_IDLE_SECONDS):
+        self.queue_size = queue_size
+        self.max_missed = max_missed
+        self.flush_interval = flush_interval
+        self.send_timeout = send_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.connections: Set[Connection] = set()
+        self._dispatchers: Dict[int, int] = {}  # dispatcher_id -> open connections
+        self.published = 0
+        self._index: Dict[str, Set[Connection]] = {}  # topic -> filtered connections
+        self._log: List[str] = []
+        self._base = 0  # sequence number of self._log[0]
+        self._waiter: Optional[asyncio.Future] = None
+        self._flush: Optional[asyncio.Future] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    @property
+    def head(self) -> int:
+        """Sequence number the next published event will get"""
+        return self._base + len(self._log)
+
+    def connect(self, websocket, dispatcher_id: Optional[int] = None) -> Connection:
+        """Register an accepted WebSocket and start its sender task"""
+        self._loop = asyncio.get_running_loop()
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = self._loop.create_task(self._run_heartbeat())
+        connection = Connection(self, websocket, dispatcher_id)
+        self.connections.add(connection)
+        if dispatcher_id is not None:
+            self._dispatchers[dispatcher_id] = self._dispatchers.get(dispatcher_id, 0) + 1
+        connection.start()
+        return connection
+
+    def disconnect(self, connection: Connection):
+        connection.closed = True
+        if connection in self.connections:
+            self.connections.discard(connection)
+            dispatcher_id = connection.dispatcher_id
+            if dispatcher_id is not None:
+                self._dispatchers[dispatcher_id] -= 1
+                if not self._dispatchers[dispatcher_id]:
+                    del self._dispatchers[dispatcher_id]
+        self._unindex(connection, connection.topics or ())
+        task = connection._task
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+
+    def is_connected(self, dispatcher_id: int) -> bool:
+        """Whether the dispatcher still has a connection open to this hub"""
+        return dispatcher_id in self._dispatchers
+
+    # ---- Subscriptions ----
+
+    def subscribe(self, connection: Connection, topics: Iterable[str]):
+        if not connection.filtered:
+            # First subscribe: from every event to just these topics. The
+            # sender may be asleep on the shared waiter, so wake it to switch.
+            connection.topics = set()
+            self.wake_all()
+        for topic in topics:
+            self._index.setdefault(topic, set()).add(connection)
+            connection.topics.add(topic)
+
+    def unsubscribe(self, connection: Connection, topics: Iterable[str]):
+        if connection.filtered:
+            topics = set(topics) & connection.topics
+            connection.topics -= topics
+            self._unindex(connection, topics)
+
+    def subscribe_all(self, connection: Connection):
+        if connection.filtered:
+            self._unindex(connection, connection.topics)
+            connection.topics = None
+            connection.cursor = self.head
+            connection._wake.set()
+
+    def _unindex(self, connection: Connection, topics: Iterable[str]):
+        for topic in topics:
+            subscribers = self._index.get(topic)
+            if subscribers is not None:
+                subscribers.discard(connection)
+                if not subscribers:
+                    del self._index[topic]
+
+    def handle_message(self, connection: Connection, text: str):
+        """Apply a subscribe/unsubscribe request sent by the client; other messages are ignored"""
+        try:
+            request = json.loads(text)
+        except ValueError:
+            return
+        if not isinstance(request, dict) or request.get("action") not in ("subscribe", "unsubscribe"):
+            return
+        try:
+            topics = requested_topics(request)
+        except TypeError:
+            connection.push(json.dumps({"type": "error", "detail": "Topic lists must be arrays."}))
+            return
+
+        if request["action"] == "subscribe":
+            if request.get("all"):
+                self.subscribe_all(connection)
+            elif topics:
+                self.subscribe(connection, topics)
+        else:
+            self.unsubscribe(connection, topics)
+        current = None if connection.topics is None else sorted(connection.topics)
+        connection.push(json.dumps({"type": "subscriptions", "topics": current}))
+
+    # ---- Publishing ----
+
+    def publish(self, message: dict):
+        """Broadcast from the event loop thread"""
+        self._publish(json.dumps(message, default=str), event_topics(message))
+
+    def publish_text(self, text: str):
+        """Broadcast an already serialized event"""
+        topics = ()
+        if self._index:
+            try:
+                topics = event_topics(json.loads(text))
+            except (ValueError, AttributeError):
+                pass
+        self._publish(text, topics)
+
+    def _publish(self, text: str, topics: Iterable[str]):
+        # Unfiltered connections: one append to the shared log
+        self._log.append(text)
+        self.published += 1
+        if len(self._log) >= 2 * self.queue_size:
+            # Amortized trim: keep the newest queue_size events
+            drop = len(self._log) - self.queue_size
+            del self._log[:drop]
+            self._base += drop
+        self.wake_all()
+
+        # Filtered connections: only the subscribers of this event's topics
+        targets = set()
+        for topic in topics:
+            targets |= self._index.get(topic, set())
+        for connection in targets:
+            connection.push(text)
+
+    def wake_all(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def publish_threadsafe(self, message: dict):
+        """Broadcast from a worker thread (sync routes); no-op until a client has connected"""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.publish, message)
+
+    def read(self, cursor: int) -> Tuple[List[str], int, int]:
+        """(events from cursor to head, new cursor, events skipped because the cursor fell too far behind)"""
+        oldest = max(self._base, self.head - self.queue_size)
+        missed = max(0, oldest - cursor)
+        start = max(cursor, oldest) - self._base
+        return self._log[start:], self.head, missed
+
+    async def wait_for_events(self):
+        # One future shared by every idle sender: a publish wakes them all at once
+        if self._waiter is None or self._waiter.done():
+            self._waiter = asyncio.get_running_loop().create_future()
+        await self._waiter
+
+    async def next_flush(self):
+        # One timer per flush interval, shared by every sender that just sent
+        if self.flush_interval <= 0:
+            await asyncio.sleep(0)
+            return
+        if self._flush is None:
+            loop = asyncio.get_running_loop()
+            self._flush = loop.create_future()
+            loop.call_later(self.flush_interval, self._release_flush)
+        await self._flush
+
+    def _release_flush(self):
+        flush, self._flush = self._flush, None
+        if flush is not None and not flush.done():
+            flush.set_result(None)
+
+    async def _run_heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if not self.connections:
+                continue
+            now = time.monotonic()
+            for connection in [c for c in self.connections if c.last_seen < now - self.idle_timeout]:
+                await connection.close(CLOSE_GOING_AWAY)
+            stuck_since = now - self.send_timeout
+            for connection in [c for c in self.connections
+                               if c.send_started is not None and c.send_started < stuck_since]:
+                await connection.close(CLOSE_TRY_AGAIN_LATER)
+            self._publish(PING, ())
+            for connection in self.connections:
+                if connection.filtered:
+                    connection.push(PING)
+
+    def stop(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        for connection in list(self.connections):
+            self.disconnect(connection)
+
+
+hub = FanoutHub()
@@ -4,6 +4,7 @@ import asyncio
 
 from . import models, database
 from .routers import dispatcher, websockets
+from .outbox import outbox_relay
 
 # Initialize Database
 database.init_db()
@@ -38,6 +39,13 @@ async def startup_event():
     """Start up necessary background tasks."""
     # Launch async task to subscribe to redis pubsub
     asyncio.create_task(websockets.subscribe_redis())
+    # Publish committed outbox events (trip/vehicle state changes)
+    outbox_relay.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    outbox_relay.stop()
+    websockets.hub.stop()
 
 @app.get("/")
 def read_root():
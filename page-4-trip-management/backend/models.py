@@ -1,6 +1,6 @@
 from enum import Enum as PyEnum
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, Enum, Date, DateTime, Text
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, Enum, Date, DateTime, Text, UniqueConstraint
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -114,3 +114,22 @@ class ExpenseLog(Base):
 
     vehicle = relationship("Vehicle", back_populates="expense_logs")
     trip = relationship("Trip", back_populates="expense_logs")
+
+class OutboxEvent(Base):
+    """State change event written in the same transaction as the change; relayed by outbox.py"""
+    __tablename__ = "outbox_events"
+    __table_args__ = (UniqueConstraint("vehicle_id", "sequence", name="uq_outbox_events_vehicle_sequence"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    channel = Column(String, nullable=False)
+    vehicle_id = Column(Integer, ForeignKey("vehicles.id"), nullable=False)
+    sequence = Column(Integer, nullable=False)  # Per vehicle, starting at 1
+    payload = Column(Text, nullable=False)      # JSON
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class OutboxSequence(Base):
+    """Last outbox sequence number handed out per vehicle"""
+    __tablename__ = "outbox_sequences"
+
+    vehicle_id = Column(Integer, ForeignKey("vehicles.id"), primary_key=True)
+    last_sequence = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,155 @@
+"""
+Transactional outbox for fleet update events.
+
+Routes call enqueue_event() before they commit, so the event row is written
+in the same transaction as the state change and exists exactly when the
+change does. OutboxRelay drains the table in id order and publishes each
+batch through PubSubManager (to Redis, or straight to this process's
+WebSocket hub). Then it deletes the rows. If the process dies between
+publishing and deleting, the batch is published again. Delivery is
+therefore at-least-once, and consumers drop repeats by
+(vehicle_id, sequence).
+
+Sequence numbers are per vehicle and come from an upsert on
+outbox_sequences. That row stays locked until the writing transaction ends,
+so two transactions for the same vehicle get their numbers in commit order.
+The relay locks the rows it drains (FOR UPDATE), so relays in several
+workers take turns instead of interleaving one vehicle's events.
+
+The relay polls every OUTBOX_POLL_SECONDS. A commit in this process that
+wrote an outbox row wakes it right away.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .models import OutboxEvent, OutboxSequence
+from .redis_client import PubSubManager
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+
+logger = logging.getLogger(__name__)
+
+_UPSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+_PENDING_INFO_KEY = "outbox_pending"
+
+
+def _next_sequence(db: Session, vehicle_id: int) -> int:
+    insert = _UPSERTS[db.get_bind().dialect.name]
+    statement = insert(OutboxSequence).values(vehicle_id=vehicle_id, last_sequence=1)
+    statement = statement.on_conflict_do_update(
+        index_elements=[OutboxSequence.vehicle_id],
+        set_={"last_sequence": OutboxSequence.last_sequence + 1},
+    ).returning(OutboxSequence.last_sequence)
+    return db.execute(statement).scalar_one()
+
+
+def enqueue_event(db: Session, channel: str, message: dict) -> dict:
+    """Stage an event for the vehicle in message["vehicle_id"]; it is published once the transaction commits.
+
+    Returns the message with its "sequence" number added.
+    """
+    vehicle_id = message["vehicle_id"]
+    message = {**message, "sequence": _next_sequence(db, vehicle_id)}
+    db.add(OutboxEvent(
+        channel=channel,
+        vehicle_id=vehicle_id,
+        sequence=message["sequence"],
+        payload=json.dumps(message, default=str),
+    ))
+    db.info[_PENDING_INFO_KEY] = True
+    return message
+
+
+class OutboxRelay:
+    def __init__(self, session_factory, batch_size: int = OUTBOX_BATCH_SIZE,
+                 poll_interval: float = OUTBOX_POLL_SECONDS, publish=None):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.publish = publish or PubSubManager.publish_batch
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="outbox-relay", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def notify(self):
+        """New events were committed: drain now instead of at the next poll"""
+        self._wake.set()
+
+    def drain_once(self) -> int:
+        """Publish and delete one batch; returns how many events it held"""
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(OutboxEvent)
+                .order_by(OutboxEvent.id)
+                .limit(self.batch_size)
+                .with_for_update()
+                .all()
+            )
+            if not rows:
+                return 0
+            # Consecutive events on the same channel go out together, in id order
+            start = 0
+            for end in range(1, len(rows) + 1):
+                if end == len(rows) or rows[end].channel != rows[start].channel:
+                    self.publish(rows[start].channel, [json.loads(row.payload) for row in rows[start:end]])
+                    start = end
+            db.query(OutboxEvent).filter(OutboxEvent.id.in_([row.id for row in rows])).delete(
+                synchronize_session=False
+            )
+            db.commit()
+            return len(rows)
+        finally:
+            db.close()
+
+    def drain(self) -> int:
+        """Publish everything currently in the outbox"""
+        total = 0
+        while True:
+            drained = self.drain_once()
+            total += drained
+            if drained < self.batch_size:
+                return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                self.drain()
+            except Exception:
+                logger.exception("Outbox relay failed; events stay queued")
+            self._wake.wait(self.poll_interval)
+
+
+outbox_relay = OutboxRelay(SessionLocal)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_relay(session):
+    if session.info.pop(_PENDING_INFO_KEY, False):
+        outbox_relay.notify()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_INFO_KEY, None)
@@ -1,44 +1,268 @@
+import os
+import time
+import threading
 import redis
 import json
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
-# REDIS_URL = "redis://localhost:6379/0"
+# Set REDIS_URL (e.g. redis://localhost:6379/0) to share vehicle locks between
+# workers; without it locks are held in-process, which is only correct for a
+# single worker.
+REDIS_URL = os.getenv("REDIS_URL")
+
+redis_client = redis.from_url(REDIS_URL, decode_responses=True) if REDIS_URL else None
+
+
+class InProcessLockBackend:
+    """Vehicle leases in a dict, timed with the monotonic clock.
+
+    Every operation is a few dict lookups under one threading.Lock and never
+    awaits, so it is safe from request threads and the event loop alike.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._locks: Dict[int, Tuple[str, float]] = {}  # vehicle_id -> (owner, expires_at)
+        self._owned: Dict[str, Set[int]] = {}           # owner -> vehicle ids
+        self._mutex = threading.Lock()
+
+    def _current(self, vehicle_id: int, now: float) -> Optional[str]:
+        lease = self._locks.get(vehicle_id)
+        if lease is None:
+            return None
+        owner, expires_at = lease
+        if expires_at <= now:
+            self._drop(vehicle_id, owner)
+            return None
+        return owner
+
+    def _drop(self, vehicle_id: int, owner: str):
+        del self._locks[vehicle_id]
+        owned = self._owned.get(owner)
+        if owned is not None:
+            owned.discard(vehicle_id)
+            if not owned:
+                del self._owned[owner]
+
+    def acquire(self, vehicle_id: int, owner: str, ttl: float) -> bool:
+        with self._mutex:
+            now = self._clock()
+            current = self._current(vehicle_id, now)
+            if current is not None and current != owner:
+                return False
+            self._locks[vehicle_id] = (owner, now + ttl)
+            self._owned.setdefault(owner, set()).add(vehicle_id)
+            return True
+
+    def renew(self, vehicle_id: int, owner: str, ttl: float) -> bool:
+        with self._mutex:
+            now = self._clock()
+            if self._current(vehicle_id, now) != owner:
+                return False
+            self._locks[vehicle_id] = (owner, now + ttl)
+            return True
+
+    def release(self, vehicle_id: int, owner: str) -> bool:
+        with self._mutex:
+            if self._current(vehicle_id, self._clock()) != owner:
+                return False
+            self._drop(vehicle_id, owner)
+            return True
+
+    def release_all(self, owner: str) -> int:
+        with self._mutex:
+            now = self._clock()
+            released = 0
+            for vehicle_id in list(self._owned.get(owner, ())):
+                if self._current(vehicle_id, now) == owner:
+                    self._drop(vehicle_id, owner)
+                    released += 1
+            return released
+
+    def owner(self, vehicle_id: int) -> Optional[str]:
+        with self._mutex:
+            return self._current(vehicle_id, self._clock())
+
+    def clear(self):
+        with self._mutex:
+            self._locks.clear()
+            self._owned.clear()
+
+
+class RedisLockBackend:
+    """Vehicle leases as Redis keys with PX expiry.
+
+    Owner checks run inside Lua scripts, so compare-and-delete and
+    compare-and-renew are atomic on the server. Each owner also has a set of
+    the vehicles it locked, used to release everything on disconnect.
+    """
+
+    KEY_PREFIX = "vehicle_lock:"
+    OWNER_PREFIX = "vehicle_lock_owner:"
+
+    # KEYS: lock key, owner set; ARGV: owner, ttl ms, vehicle id
+    ACQUIRE = """
+    local current = redis.call('GET', KEYS[1])
+    if current and current ~= ARGV[1] then
+        return 0
+    end
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    redis.call('SADD', KEYS[2], ARGV[3])
+    if redis.call('PTTL', KEYS[2]) < tonumber(ARGV[2]) then
+        redis.call('PEXPIRE', KEYS[2], ARGV[2])
+    end
+    return 1
+    """
+
+    # KEYS: lock key, owner set; ARGV: owner, ttl ms
+    RENEW = """
+    if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+        return 0
+    end
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    if redis.call('PTTL', KEYS[2]) < tonumber(ARGV[2]) then
+        redis.call('PEXPIRE', KEYS[2], ARGV[2])
+    end
+    return 1
+    """
+
+    # KEYS: lock key, owner set; ARGV: owner, vehicle id
+    RELEASE = """
+    if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+        return 0
+    end
+    redis.call('DEL', KEYS[1])
+    redis.call('SREM', KEYS[2], ARGV[2])
+    return 1
+    """
+
+    # KEYS: owner set; ARGV: owner, lock key prefix
+    RELEASE_ALL = """
+    local released = 0
+    for _, vehicle_id in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+        local key = ARGV[2] .. vehicle_id
+        if redis.call('GET', key) == ARGV[1] then
+            redis.call('DEL', key)
+            released = released + 1
+        end
+    end
+    redis.call('DEL', KEYS[1])
+    return released
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._acquire = client.register_script(self.ACQUIRE)
+        self._renew = client.register_script(self.RENEW)
+        self._release = client.register_script(self.RELEASE)
+        self._release_all = client.register_script(self.RELEASE_ALL)
+
+    def _keys(self, vehicle_id: int, owner: str):
+        return [f"{self.KEY_PREFIX}{vehicle_id}", f"{self.OWNER_PREFIX}{owner}"]
+
+    def acquire(self, vehicle_id: int, owner: str, ttl: float) -> bool:
+        return bool(self._acquire(keys=self._keys(vehicle_id, owner), args=[owner, int(ttl * 1000), vehicle_id]))
+
+    def renew(self, vehicle_id: int, owner: str, ttl: float) -> bool:
+        return bool(self._renew(keys=self._keys(vehicle_id, owner), args=[owner, int(ttl * 1000)]))
+
+    def release(self, vehicle_id: int, owner: str) -> bool:
+        return bool(self._release(keys=self._keys(vehicle_id, owner), args=[owner, vehicle_id]))
+
+    def release_all(self, owner: str) -> int:
+        return int(self._release_all(keys=[f"{self.OWNER_PREFIX}{owner}"], args=[owner, self.KEY_PREFIX]))
+
+    def owner(self, vehicle_id: int) -> Optional[str]:
+        value = self.client.get(f"{self.KEY_PREFIX}{vehicle_id}")
+        if isinstance(value, bytes):
+            value = value.decode()
+        return value
+
+    def clear(self):
+        for pattern in (f"{self.KEY_PREFIX}*", f"{self.OWNER_PREFIX}*"):
+            keys = list(self.client.scan_iter(pattern))
+            if keys:
+                self.client.delete(*keys)
 
-# redis_client = redis.from_url(REDIS_URL, decode_responses=True)
-redis_client = None
 
 class VehicleLockManager:
-    """Manages temporary Redis locks for vehicles being dispatched. (MOCKED)"""
-    
-    @staticmethod
-    def lock_vehicle(vehicle_id: int, dispatcher_id: int, expire_seconds: int = 300) -> bool:
-        """Attempts to acquire a lock on a vehicle. Returns True if successful."""
-        # lock_key = f"vehicle_lock:{vehicle_id}"
-        # return redis_client.set(lock_key, dispatcher_id, ex=expire_seconds, nx=True)
-        return True
-    
-    @staticmethod
-    def unlock_vehicle(vehicle_id: int, dispatcher_id: int) -> bool:
+    """Manages temporary locks for vehicles being dispatched.
+
+    Backed by Redis when REDIS_URL is set, otherwise by an in-process lease table.
+    """
+
+    backend = RedisLockBackend(redis_client) if redis_client else InProcessLockBackend()
+
+    @classmethod
+    def use_backend(cls, backend):
+        cls.backend = backend
+
+    @classmethod
+    def lock_vehicle(cls, vehicle_id: int, dispatcher_id: int, expire_seconds: int = 300) -> bool:
+        """Attempts to acquire a lock on a vehicle. Returns True if successful.
+
+        Locking a vehicle the dispatcher already holds succeeds and restarts its lease.
+        """
+        return cls.backend.acquire(vehicle_id, str(dispatcher_id), expire_seconds)
+
+    @classmethod
+    def renew_lock(cls, vehicle_id: int, dispatcher_id: int, expire_seconds: int = 300) -> bool:
+        """Extends the lease of a lock the dispatcher holds."""
+        return cls.backend.renew(vehicle_id, str(dispatcher_id), expire_seconds)
+
+    @classmethod
+    def unlock_vehicle(cls, vehicle_id: int, dispatcher_id: int) -> bool:
         """Releases the lock on a vehicle if it belongs to the dispatcher."""
-        # lock_key = f"vehicle_lock:{vehicle_id}"
-        # current_lock = redis_client.get(lock_key)
-        # 
-        # if current_lock and str(current_lock) == str(dispatcher_id):
-        #     redis_client.delete(lock_key)
-        #     return True
-        # return False
-        return True
-
-    @staticmethod
-    def is_locked(vehicle_id: int) -> bool:
+        return cls.backend.release(vehicle_id, str(dispatcher_id))
+
+    @classmethod
+    def unlock_all(cls, dispatcher_id: int) -> int:
+        """Releases every lock held by the dispatcher; returns how many were released."""
+        return cls.backend.release_all(str(dispatcher_id))
+
+    @classmethod
+    def lock_owner(cls, vehicle_id: int) -> Optional[int]:
+        """Dispatcher currently holding the vehicle, if any."""
+        owner = cls.backend.owner(vehicle_id)
+        return int(owner) if owner is not None else None
+
+    @classmethod
+    def is_locked(cls, vehicle_id: int) -> bool:
         """Checks if a vehicle is currently locked."""
-        # lock_key = f"vehicle_lock:{vehicle_id}"
-        # return redis_client.exists(lock_key) > 0
-        return False
+        return cls.backend.owner(vehicle_id) is not None
+
 
 class PubSubManager:
-    """Manages publishing simple real-time updates via Redis."""
-    
-    @staticmethod
-    def publish_update(channel: str, message: dict):
-        # redis_client.publish(channel, json.dumps(message))
-        pass
+    """Manages publishing simple real-time updates.
+
+    With Redis configured, updates go to the Redis channel and every worker's
+    WebSocket hub picks them up from there (see routers/websockets.py).
+    Without it they are handed straight to the in-process listeners.
+    """
+
+    _listeners: List[Callable[[str, dict], None]] = []
+
+    @classmethod
+    def add_listener(cls, listener: Callable[[str, dict], None]):
+        cls._listeners.append(listener)
+
+    @classmethod
+    def publish_update(cls, channel: str, message: dict):
+        if redis_client:
+            redis_client.publish(channel, json.dumps(message, default=str))
+            return
+        for listener in cls._listeners:
+            listener(channel, message)
+
+    @classmethod
+    def publish_batch(cls, channel: str, messages: List[dict]):
+        """Publish several updates in order, in one round trip when going through Redis"""
+        if redis_client:
+            with redis_client.pipeline(transaction=False) as pipe:
+                for message in messages:
+                    pipe.publish(channel, json.dumps(message, default=str))
+                pipe.execute()
+            return
+        for message in messages:
+            for listener in cls._listeners:
+                listener(channel, message)
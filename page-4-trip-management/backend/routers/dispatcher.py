@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session, aliased
+from typing import List, Optional
+from datetime import date
 
 from ..database import get_db
-from ..models import Vehicle, Driver, Trip, VehicleStatus, DriverStatus, TripStatus
-from ..schemas import VehicleSchema, DriverSchema, TripSchema, TripCreate
-from ..redis_client import VehicleLockManager, PubSubManager
+from ..models import Vehicle, Driver, Trip, VehicleStatus, VehicleType, DriverStatus, TripStatus
+from ..schemas import VehicleSchema, DriverSchema, TripSchema, TripCreate, AssignmentPlan
+from ..redis_client import VehicleLockManager
+from ..outbox import enqueue_event
+from ..driver_stats import refresh_completion_rates
+from ..assignment import propose_assignments
+from ..vehicle_index import available_vehicles
 
 router = APIRouter(prefix="/api", tags=["dispatcher"])
 
@@ -18,6 +23,32 @@ def get_available_vehicles(db: Session = Depends(get_db)):
     vehicles = db.query(Vehicle).filter(Vehicle.status == VehicleStatus.AVAILABLE).all()
     return vehicles
 
+@router.get("/vehicles/best-fit", response_model=VehicleSchema)
+def get_best_fit_vehicle(
+    cargo_weight: float = Query(..., gt=0),
+    vehicle_type: Optional[VehicleType] = None,
+    dispatcher_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    """Smallest available vehicle that can carry the cargo, skipping vehicles locked by other dispatchers."""
+    available_vehicles.ensure_fresh(db)
+    for _, vehicle_id in available_vehicles.candidates(cargo_weight, vehicle_type):
+        owner = VehicleLockManager.lock_owner(vehicle_id)
+        if owner is not None and owner != dispatcher_id:
+            continue
+
+        vehicle = db.query(Vehicle).filter(Vehicle.id == vehicle_id).first()
+        if not vehicle or vehicle.status != VehicleStatus.AVAILABLE:
+            # Changed by another worker since the index was loaded
+            available_vehicles.discard(vehicle_id)
+            continue
+        if vehicle.max_capacity < cargo_weight or (vehicle_type and vehicle.type != vehicle_type):
+            available_vehicles.update(vehicle.id, vehicle.max_capacity, vehicle.type)
+            continue
+        return vehicle
+
+    raise HTTPException(status_code=404, detail=f"No available vehicle can carry {cargo_weight} kg.")
+
 @router.post("/vehicles/{vehicle_id}/lock")
 def lock_vehicle(vehicle_id: int, dispatcher_id: int):
     """Dispatcher selects a vehicle; we lock it in Redis."""
@@ -26,6 +57,14 @@ def lock_vehicle(vehicle_id: int, dispatcher_id: int):
         raise HTTPException(status_code=409, detail="Vehicle is currently locked by another dispatcher.")
     return {"message": "Vehicle locked successfully."}
 
+@router.post("/vehicles/{vehicle_id}/lock/renew")
+def renew_vehicle_lock(vehicle_id: int, dispatcher_id: int):
+    """Dispatcher is still working on the vehicle; extend the lock lease."""
+    success = VehicleLockManager.renew_lock(vehicle_id, dispatcher_id)
+    if not success:
+        raise HTTPException(status_code=409, detail="You do not hold the lock on this vehicle (it may have expired).")
+    return {"message": "Vehicle lock renewed."}
+
 @router.post("/vehicles/{vehicle_id}/unlock")
 def unlock_vehicle(vehicle_id: int, dispatcher_id: int):
     """Dispatcher deselects a vehicle; remove the Redis lock."""
@@ -34,6 +73,12 @@ def unlock_vehicle(vehicle_id: int, dispatcher_id: int):
         raise HTTPException(status_code=400, detail="Could not retrieve or you do not own the lock on this vehicle.")
     return {"message": "Vehicle unlocked successfully."}
 
+@router.post("/dispatchers/{dispatcher_id}/unlock-all")
+def unlock_all_vehicles(dispatcher_id: int):
+    """Dispatcher leaves; release every vehicle they still hold."""
+    released = VehicleLockManager.unlock_all(dispatcher_id)
+    return {"message": f"Released {released} vehicle lock(s).", "released": released}
+
 # ----------------- #
 #  Drivers
 # ----------------- #
@@ -53,56 +98,92 @@ def get_available_drivers(db: Session = Depends(get_db)):
 def create_trip(trip: TripCreate, dispatcher_id: int, db: Session = Depends(get_db)):
     """Create a new trip. Validates cargo weight."""
     
-    # 1. Check if vehicle is locked by this dispatcher OR available to be locked
-    is_locked = VehicleLockManager.is_locked(trip.vehicle_id)
-    if is_locked and not VehicleLockManager.unlock_vehicle(trip.vehicle_id, dispatcher_id):
-          # Ensure the person making the trip request is actually the lock holder
-          raise HTTPException(status_code=409, detail="Vehicle is locked by another dispatcher.")
-
-    # 2. Get Vehicle & Driver
-    vehicle = db.query(Vehicle).filter(Vehicle.id == trip.vehicle_id).first()
-    driver = db.query(Driver).filter(Driver.id == trip.driver_id).first()
-
-    if not vehicle or vehicle.status != VehicleStatus.AVAILABLE:
-        raise HTTPException(status_code=400, detail="Vehicle is invalid or not available.")
-    
-    if not driver or driver.status != DriverStatus.ON_DUTY:
-        raise HTTPException(status_code=400, detail="Driver is invalid or not available.")
-
-    # 3. Validation Logic: Prevent trip creation if CargoWeight > MaxCapacity
-    if trip.cargo_weight > vehicle.max_capacity:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Cargo weight ({trip.cargo_weight}) exceeds vehicle capacity ({vehicle.max_capacity})."
+    # 1. Hold the vehicle lock while creating the trip: succeeds if this dispatcher
+    #    already holds it or nobody does, fails if another dispatcher holds it
+    already_held = VehicleLockManager.lock_owner(trip.vehicle_id) == dispatcher_id
+    if not VehicleLockManager.lock_vehicle(trip.vehicle_id, dispatcher_id):
+        raise HTTPException(status_code=409, detail="Vehicle is locked by another dispatcher.")
+
+    created = False
+    try:
+        # 2. Get Vehicle & Driver
+        vehicle = db.query(Vehicle).filter(Vehicle.id == trip.vehicle_id).first()
+        driver = db.query(Driver).filter(Driver.id == trip.driver_id).first()
+
+        if not vehicle or vehicle.status != VehicleStatus.AVAILABLE:
+            raise HTTPException(status_code=400, detail="Vehicle is invalid or not available.")
+
+        if not driver or driver.status != DriverStatus.ON_DUTY:
+            raise HTTPException(status_code=400, detail="Driver is invalid or not available.")
+
+        # 3. Validation Logic: Prevent trip creation if CargoWeight > MaxCapacity
+        if trip.cargo_weight > vehicle.max_capacity:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Cargo weight ({trip.cargo_weight}) exceeds vehicle capacity ({vehicle.max_capacity})."
+            )
+
+        # 4. Create Trip
+        new_trip = Trip(
+            vehicle_id=trip.vehicle_id,
+            driver_id=trip.driver_id,
+            cargo_weight=trip.cargo_weight,
+            start_location=trip.start_location,
+            end_location=trip.end_location,
+            status=TripStatus.DISPATCHED
         )
-    
-    # 4. Create Trip
-    new_trip = Trip(
-        vehicle_id=trip.vehicle_id,
-        driver_id=trip.driver_id,
-        cargo_weight=trip.cargo_weight,
-        start_location=trip.start_location,
-        end_location=trip.end_location,
-        status=TripStatus.DISPATCHED
-    )
-
-    # 5. Update Statuses
-    vehicle.status = VehicleStatus.ON_TRIP
-    # Note: Driver status remains ON_DUTY while on trip in the current DB schema.
-
-    db.add(new_trip)
-    db.commit()
-    db.refresh(new_trip)
-
-    # 6. Publish real-time update
-    PubSubManager.publish_update("fleet_updates", {
-        "event": "trip_created",
-        "trip_id": new_trip.id,
-        "vehicle_id": vehicle.id,
-        "driver_id": driver.id
-    })
-    
-    # Always unlock the vehicle lock on successful trip creation
-    VehicleLockManager.unlock_vehicle(trip.vehicle_id, dispatcher_id)
+
+        # 5. Update Statuses
+        vehicle.status = VehicleStatus.ON_TRIP
+        # Note: Driver status remains ON_DUTY while on trip in the current DB schema.
+
+        db.add(new_trip)
+        db.flush()
+        refresh_completion_rates(db, [driver.id])
+
+        # 6. Queue the real-time update in the same transaction; the outbox relay publishes it
+        enqueue_event(db, "fleet_updates", {
+            "event": "trip_created",
+            "trip_id": new_trip.id,
+            "vehicle_id": vehicle.id,
+            "vehicle_type": vehicle.type.value,
+            "driver_id": driver.id
+        })
+        db.commit()
+        db.refresh(new_trip)
+        created = True
+    finally:
+        # Always unlock once the trip exists. On failure only drop a lock this request
+        # took, so a dispatcher who selected the vehicle beforehand keeps it.
+        if created or not already_held:
+            VehicleLockManager.unlock_vehicle(trip.vehicle_id, dispatcher_id)
 
     return new_trip
+
+# ----------------- #
+#  Assignment
+# ----------------- #
+@router.get("/assignments/proposed", response_model=AssignmentPlan)
+def get_proposed_assignments(db: Session = Depends(get_db)):
+    """Propose a vehicle and driver for every pending DRAFT trip, wasting as little capacity as possible.
+
+    Nothing is written; dispatchers review the plan and create the trips.
+    """
+    trips = db.query(Trip.id, Trip.cargo_weight).filter(Trip.status == TripStatus.DRAFT).order_by(Trip.id).all()
+    vehicles = db.query(Vehicle.id, Vehicle.max_capacity, Vehicle.type).filter(
+        Vehicle.status == VehicleStatus.AVAILABLE
+    ).all()
+
+    # Drivers stay ON_DUTY while dispatched, so exclude those with a trip on the road
+    dispatched = aliased(Trip)
+    drivers = db.query(
+        Driver.id, Driver.license_category, Driver.license_expiry_date, Driver.performance_score
+    ).filter(
+        Driver.status == DriverStatus.ON_DUTY,
+        Driver.license_expiry_date >= date.today(),
+        ~db.query(dispatched.id).filter(
+            dispatched.driver_id == Driver.id, dispatched.status == TripStatus.DISPATCHED
+        ).exists(),
+    ).all()
+
+    return propose_assignments(trips, vehicles, drivers)
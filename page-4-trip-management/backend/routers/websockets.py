@@ -1,28 +1,61 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 import json
 import asyncio
+import logging
 import redis.asyncio as aioredis # Need async redis for websockets
+from typing import Optional
+
+from ..redis_client import REDIS_URL, VehicleLockManager, PubSubManager
+from ..fanout import hub
 
 router = APIRouter()
 
-# Store active websocket connections
-active_connections = []
+logger = logging.getLogger(__name__)
+
+FLEET_UPDATES_CHANNEL = "fleet_updates"
+
+# Without Redis, updates published in this process go straight to the hub
+PubSubManager.add_listener(lambda channel, message: hub.publish_threadsafe(message))
 
 async def subscribe_redis():
-    """Background task to listen to Redis and broadcast to WebSockets. (MOCKED)"""
-    pass
+    """Background task to listen to Redis and broadcast to WebSockets."""
+    if not REDIS_URL:
+        return
+    hub._loop = asyncio.get_running_loop()
+    while True:
+        try:
+            client = aioredis.from_url(REDIS_URL, decode_responses=True)
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(FLEET_UPDATES_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        # Already JSON: forwarded without re-serializing
+                        hub.publish_text(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Redis subscription dropped, reconnecting")
+            await asyncio.sleep(1)
 
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, dispatcher_id: Optional[int] = None):
     await websocket.accept()
-    active_connections.append(websocket)
+    connection = hub.connect(websocket, dispatcher_id)
     try:
         while True:
-            # We don't really expect clients to send messages right now for Page 4
-            # We just keep the connection open to push updates
-            data = await websocket.receive_text()
-            # Echo back just as an example
-            await websocket.send_text(f"Message text was: {data}")
-    except WebSocketDisconnect:
-        active_connections.remove(websocket)
+            # Updates are pushed by the hub. Clients send subscribe/unsubscribe
+            # requests; anything else (e.g. a reply to a ping) just proves they are alive
+            text = await websocket.receive_text()
+            connection.touch()
+            hub.handle_message(connection, text)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        hub.disconnect(connection)
+        # A dispatcher who closes their last tab must not keep vehicles locked
+        # until the leases expire. Other tabs keep the leases; so does a
+        # connection the hub evicted (idle or stuck), whose dispatcher may
+        # still be mid-dispatch: those leases expire or get renewed as usual.
+        if dispatcher_id is not None and not connection.evicted and not hub.is_connected(dispatcher_id):
+            VehicleLockManager.unlock_all(dispatcher_id)
@@ -67,3 +67,16 @@ class TripSchema(TripBase):
     final_odometer: Optional[float] = None
     class Config:
         from_attributes = True
+
+class AssignmentProposal(BaseModel):
+    trip_id: int
+    vehicle_id: int
+    driver_id: int
+    cargo_weight: float
+    max_capacity: float
+    unused_capacity: float
+
+class AssignmentPlan(BaseModel):
+    assignments: List[AssignmentProposal]
+    unassigned_trip_ids: List[int]
+    total_unused_capacity: float
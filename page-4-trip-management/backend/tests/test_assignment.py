@@ -0,0 +1,148 @@
+import itertools
+import random
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+
+from backend.assignment import match_capacity, match_with_limits, propose_assignments
+
+
+def brute_force(weights, capacities, groups=None, limits=None):
+    """(trips served, unused capacity) of the best matching, by enumeration"""
+    best = (0, 0.0)
+    n, m = len(weights), len(capacities)
+
+    def within_limits(vehicles):
+        return groups is None or all(
+            sum(groups[v] == g for v in vehicles) <= limit for g, limit in enumerate(limits))
+
+    for size in range(min(n, m), 0, -1):
+        wastes = [
+            sum(capacities[v] - weights[t] for t, v in zip(trips, vehicles))
+            for trips in itertools.combinations(range(n), size)
+            for vehicles in itertools.permutations(range(m), size)
+            if all(capacities[v] >= weights[t] for t, v in zip(trips, vehicles))
+            and within_limits(vehicles)
+        ]
+        if wastes:
+            return size, min(wastes)
+    return best
+
+
+def test_match_capacity_is_optimal():
+    rng = random.Random(3)
+    for _ in range(300):
+        weights = [float(rng.randint(1, 9)) for _ in range(rng.randint(0, 5))]
+        capacities = [float(rng.randint(1, 9)) for _ in range(rng.randint(0, 5))]
+        trips, vehicles = match_capacity(np.array(weights), np.array(capacities))
+
+        assert len(set(trips.tolist())) == len(trips)
+        assert len(set(vehicles.tolist())) == len(vehicles)
+        assert all(capacities[v] >= weights[t] for t, v in zip(trips, vehicles))
+        served, waste = brute_force(weights, capacities)
+        assert len(trips) == served
+        assert sum(capacities[v] - weights[t] for t, v in zip(trips, vehicles)) == waste
+
+def test_match_with_limits_is_optimal():
+    rng = random.Random(5)
+    for _ in range(300):
+        weights = [float(rng.randint(1, 9)) for _ in range(rng.randint(0, 5))]
+        capacities = [float(rng.randint(1, 9)) for _ in range(rng.randint(0, 5))]
+        groups = [rng.randint(0, 1) for _ in capacities]
+        limits = [rng.randint(0, 2), rng.randint(0, 2)]
+        trips, vehicles = match_with_limits(np.array(weights), np.array(capacities), np.array(groups, dtype=np.intp), limits)
+
+        assert len(set(trips.tolist())) == len(trips) == len(vehicles)
+        assert len(set(vehicles.tolist())) == len(vehicles)
+        assert all(capacities[v] >= weights[t] for t, v in zip(trips, vehicles))
+        assert all(sum(groups[v] == g for v in vehicles) <= limit for g, limit in enumerate(limits))
+        served, waste = brute_force(weights, capacities, groups, limits)
+        assert len(trips) == served
+        assert sum(capacities[v] - weights[t] for t, v in zip(trips, vehicles)) == waste
+
+def test_match_capacity_prefers_tight_fits():
+    trips, vehicles = match_capacity(np.array([100.0, 900.0]), np.array([1000.0, 120.0, 5000.0]))
+    assert dict(zip(trips.tolist(), vehicles.tolist())) == {0: 1, 1: 0}
+
+
+def vehicle(id, capacity, type="Van"):
+    return SimpleNamespace(id=id, max_capacity=capacity, type=type)
+
+def driver(id, category="Van", score=100.0, expires=date.today() + timedelta(days=365)):
+    return SimpleNamespace(id=id, license_category=category, license_expiry_date=expires, performance_score=score)
+
+def trip(id, weight):
+    return SimpleNamespace(id=id, cargo_weight=weight)
+
+
+def test_vehicles_need_a_licensed_driver():
+    plan = propose_assignments(
+        [trip(1, 400), trip(2, 50)],
+        [vehicle(10, 500, "Truck"), vehicle(11, 100, "Van")],
+        [driver(20, "Van"), driver(21, "Truck", expires=date.today() - timedelta(days=1))],
+    )
+    assert [(a["trip_id"], a["vehicle_id"], a["driver_id"]) for a in plan["assignments"]] == [(2, 11, 20)]
+    assert plan["unassigned_trip_ids"] == [1]
+    assert plan["total_unused_capacity"] == 50
+
+def test_type_without_enough_drivers_sends_a_trip_elsewhere():
+    # Two vans fit best, but only one van driver: the other trip moves to a truck
+    plan = propose_assignments(
+        [trip(1, 90), trip(2, 80)],
+        [vehicle(10, 100), vehicle(11, 100), vehicle(12, 1000, "Truck")],
+        [driver(20, "van", score=70), driver(21, "Truck")],
+    )
+    by_trip = {a["trip_id"]: (a["vehicle_id"], a["driver_id"]) for a in plan["assignments"]}
+    assert by_trip[1] == (12, 21) or by_trip[2] == (12, 21)
+    assert sorted(v for v, _ in by_trip.values()) in ([10, 12], [11, 12])
+    assert plan["unassigned_trip_ids"] == []
+
+def test_driver_limit_keeps_the_tightest_van():
+    # Dropping the smaller van for lack of drivers would waste 100 instead of 99
+    plan = propose_assignments(
+        [trip(1, 5), trip(2, 6)],
+        [vehicle(10, 10), vehicle(11, 11), vehicle(12, 100, "Truck")],
+        [driver(20, "Van"), driver(21, "Truck")],
+    )
+    assert len(plan["assignments"]) == 2
+    assert plan["total_unused_capacity"] == 99
+
+def test_driver_limit_can_favour_a_lighter_trip():
+    # Only one van driver: carrying 10 + 100 wastes less than 100 + 100
+    plan = propose_assignments(
+        [trip(1, 10), trip(2, 100), trip(3, 100)],
+        [vehicle(10, 20), vehicle(11, 120), vehicle(12, 150, "Truck")],
+        [driver(20, "Van"), driver(21, "Truck")],
+    )
+    assert len(plan["assignments"]) == 2
+    assert plan["total_unused_capacity"] == 60
+    assert 1 not in plan["unassigned_trip_ids"]
+
+def test_driver_limited_plan_at_full_scale_is_interactive():
+    # 5,000 trips, 3,000 vehicles of distinct capacities, fewer drivers than vehicles
+    rng = random.Random(1)
+    trips = [trip(i, rng.uniform(50, 5000)) for i in range(5000)]
+    vehicles = [
+        vehicle(i, rng.uniform(500, 6000), "Truck") if i % 2 else vehicle(i, rng.uniform(100, 1500))
+        for i in range(3000)
+    ]
+    drivers = [driver(i, "Truck" if i < 900 else "Van", score=rng.random()) for i in range(2000)]
+
+    started = time.perf_counter()
+    plan = propose_assignments(trips, vehicles, drivers)
+    elapsed = time.perf_counter() - started
+
+    assert len(plan["assignments"]) == 2000
+    assert sum(a["vehicle_id"] % 2 for a in plan["assignments"]) == 900
+    assert elapsed < 2.0
+
+def test_heaviest_loads_get_best_scored_drivers():
+    plan = propose_assignments(
+        [trip(1, 10), trip(2, 90)],
+        [vehicle(10, 100), vehicle(11, 100)],
+        [driver(20, score=60), driver(21, score=95)],
+    )
+    by_trip = {a["trip_id"]: a["driver_id"] for a in plan["assignments"]}
+    assert by_trip == {2: 21, 1: 20}
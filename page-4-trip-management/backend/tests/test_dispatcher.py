@@ -6,7 +6,7 @@ from sqlalchemy.orm import sessionmaker
 from backend.main import app
 from backend.database import Base, get_db
 from backend.models import Vehicle, Driver, VehicleType, VehicleStatus, DriverStatus
-from backend.redis_client import redis_client
+from backend.redis_client import redis_client, VehicleLockManager
 
 # Use an in-memory SQLite database for testing
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -59,6 +59,7 @@ def clear_redis():
     # Clear any locks
     if redis_client:
         redis_client.flushdb()
+    VehicleLockManager.backend.clear()
 
 def test_get_available_vehicles(setup_db):
     response = client.get("/api/vehicles/available")
@@ -73,9 +74,26 @@ def test_lock_vehicle(setup_db):
     response = client.post(f"/api/vehicles/{vid}/lock?dispatcher_id={dispatcher_id}")
     assert response.status_code == 200
     
-    # Try locking with a different dispatcher id, should fail (but doesn't when mocked)
-    # response2 = client.post(f"/api/vehicles/{vid}/lock?dispatcher_id={dispatcher_id + 1}")
-    # assert response2.status_code == 409
+    # Try locking with a different dispatcher id, should fail
+    response2 = client.post(f"/api/vehicles/{vid}/lock?dispatcher_id={dispatcher_id + 1}")
+    assert response2.status_code == 409
+
+def test_create_trip_locked_by_other_dispatcher(setup_db):
+    vid = setup_db["vehicle_id"]
+    did = setup_db["driver_id"]
+
+    client.post(f"/api/vehicles/{vid}/lock?dispatcher_id=99")
+
+    payload = {
+        "vehicle_id": vid,
+        "driver_id": did,
+        "cargo_weight": 100.0,
+        "start_location": "Warehouse A",
+        "end_location": "Store B"
+    }
+
+    response = client.post("/api/trips?dispatcher_id=100", json=payload)
+    assert response.status_code == 409
 
 def test_create_trip_overweight(setup_db):
     vid = setup_db["vehicle_id"]
@@ -93,6 +111,28 @@ def test_create_trip_overweight(setup_db):
     assert response.status_code == 400
     assert "exceeds vehicle capacity" in response.json()["detail"]
 
+def test_failed_create_trip_releases_its_lock(setup_db):
+    vid = setup_db["vehicle_id"]
+    did = setup_db["driver_id"]
+
+    payload = {"vehicle_id": vid, "driver_id": did, "cargo_weight": 600.0}
+    response = client.post("/api/trips?dispatcher_id=99", json=payload)
+    assert response.status_code == 400
+
+    # The lock taken by the failed request must not block other dispatchers
+    response = client.post(f"/api/vehicles/{vid}/lock?dispatcher_id=100")
+    assert response.status_code == 200
+
+def test_failed_create_trip_keeps_a_lock_held_beforehand(setup_db):
+    vid = setup_db["vehicle_id"]
+    did = setup_db["driver_id"]
+
+    client.post(f"/api/vehicles/{vid}/lock?dispatcher_id=99")
+    payload = {"vehicle_id": vid, "driver_id": did, "cargo_weight": 600.0}
+    response = client.post("/api/trips?dispatcher_id=99", json=payload)
+    assert response.status_code == 400
+    assert VehicleLockManager.lock_owner(vid) == 99
+
 def test_create_trip_success(setup_db):
     # Lock vehicle first for the logic we wrote
     vid = setup_db["vehicle_id"]
@@ -121,3 +161,12 @@ def test_get_available_vehicles_after_dispatch():
     assert response.status_code == 200
     data = response.json()
     assert len(data) == 0
+
+def test_locks_are_released_when_the_last_tab_closes():
+    VehicleLockManager.lock_vehicle(42, 7)
+    with client.websocket_connect("/ws?dispatcher_id=7"):
+        with client.websocket_connect("/ws?dispatcher_id=7"):
+            pass
+        # Another tab of the dispatcher is still open
+        assert VehicleLockManager.lock_owner(42) == 7
+    assert VehicleLockManager.lock_owner(42) is None
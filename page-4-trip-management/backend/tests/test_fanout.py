@@ -0,0 +1,198 @@
+import asyncio
+import json
+
+from backend.fanout import FanoutHub, CLOSE_GOING_AWAY, CLOSE_TRY_AGAIN_LATER
+
+
+class FakeWebSocket:
+    def __init__(self, blocked=False):
+        self.frames = []
+        self.closed_with = None
+        self.unblocked = asyncio.Event()
+        if not blocked:
+            self.unblocked.set()
+
+    async def send_text(self, text):
+        await self.unblocked.wait()
+        self.frames.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+    def events(self):
+        return [event for frame in self.frames for event in frame]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_events_are_coalesced_into_frames():
+    async def scenario():
+        hub = FanoutHub(flush_interval=0.05)
+        ws = FakeWebSocket()
+        hub.connect(ws)
+        hub.publish({"n": 0})
+        await asyncio.sleep(0.01)
+        for n in range(1, 6):
+            hub.publish({"n": n})
+        await asyncio.sleep(0.1)
+        hub.stop()
+        return ws
+
+    ws = run(scenario())
+    assert ws.events() == [{"n": n} for n in range(6)]
+    assert len(ws.frames) == 2
+
+def test_slow_client_does_not_stall_others():
+    async def scenario():
+        hub = FanoutHub(flush_interval=0, queue_size=10, max_missed=1000)
+        fast, slow = FakeWebSocket(), FakeWebSocket(blocked=True)
+        hub.connect(fast)
+        hub.connect(slow)
+        for n in range(25):
+            hub.publish({"n": n})
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+        slow.unblocked.set()
+        await asyncio.sleep(0.01)
+        hub.stop()
+        return fast, slow
+
+    fast, slow = run(scenario())
+    assert [e["n"] for e in fast.events()] == list(range(25))
+    # The slow client got its first event, then skipped to the newest 10 with a gap marker
+    events = slow.events()
+    assert events[0] == {"n": 0}
+    assert events[1] == {"type": "gap", "missed": 14}
+    assert [e["n"] for e in events[2:]] == list(range(15, 25))
+
+def test_client_too_far_behind_is_closed():
+    async def scenario():
+        hub = FanoutHub(flush_interval=0, queue_size=5, max_missed=10)
+        slow = FakeWebSocket(blocked=True)
+        hub.connect(slow)
+        hub.publish({"n": 0})
+        await asyncio.sleep(0)
+        for n in range(1, 30):
+            hub.publish({"n": n})
+        slow.unblocked.set()
+        await asyncio.sleep(0.01)
+        return hub, slow
+
+    hub, slow = run(scenario())
+    assert slow.closed_with == CLOSE_TRY_AGAIN_LATER
+    assert not hub.connections
+
+def test_heartbeat_pings_and_evicts_idle_clients():
+    async def scenario():
+        hub = FanoutHub(flush_interval=0, heartbeat_interval=0.02, idle_timeout=0.05)
+        active, idle = FakeWebSocket(), FakeWebSocket()
+        active_connection = hub.connect(active)
+        hub.connect(idle)
+        for _ in range(6):
+            await asyncio.sleep(0.02)
+            active_connection.touch()
+        hub.stop()
+        return hub, active, idle
+
+    hub, active, idle = run(scenario())
+    assert {"type": "ping"} in active.events()
+    assert idle.closed_with == CLOSE_GOING_AWAY
+    assert active.closed_with is None
+
+def test_hub_counts_connections_per_dispatcher():
+    async def scenario():
+        hub = FanoutHub(flush_interval=0, heartbeat_interval=0.02, idle_timeout=0.05)
+        first = hub.connect(FakeWebSocket(), dispatcher_id=7)
+        second = hub.connect(FakeWebSocket(), dispatcher_id=7)
+        hub.disconnect(first)
+        hub.disconnect(first)
+        still_connected = hub.is_connected(7)
+        await asyncio.sleep(0.1)  # the idle second connection is evicted
+        hub.stop()
+        return hub, still_connected, second
+
+    hub, still_connected, second = run(scenario())
+    assert still_connected
+    assert not hub.is_connected(7)
+    assert second.evicted
+
+def test_stuck_send_is_closed_on_heartbeat():
+    async def scenario():
+        hub = FanoutHub(flush_interval=0, send_timeout=0.03, heartbeat_interval=0.02)
+        stuck = FakeWebSocket(blocked=True)
+        connection = hub.connect(stuck)
+        hub.publish({"n": 0})
+        for _ in range(4):
+            await asyncio.sleep(0.02)
+            connection.touch()
+        hub.stop()
+        return hub, stuck
+
+    hub, stuck = run(scenario())
+    assert stuck.closed_with == CLOSE_TRY_AGAIN_LATER
+    assert not hub.connections
+
+def test_publish_from_worker_thread():
+    async def scenario():
+        hub = FanoutHub(flush_interval=0)
+        ws = FakeWebSocket()
+        hub.connect(ws)
+        await asyncio.to_thread(hub.publish_threadsafe, {"event": "trip_created"})
+        await asyncio.sleep(0.01)
+        hub.stop()
+        return ws
+
+    assert run(scenario()).events() == [{"event": "trip_created"}]
+
+def test_topic_subscriptions_filter_events():
+    async def scenario():
+        hub = FanoutHub(flush_interval=0)
+        everything, depot, trucks = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        hub.connect(everything)
+        depot_connection = hub.connect(depot)
+        trucks_connection = hub.connect(trucks)
+        hub.handle_message(depot_connection, json.dumps({"action": "subscribe", "vehicle_ids": [1, 2], "driver_ids": [9]}))
+        hub.handle_message(trucks_connection, json.dumps({"action": "subscribe", "vehicle_types": ["Truck"]}))
+
+        hub.publish({"event": "trip_created", "vehicle_id": 1, "vehicle_type": "Van", "driver_id": 9})
+        hub.publish({"event": "trip_created", "vehicle_id": 3, "vehicle_type": "Truck", "driver_id": 4})
+        hub.publish({"event": "trip_created", "vehicle_id": 5, "vehicle_type": "Bike", "driver_id": 6})
+        await asyncio.sleep(0.01)
+
+        hub.handle_message(depot_connection, json.dumps({"action": "unsubscribe", "vehicle_ids": [1], "driver_ids": [9]}))
+        hub.publish_text(json.dumps({"event": "trip_created", "vehicle_id": 1, "driver_id": 9}))
+        hub.publish_text(json.dumps({"event": "trip_created", "vehicle_id": 2}))
+        await asyncio.sleep(0.01)
+        hub.stop()
+        return hub, everything, depot, trucks
+
+    hub, everything, depot, trucks = run(scenario())
+    updates = lambda ws: [e.get("vehicle_id") for e in ws.events() if "event" in e]
+    assert updates(everything) == [1, 3, 5, 1, 2]
+    # Matching both a vehicle and a driver topic still delivers the event once
+    assert updates(depot) == [1, 2]
+    assert updates(trucks) == [3]
+    replies = [e for e in depot.events() if e.get("type") == "subscriptions"]
+    assert replies[-1]["topics"] == ["vehicle:2"]
+    assert not hub._index
+
+def test_subscribe_all_restores_every_event():
+    async def scenario():
+        hub = FanoutHub(flush_interval=0)
+        ws = FakeWebSocket()
+        connection = hub.connect(ws)
+        hub.handle_message(connection, json.dumps({"action": "subscribe", "events": ["trip_completed"]}))
+        hub.publish({"event": "trip_created"})
+        hub.publish({"event": "trip_completed"})
+        await asyncio.sleep(0.01)
+        hub.handle_message(connection, json.dumps({"action": "subscribe", "all": True}))
+        hub.publish({"event": "trip_created"})
+        hub.handle_message(connection, "pong")
+        await asyncio.sleep(0.01)
+        hub.stop()
+        return ws
+
+    events = [e["event"] for e in run(scenario()).events() if "event" in e]
+    assert events == ["trip_completed", "trip_created"]
@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.models import Base, Vehicle, OutboxEvent, VehicleType
+from backend.outbox import OutboxRelay, enqueue_event
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture(autouse=True)
+def vehicles():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    for n in (1, 2):
+        db.add(Vehicle(id=n, name=f"Van-{n}", license_plate=f"V-{n}", max_capacity=500.0, type=VehicleType.VAN))
+    db.commit()
+    db.close()
+
+
+def write_events(*messages, commit=True):
+    db = TestingSessionLocal()
+    for message in messages:
+        enqueue_event(db, "fleet_updates", message)
+    if commit:
+        db.commit()
+    else:
+        db.rollback()
+    db.close()
+
+
+class Capture:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.published = []
+
+    def __call__(self, channel, messages):
+        if self.fail:
+            raise ConnectionError("broker down")
+        self.published.extend((channel, m["vehicle_id"], m["sequence"], m["n"]) for m in messages)
+
+
+def outbox_size():
+    db = TestingSessionLocal()
+    try:
+        return db.query(OutboxEvent).count()
+    finally:
+        db.close()
+
+
+def test_events_are_relayed_in_order_with_per_vehicle_sequences():
+    write_events({"vehicle_id": 1, "n": 0}, {"vehicle_id": 2, "n": 1})
+    write_events({"vehicle_id": 1, "n": 2})
+    capture = Capture()
+    relay = OutboxRelay(TestingSessionLocal, batch_size=2, publish=capture)
+
+    assert relay.drain() == 3
+    assert capture.published == [
+        ("fleet_updates", 1, 1, 0),
+        ("fleet_updates", 2, 1, 1),
+        ("fleet_updates", 1, 2, 2),
+    ]
+    assert outbox_size() == 0
+
+def test_rolled_back_events_are_never_published():
+    write_events({"vehicle_id": 1, "n": 0}, commit=False)
+    write_events({"vehicle_id": 1, "n": 1})
+    capture = Capture()
+
+    OutboxRelay(TestingSessionLocal, publish=capture).drain()
+    # The rolled-back sequence number is not handed out twice or left as a hole
+    assert capture.published == [("fleet_updates", 1, 1, 1)]
+
+def test_failed_publish_keeps_events_for_the_next_attempt():
+    write_events({"vehicle_id": 2, "n": 0})
+    with pytest.raises(ConnectionError):
+        OutboxRelay(TestingSessionLocal, publish=Capture(fail=True)).drain()
+    assert outbox_size() == 1
+
+    capture = Capture()
+    OutboxRelay(TestingSessionLocal, publish=capture).drain()
+    assert capture.published == [("fleet_updates", 2, 1, 0)]
@@ -0,0 +1,67 @@
+from backend.models import VehicleType
+from backend.vehicle_index import AvailableVehicleIndex
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def best_fit(index, cargo_weight, vehicle_type=None):
+    return next((vehicle_id for _, vehicle_id in index.candidates(cargo_weight, vehicle_type)), None)
+
+def make_index():
+    index = AvailableVehicleIndex()
+    index.update(1, 500.0, VehicleType.VAN)
+    index.update(2, 5000.0, VehicleType.TRUCK)
+    index.update(3, 800.0, VehicleType.VAN)
+    index.update(4, 50.0, VehicleType.BIKE)
+    return index
+
+
+def test_smallest_vehicle_that_fits():
+    index = make_index()
+    assert best_fit(index, 10) == 4
+    assert best_fit(index, 500) == 1
+    assert best_fit(index, 501) == 3
+    assert best_fit(index, 5001) is None
+
+def test_filter_by_type():
+    index = make_index()
+    assert best_fit(index, 10, VehicleType.VAN) == 1
+    assert best_fit(index, 600, VehicleType.TRUCK) == 2
+    assert best_fit(index, 900, VehicleType.VAN) is None
+
+def test_updates_move_and_remove_vehicles():
+    index = make_index()
+    index.update(1, None, None)  # dispatched
+    assert best_fit(index, 100, VehicleType.VAN) == 3
+    index.update(3, 60.0, VehicleType.VAN)  # capacity corrected
+    assert best_fit(index, 55) == 3
+    index.discard(3)
+    assert best_fit(index, 55) == 2
+    assert len(index) == 2
+
+def test_candidates_continue_past_batches():
+    index = AvailableVehicleIndex()
+    for vehicle_id in range(100):
+        index.update(vehicle_id, 100.0 + vehicle_id % 10, VehicleType.VAN)
+    seen = [vehicle_id for _, vehicle_id in index.candidates(105, batch=7)]
+    assert len(seen) == len(set(seen)) == 50
+    capacities = [capacity for capacity, _ in index.candidates(105, batch=7)]
+    assert capacities == sorted(capacities)
+
+def test_reloads_when_stale():
+    clock = FakeClock()
+    index = AvailableVehicleIndex(reload_seconds=60, clock=clock)
+    loads = []
+    index.load = lambda db: (loads.append(db), setattr(index, "_loaded_at", clock()))
+    index.ensure_fresh("db")
+    clock.now = 30
+    index.ensure_fresh("db")
+    clock.now = 61
+    index.ensure_fresh("db")
+    assert len(loads) == 2
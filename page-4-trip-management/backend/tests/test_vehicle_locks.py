@@ -0,0 +1,150 @@
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from backend.redis_client import InProcessLockBackend, RedisLockBackend, VehicleLockManager
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture(params=["in_process", "redis"])
+def backend(request, clock):
+    if request.param == "in_process":
+        return InProcessLockBackend(clock=clock)
+    return RedisLockBackend(fakeredis.FakeRedis(decode_responses=True))
+
+
+def test_acquire_is_exclusive_and_reentrant(backend):
+    assert backend.acquire(1, "10", 30)
+    assert not backend.acquire(1, "11", 30)
+    # Same dispatcher locking again just restarts the lease
+    assert backend.acquire(1, "10", 30)
+    assert backend.owner(1) == "10"
+
+def test_release_checks_owner(backend):
+    backend.acquire(1, "10", 30)
+    assert not backend.release(1, "11")
+    assert backend.owner(1) == "10"
+    assert backend.release(1, "10")
+    assert backend.owner(1) is None
+    assert not backend.release(1, "10")
+
+def test_renew_requires_holder(backend):
+    backend.acquire(1, "10", 30)
+    assert backend.renew(1, "10", 60)
+    assert not backend.renew(1, "11", 60)
+    assert not backend.renew(2, "10", 60)
+
+def test_release_all_only_touches_own_locks(backend):
+    for vehicle_id in (1, 2, 3):
+        backend.acquire(vehicle_id, "10", 30)
+    backend.acquire(4, "11", 30)
+    backend.release(2, "10")
+
+    assert backend.release_all("10") == 2
+    assert backend.owner(1) is None and backend.owner(3) is None
+    assert backend.owner(4) == "11"
+    assert backend.release_all("10") == 0
+
+def test_in_process_lease_expiry_and_renewal(clock):
+    backend = InProcessLockBackend(clock=clock)
+    backend.acquire(1, "10", 30)
+
+    clock.now += 20
+    assert backend.renew(1, "10", 30)
+    clock.now += 20
+    # Renewed lease still holds where the original one would have expired
+    assert backend.owner(1) == "10"
+    assert not backend.acquire(1, "11", 30)
+
+    clock.now += 31
+    assert backend.owner(1) is None
+    assert not backend.renew(1, "10", 30)
+    assert backend.acquire(1, "11", 30)
+    # The expired holder's bulk unlock must not release the new owner's lock
+    assert backend.release_all("10") == 0
+    assert backend.owner(1) == "11"
+
+def test_redis_lease_expiry():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    backend = RedisLockBackend(client)
+    backend.acquire(1, "10", 0.05)
+    assert client.pttl("vehicle_lock:1") <= 50
+    time.sleep(0.1)
+    assert backend.owner(1) is None
+    assert backend.acquire(1, "11", 30)
+
+def test_only_one_thread_wins_each_vehicle():
+    backend = InProcessLockBackend()
+    winners = {}
+    barrier = threading.Barrier(16)
+
+    def contend(owner):
+        barrier.wait()
+        for vehicle_id in range(200):
+            if backend.acquire(vehicle_id, owner, 30):
+                winners.setdefault(vehicle_id, []).append(owner)
+
+    threads = [threading.Thread(target=contend, args=(str(i),)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(winners) == 200
+    assert all(len(owners) == 1 for owners in winners.values())
+
+def test_in_process_acquire_latency_under_contention():
+    backend = InProcessLockBackend()
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(8)
+
+    def contend(owner):
+        samples = []
+        barrier.wait()
+        for i in range(2000):
+            vehicle_id = i % 50  # few hot vehicles, constant conflicts
+            started = time.perf_counter()
+            if backend.acquire(vehicle_id, owner, 30):
+                backend.release(vehicle_id, owner)
+            samples.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(samples)
+
+    threads = [threading.Thread(target=contend, args=(str(i),)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)]
+    assert p99 < 0.001
+
+def test_manager_uses_configured_backend(clock):
+    original = VehicleLockManager.backend
+    VehicleLockManager.use_backend(InProcessLockBackend(clock=clock))
+    try:
+        assert VehicleLockManager.lock_vehicle(7, 99)
+        assert VehicleLockManager.is_locked(7)
+        assert VehicleLockManager.lock_owner(7) == 99
+        assert not VehicleLockManager.lock_vehicle(7, 100)
+        assert VehicleLockManager.renew_lock(7, 99)
+        assert VehicleLockManager.unlock_all(99) == 1
+        assert not VehicleLockManager.is_locked(7)
+    finally:
+        VehicleLockManager.use_backend(original)
@@ -0,0 +1,137 @@
+"""
+In-memory index of AVAILABLE vehicles ordered by capacity, for best-fit lookups.
+
+Per vehicle type (and for all types together) the index keeps a sorted list
+of (max_capacity, vehicle_id); "smallest vehicle that can carry X kg" is a
+bisect into it. Status, capacity and type changes are picked up from the ORM
+flush and applied when the transaction commits, so a rolled-back change
+never reaches the index. Other workers write to the same database, so the
+index is also reloaded once it is older than VEHICLE_INDEX_RELOAD_SECONDS.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from itertools import chain
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .models import Vehicle, VehicleStatus, VehicleType
+
+VEHICLE_INDEX_RELOAD_SECONDS = float(os.getenv("VEHICLE_INDEX_RELOAD_SECONDS", "60"))
+
+
+class AvailableVehicleIndex:
+    def __init__(self, reload_seconds: float = VEHICLE_INDEX_RELOAD_SECONDS, clock=time.monotonic):
+        self.reload_seconds = reload_seconds
+        self._clock = clock
+        self._sorted: Dict[Optional[VehicleType], List[Tuple[float, int]]] = {}  # type (None = any) -> entries
+        self._vehicles: Dict[int, Tuple[float, VehicleType]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def __len__(self):
+        return len(self._vehicles)
+
+    def load(self, db: Session):
+        rows = db.query(Vehicle.id, Vehicle.max_capacity, Vehicle.type).filter(
+            Vehicle.status == VehicleStatus.AVAILABLE
+        ).all()
+        vehicles = {row.id: (row.max_capacity, row.type) for row in rows}
+        sorted_entries: Dict[Optional[VehicleType], List[Tuple[float, int]]] = {None: []}
+        for vehicle_id, (capacity, vehicle_type) in vehicles.items():
+            sorted_entries[None].append((capacity, vehicle_id))
+            sorted_entries.setdefault(vehicle_type, []).append((capacity, vehicle_id))
+        for entries in sorted_entries.values():
+            entries.sort()
+        with self._lock:
+            self._vehicles, self._sorted = vehicles, sorted_entries
+            self._loaded_at = self._clock()
+
+    def ensure_fresh(self, db: Session):
+        if not self.loaded or self._clock() - self._loaded_at >= self.reload_seconds:
+            self.load(db)
+
+    def _remove(self, vehicle_id: int):
+        current = self._vehicles.pop(vehicle_id, None)
+        if current is None:
+            return
+        capacity, vehicle_type = current
+        for key in (None, vehicle_type):
+            entries = self._sorted[key]
+            pos = bisect_left(entries, (capacity, vehicle_id))
+            if pos < len(entries) and entries[pos] == (capacity, vehicle_id):
+                del entries[pos]
+
+    def update(self, vehicle_id: int, capacity: Optional[float], vehicle_type: Optional[VehicleType]):
+        """Place the vehicle at its capacity, or drop it when capacity is None (no longer available)"""
+        with self._lock:
+            self._remove(vehicle_id)
+            if capacity is not None:
+                self._vehicles[vehicle_id] = (capacity, vehicle_type)
+                insort(self._sorted.setdefault(None, []), (capacity, vehicle_id))
+                insort(self._sorted.setdefault(vehicle_type, []), (capacity, vehicle_id))
+
+    def discard(self, vehicle_id: int):
+        with self._lock:
+            self._remove(vehicle_id)
+
+    def candidates(self, cargo_weight: float, vehicle_type: Optional[VehicleType] = None,
+                   batch: int = 32) -> Iterator[Tuple[float, int]]:
+        """(capacity, vehicle_id) of vehicles that can carry cargo_weight, smallest first.
+
+        Entries are copied out in small batches, so callers can do I/O per
+        candidate without holding the index lock.
+        """
+        key = (cargo_weight, -1)
+        while True:
+            with self._lock:
+                entries = self._sorted.get(vehicle_type, [])
+                pos = bisect_left(entries, key)
+                chunk = entries[pos:pos + batch]
+            if not chunk:
+                return
+            yield from chunk
+            capacity, vehicle_id = chunk[-1]
+            key = (capacity, vehicle_id + 1)
+
+
+available_vehicles = AvailableVehicleIndex()
+
+
+# ---- Keeping the index in sync ----
+
+_PENDING_INFO_KEY = "available_vehicle_changes"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_vehicle_changes(session, flush_context):
+    changes = None
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, Vehicle):
+            continue
+        if changes is None:
+            changes = session.info.setdefault(_PENDING_INFO_KEY, {})
+        if obj in session.deleted or obj.status != VehicleStatus.AVAILABLE:
+            changes[obj.id] = (None, None)
+        else:
+            changes[obj.id] = (obj.max_capacity, obj.type)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_vehicle_changes(session):
+    changes = session.info.pop(_PENDING_INFO_KEY, None)
+    if changes and available_vehicles.loaded:
+        for vehicle_id, (capacity, vehicle_type) in changes.items():
+            available_vehicles.update(vehicle_id, capacity, vehicle_type)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_vehicle_changes(session):
+    session.info.pop(_PENDING_INFO_KEY, None)
@@ -36,6 +36,10 @@ class MaintenanceLog(Base):
     is_completed = Column(Boolean, default=False)
     notes = Column(Text)
     
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # optimistic lock
+    # eager_defaults: INSERT ... RETURNING fills created_at without a reload
+    __mapper_args__ = {"version_id_col": version, "eager_defaults": True}
+    
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -19,6 +19,8 @@ class Vehicle(Base):
     status = Column(Enum(VehicleStatus), default=VehicleStatus.AVAILABLE)
     region = Column(String(100))
     is_retired = Column(Boolean, default=False)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # optimistic lock
+    __mapper_args__ = {"version_id_col": version}
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -7,6 +7,7 @@ Features:
 - Complete maintenance to release vehicle back to "Available"
 """
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timezone
@@ -75,15 +76,22 @@ def create_maintenance_log(
     - Vehicle becomes hidden from dispatcher until maintenance is completed
     - Calculates total_cost = parts_cost + labor_cost
     """
-    # Validate vehicle exists
-    vehicle = db.query(Vehicle).filter(Vehicle.id == maintenance.vehicle_id).first()
-    if not vehicle:
-        raise HTTPException(status_code=404, detail="Vehicle not found")
-
-    # Cannot add maintenance for vehicle on trip
-    if vehicle.status == VehicleStatus.ON_TRIP:
+    # Move the vehicle into the shop with one conditional UPDATE: it only
+    # matches while the vehicle is not on a trip, so a dispatch racing this
+    # request cannot slip in between the check and the status change.
+    claimed = db.execute(
+        update(Vehicle)
+        .where(Vehicle.id == maintenance.vehicle_id, Vehicle.status != VehicleStatus.ON_TRIP)
+        .values(status=VehicleStatus.IN_SHOP, version=Vehicle.version + 1)
+        .returning(Vehicle.id)
+    ).scalar_one_or_none()
+    if claimed is None:
+        # Validate vehicle exists
+        if db.query(Vehicle.id).filter(Vehicle.id == maintenance.vehicle_id).scalar() is None:
+            raise HTTPException(status_code=404, detail="Vehicle not found")
+        # Cannot add maintenance for vehicle on trip
         raise HTTPException(
-            status_code=400,
+            status_code=409,
             detail="Cannot schedule maintenance for vehicle currently on a trip"
         )
 
@@ -96,13 +104,12 @@ def create_maintenance_log(
         total_cost=total_cost,
     )
     db.add(db_log)
+    db.flush()
 
-    # Update vehicle status to IN_SHOP (hidden from dispatcher)
-    vehicle.status = VehicleStatus.IN_SHOP
-
+    # Serialized before commit expires the log, saving a reload
+    response = MaintenanceResponse.model_validate(db_log)
     db.commit()
-    db.refresh(db_log)
-    return db_log
+    return response
 
 
 @router.put("/{log_id}", response_model=MaintenanceResponse)
@@ -156,28 +163,37 @@ def complete_maintenance(
     - Changes vehicle status back to "AVAILABLE"
     - Vehicle becomes visible to dispatcher again
     """
-    db_log = db.query(MaintenanceLog).filter(MaintenanceLog.id == log_id).first()
-    if not db_log:
-        raise HTTPException(status_code=404, detail="Maintenance log not found")
-
-    if db_log.is_completed:
-        raise HTTPException(status_code=400, detail="Maintenance is already completed")
-
-    # Get vehicle
-    vehicle = db.query(Vehicle).filter(Vehicle.id == db_log.vehicle_id).first()
-
-    # Update maintenance log
-    db_log.is_completed = True
-    db_log.completion_date = complete_data.completion_date or datetime.now(timezone.utc)
+    # Update maintenance log, only if nobody completed it first
+    values = {
+        "is_completed": True,
+        "completion_date": complete_data.completion_date or datetime.now(timezone.utc),
+        "version": MaintenanceLog.version + 1,
+    }
     if complete_data.notes:
-        db_log.notes = complete_data.notes
-
-    # Release vehicle - set status back to AVAILABLE
-    vehicle.status = VehicleStatus.AVAILABLE
+        values["notes"] = complete_data.notes
+
+    db_log = db.execute(
+        update(MaintenanceLog)
+        .where(MaintenanceLog.id == log_id, MaintenanceLog.is_completed == False)
+        .values(**values)
+        .returning(MaintenanceLog)
+    ).scalar_one_or_none()
+    if db_log is None:
+        if db.query(MaintenanceLog.id).filter(MaintenanceLog.id == log_id).scalar() is None:
+            raise HTTPException(status_code=404, detail="Maintenance log not found")
+        raise HTTPException(status_code=409, detail="Maintenance is already completed")
+
+    # Release vehicle - set status back to AVAILABLE, unless it left the shop
+    # some other way meanwhile (e.g. retired out of service)
+    db.execute(
+        update(Vehicle)
+        .where(Vehicle.id == db_log.vehicle_id, Vehicle.status == VehicleStatus.IN_SHOP)
+        .values(status=VehicleStatus.AVAILABLE, version=Vehicle.version + 1)
+    )
 
+    response = MaintenanceResponse.model_validate(db_log)
     db.commit()
-    db.refresh(db_log)
-    return db_log
+    return response
 
 
 @router.delete("/{log_id}", status_code=status.HTTP_204_NO_CONTENT)
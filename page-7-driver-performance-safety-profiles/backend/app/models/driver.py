@@ -1,10 +1,19 @@
-from sqlalchemy import Column, Integer, String, Float, Date, Enum
+from sqlalchemy import Column, Integer, String, Float, Date, Enum, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 from .enums import DriverStatus
 
 class Driver(Base):
     __tablename__ = "drivers"
+    __table_args__ = (
+        # Leaderboard seeks (services/leaderboard.py), unfiltered and filtered
+        Index("ix_drivers_performance_score_id", "performance_score", "id"),
+        Index("ix_drivers_category_status_performance_score_id",
+              "license_category", "status", "performance_score", "id"),
+        Index("ix_drivers_trip_completion_rate_id", "trip_completion_rate", "id"),
+        Index("ix_drivers_category_status_trip_completion_rate_id",
+              "license_category", "status", "trip_completion_rate", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
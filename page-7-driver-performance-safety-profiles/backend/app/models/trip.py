@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, ForeignKey, Enum, DateTime
+from sqlalchemy import Column, Integer, Float, ForeignKey, Enum, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -6,6 +6,10 @@ from .enums import TripStatus
 
 class Trip(Base):
     __tablename__ = "trips"
+    __table_args__ = (
+        # Grouped completion counts per driver (services/driver_stats.py)
+        Index("ix_trips_driver_status", "driver_id", "status"),
+    )
 
     id = Column(Integer, primary_key=True)
     driver_id = Column(Integer, ForeignKey("drivers.id"))
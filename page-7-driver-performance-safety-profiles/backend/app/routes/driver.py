@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from datetime import date
+from typing import Optional
 from app.database import SessionLocal
 from app.models.driver import Driver
-from app.models.trip import Trip
-from app.schemas.driver import DriverResponse, StatusUpdate, DriverCreate
-from app.models.enums import DriverStatus, TripStatus
+from app.schemas.driver import (
+    DriverResponse, StatusUpdate, DriverCreate,
+    LeaderboardMetric, LeaderboardOrder, LeaderboardPage,
+    DriverValidationRequest, DriverValidationResult,
+)
+from app.models.enums import DriverStatus
+from app.services.driver_stats import completion_rates
+from app.services.leaderboard import leaderboard_page, InvalidCursor
+from app.services.eligibility import validate_drivers, validate_category
 
 router = APIRouter(prefix="/drivers", tags=["Driver Performance"])
 
@@ -52,34 +59,57 @@ def create_driver(driver_data: DriverCreate, db: Session = Depends(get_db)):
 # 🔹 GET ALL DRIVERS
 # =====================================================
 @router.get("/", response_model=list[DriverResponse])
-def get_all_drivers(db: Session = Depends(get_db)):
+def get_all_drivers(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """Drivers by id with their live completion rate; read-only"""
 
-    drivers = db.query(Driver).all()
+    drivers = db.query(Driver).order_by(Driver.id).offset(skip).limit(limit).all()
 
-    result = []
+    # One grouped query for the whole page instead of two COUNTs per driver
+    rates = completion_rates(db, [driver.id for driver in drivers])
+    today = date.today()
 
-    for driver in drivers:
-        total_trips = db.query(Trip).filter(
-            Trip.driver_id == driver.id
-        ).count()
+    return [
+        {
+            **driver.__dict__,
+            "trip_completion_rate": rates[driver.id],
+            "license_valid": driver.license_expiry_date >= today
+        }
+        for driver in drivers
+    ]
 
-        completed_trips = db.query(Trip).filter(
-            Trip.driver_id == driver.id,
-            Trip.status == TripStatus.COMPLETED
-        ).count()
 
-        if total_trips > 0:
-            driver.trip_completion_rate = (completed_trips / total_trips) * 100
-        else:
-            driver.trip_completion_rate = 100.0
+# =====================================================
+# 🔹 DRIVER LEADERBOARD
+# =====================================================
+@router.get("/leaderboard", response_model=LeaderboardPage)
+def get_leaderboard(
+    metric: LeaderboardMetric = LeaderboardMetric.PERFORMANCE_SCORE,
+    order: LeaderboardOrder = LeaderboardOrder.TOP,
+    license_category: Optional[str] = None,
+    status: Optional[DriverStatus] = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Ranked drivers, one page at a time; pass next_cursor back to get the next page"""
 
-        result.append({
-            **driver.__dict__,
-            "license_valid": driver.license_expiry_date >= date.today()
-        })
+    try:
+        entries, next_cursor = leaderboard_page(
+            db, metric.value, order.value, license_category, status, limit, cursor
+        )
+    except InvalidCursor as exc:
+        raise HTTPException(400, str(exc))
 
-    db.commit()
-    return result
+    return {
+        "metric": metric,
+        "order": order,
+        "drivers": entries,
+        "next_cursor": next_cursor
+    }
 
 
 # =====================================================
@@ -126,4 +156,26 @@ def validate_driver(driver_id: int, db: Session = Depends(get_db)):
     if driver.license_expiry_date < date.today():
         raise HTTPException(400, "License Expired")
 
-    return {"message": "Driver eligible for trip"}
\ No newline at end of file
+    return {"message": "Driver eligible for trip"}
+
+
+# =====================================================
+# 🔹 VALIDATE MANY DRIVERS BEFORE PLANNING
+# =====================================================
+@router.post("/validate", response_model=DriverValidationResult)
+def validate_drivers_bulk(request: DriverValidationRequest, db: Session = Depends(get_db)):
+    """Eligibility and reasons for a list of drivers or a license category, from one query"""
+
+    on_date = request.on_date or date.today()
+    if request.driver_ids is not None:
+        drivers = validate_drivers(db, request.driver_ids, on_date)
+    else:
+        drivers = validate_category(db, request.license_category, on_date)
+
+    eligible = sum(1 for driver in drivers if driver["eligible"])
+    return {
+        "on_date": on_date,
+        "eligible": eligible,
+        "ineligible": len(drivers) - eligible,
+        "drivers": drivers
+    }
\ No newline at end of file
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 from datetime import date
 from enum import Enum
+from typing import Optional
 
 class DriverStatus(str, Enum):
     ON_DUTY = "On Duty"
@@ -34,4 +35,66 @@ class DriverResponse(BaseModel):
 
 # 🔹 Toggle Schema
 class StatusUpdate(BaseModel):
-    status: DriverStatus
\ No newline at end of file
+    status: DriverStatus
+
+
+# 🔹 Leaderboard Schemas
+class LeaderboardMetric(str, Enum):
+    PERFORMANCE_SCORE = "performance_score"
+    TRIP_COMPLETION_RATE = "trip_completion_rate"
+
+
+class LeaderboardOrder(str, Enum):
+    TOP = "top"
+    BOTTOM = "bottom"
+
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    id: int
+    name: str
+    license_category: str
+    status: DriverStatus
+    performance_score: Optional[float]
+    trip_completion_rate: Optional[float]
+
+
+class LeaderboardPage(BaseModel):
+    metric: LeaderboardMetric
+    order: LeaderboardOrder
+    drivers: list[LeaderboardEntry]
+    next_cursor: Optional[str]
+
+
+# 🔹 Bulk Validation Schemas
+MAX_VALIDATION_DRIVERS = 1000
+
+
+class DriverValidationRequest(BaseModel):
+    # Either the candidate drivers, or a license category to check all its holders
+    driver_ids: Optional[list[int]] = Field(None, min_length=1, max_length=MAX_VALIDATION_DRIVERS)
+    license_category: Optional[str] = None
+    on_date: Optional[date] = None  # planned trip date, today by default
+
+    @model_validator(mode="after")
+    def one_selection(self):
+        if (self.driver_ids is None) == (self.license_category is None):
+            raise ValueError("Give either driver_ids or license_category")
+        return self
+
+
+class DriverEligibility(BaseModel):
+    driver_id: int
+    name: Optional[str] = None
+    license_category: Optional[str] = None
+    status: Optional[DriverStatus] = None
+    license_expiry_date: Optional[date] = None
+    eligible: bool
+    reasons: list[str]
+
+
+class DriverValidationResult(BaseModel):
+    on_date: date
+    eligible: int
+    ineligible: int
+    drivers: list[DriverEligibility]
\ No newline at end of file
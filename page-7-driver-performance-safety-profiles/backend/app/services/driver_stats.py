@@ -0,0 +1,90 @@
+"""
+Driver trip statistics.
+
+trip_completion_rate is completed trips / all trips of the driver, in %
+(100 for a driver without trips). It is computed for many drivers at once
+with one grouped query over trips, never with a query per driver.
+
+This service never writes trips. The services that do keep the stored
+drivers.trip_completion_rate current: the main backend's dispatch endpoints
+(create, complete, cancel and their batch forms) and Page 4's create_trip
+recompute the affected drivers with one set-based UPDATE in the same
+transaction. Reads never write.
+
+Trips written any other way (imports, manual SQL) are not covered. To
+recompute every driver (from page-7-driver-performance-safety-profiles/backend),
+run:
+    python -m app.services.driver_stats refresh
+"""
+import argparse
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import Float, case, cast, func, select
+from sqlalchemy.orm import Session
+
+from app.models.driver import Driver
+from app.models.trip import Trip
+from app.models.enums import TripStatus
+
+NO_TRIPS_RATE = 100.0
+
+
+def _completed_count():
+    return func.sum(case((Trip.status == TripStatus.COMPLETED, 1), else_=0))
+
+
+def trip_counts(driver_ids: Optional[Iterable[int]] = None):
+    """(driver_id, total, completed) per driver with at least one trip"""
+    query = select(
+        Trip.driver_id,
+        func.count(Trip.id).label("total"),
+        _completed_count().label("completed"),
+    ).where(Trip.driver_id.isnot(None)).group_by(Trip.driver_id)
+    if driver_ids is not None:
+        query = query.where(Trip.driver_id.in_(list(driver_ids)))
+    return query
+
+
+def completion_rate(total: int, completed: int) -> float:
+    return completed / total * 100 if total else NO_TRIPS_RATE
+
+
+def completion_rates(db: Session, driver_ids: Iterable[int]) -> Dict[int, float]:
+    """Completion rate of each given driver, from one grouped query"""
+    driver_ids = list(driver_ids)
+    rates = dict.fromkeys(driver_ids, NO_TRIPS_RATE)
+    if driver_ids:
+        for row in db.execute(trip_counts(driver_ids)):
+            rates[row.driver_id] = completion_rate(row.total, row.completed)
+    return rates
+
+
+def refresh_completion_rates(connection, driver_ids: Optional[Iterable[int]] = None):
+    """Recompute stored rates with one UPDATE (all drivers when driver_ids is None)"""
+    rate = select(
+        cast(_completed_count(), Float) * 100 / func.count(Trip.id)
+    ).where(Trip.driver_id == Driver.id).scalar_subquery()
+    statement = Driver.__table__.update().values(trip_completion_rate=func.coalesce(rate, NO_TRIPS_RATE))
+    if driver_ids is not None:
+        statement = statement.where(Driver.id.in_(list(driver_ids)))
+    return connection.execute(statement).rowcount
+
+
+def main():
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Maintain stored driver trip statistics")
+    parser.add_argument("command", choices=["refresh"])
+    parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        updated = refresh_completion_rates(db.connection())
+        db.commit()
+        print(f"Refreshed trip completion rates of {updated} drivers.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
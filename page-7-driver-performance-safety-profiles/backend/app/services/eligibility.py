@@ -0,0 +1,70 @@
+"""
+Driver eligibility for dispatch, for many drivers at once.
+
+The rules are those of GET /drivers/{driver_id}/validate: the driver must
+be On Duty (not Suspended or Off Duty), and their license must not have
+expired by the planned date. Each rule is a CASE expression evaluated by
+the database over every candidate row, so a whole planning list is checked
+with one SELECT, not one request per driver.
+"""
+from datetime import date
+from typing import Iterable, List
+
+from sqlalchemy import case, literal, select
+from sqlalchemy.orm import Session
+
+from app.models.driver import Driver
+from app.models.enums import DriverStatus
+
+NOT_FOUND = "Driver not found"
+SUSPENDED = "Driver Suspended"
+NOT_ON_DUTY = "Driver not On Duty"
+LICENSE_EXPIRED = "License Expired"
+
+
+def _eligibility(on_date: date):
+    status_reason = case(
+        (Driver.status == DriverStatus.SUSPENDED, literal(SUSPENDED)),
+        (Driver.status == DriverStatus.ON_DUTY, None),
+        else_=literal(NOT_ON_DUTY),
+    )
+    license_reason = case(
+        (Driver.license_expiry_date < on_date, literal(LICENSE_EXPIRED)),
+        else_=None,
+    )
+    return select(
+        Driver.id, Driver.name, Driver.license_category, Driver.status, Driver.license_expiry_date,
+        status_reason.label("status_reason"), license_reason.label("license_reason"),
+    )
+
+
+def _result(row) -> dict:
+    reasons = [reason for reason in (row.status_reason, row.license_reason) if reason]
+    return {
+        "driver_id": row.id,
+        "name": row.name,
+        "license_category": row.license_category,
+        "status": row.status,
+        "license_expiry_date": row.license_expiry_date,
+        "eligible": not reasons,
+        "reasons": reasons,
+    }
+
+
+def validate_drivers(db: Session, driver_ids: Iterable[int], on_date: date) -> List[dict]:
+    """Eligibility of each given driver, in request order (duplicates dropped)"""
+    driver_ids = list(dict.fromkeys(driver_ids))
+    found = {
+        row.id: _result(row)
+        for row in db.execute(_eligibility(on_date).where(Driver.id.in_(driver_ids)))
+    }
+    return [
+        found.get(driver_id) or {"driver_id": driver_id, "eligible": False, "reasons": [NOT_FOUND]}
+        for driver_id in driver_ids
+    ]
+
+
+def validate_category(db: Session, license_category: str, on_date: date) -> List[dict]:
+    """Eligibility of every driver holding the license category, by id"""
+    query = _eligibility(on_date).where(Driver.license_category == license_category).order_by(Driver.id)
+    return [_result(row) for row in db.execute(query)]
@@ -0,0 +1,118 @@
+"""
+Driver leaderboard: drivers ranked by performance_score or
+trip_completion_rate, best first ("top") or worst first ("bottom").
+
+Pages are fetched with keyset (seek) pagination instead of OFFSET. The
+cursor carries the (metric, id) of the last row handed out, and the next
+page starts right after it through a composite index. A page deep in a
+50k-driver roster then costs the same as the first. Ties on the metric are
+broken by id in the same direction, so the order is total and cursors stay
+stable while drivers are added or rescored.
+
+Ranks are standard competition ranks (1, 2, 2, 4): RANK() over the rows of
+the page, offset by the number of rows on earlier pages, which the cursor
+also carries. A row tied with the last row of the previous page keeps that
+row's rank. Drivers without a value for the metric are left out.
+
+Both metrics are ranked on their stored columns, which is what the indexes
+cover. trip_completion_rate is only as current as its writers keep it: the
+main backend's trip endpoints and Page 4's create_trip refresh it with each
+trip change (see services/driver_stats.py), and the main backend's migration
+d3a7f5b2c918 backfilled the rates stored before that.
+"""
+import base64
+import binascii
+import json
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import Session
+
+from app.models.driver import Driver
+
+METRICS = {
+    "performance_score": Driver.performance_score,
+    "trip_completion_rate": Driver.trip_completion_rate,
+}
+ORDERS = ("top", "bottom")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(scope: dict, value: float, driver_id: int, rank: int, seen: int) -> str:
+    payload = {**scope, "v": value, "i": driver_id, "r": rank, "n": seen}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, scope: dict) -> dict:
+    """The cursor's position; InvalidCursor if it is malformed or was issued for another leaderboard"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        position = {key: payload[key] for key in ("v", "i", "r", "n")}
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursor("Malformed cursor")
+    if {key: payload.get(key) for key in scope} != scope:
+        raise InvalidCursor("Cursor belongs to a different leaderboard query")
+    return position
+
+
+def leaderboard_page(
+    db: Session,
+    metric: str,
+    order: str = "top",
+    license_category: Optional[str] = None,
+    status=None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """One page of (rank, driver row) dicts and the cursor of the next page (None on the last one)"""
+    column = METRICS[metric]
+    scope = {"m": metric, "o": order, "c": license_category, "s": status.value if status else None}
+    position = decode_cursor(cursor, scope) if cursor else None
+
+    descending = order == "top"
+    key = tuple_(column, Driver.id)
+    conditions = [column.isnot(None)]
+    if license_category is not None:
+        conditions.append(Driver.license_category == license_category)
+    if status is not None:
+        conditions.append(Driver.status == status)
+    if position:
+        after = (position["v"], position["i"])
+        conditions.append(key < after if descending else key > after)
+
+    def ordered(col):
+        return col.desc() if descending else col.asc()
+
+    # One extra row tells whether there is a next page
+    page = (
+        select(
+            Driver.id, Driver.name, Driver.license_category, Driver.status,
+            Driver.performance_score, Driver.trip_completion_rate, column.label("metric"),
+        )
+        .where(*conditions)
+        .order_by(ordered(column), ordered(Driver.id))
+        .limit(limit + 1)
+        .subquery()
+    )
+    rows = db.execute(
+        select(page, func.rank().over(order_by=ordered(page.c.metric)).label("page_rank"))
+        .order_by(ordered(page.c.metric), ordered(page.c.id))
+    ).all()
+
+    seen = position["n"] if position else 0
+    last_value = position["v"] if position else None
+    last_rank = position["r"] if position else 0
+
+    entries = []
+    for row in rows[:limit]:
+        rank = last_rank if row.metric == last_value else seen + row.page_rank
+        entries.append({**row._asdict(), "rank": rank})
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = entries[-1]
+        next_cursor = encode_cursor(scope, last["metric"], last["id"], last["rank"], seen + len(entries))
+    return entries, next_cursor
@@ -2,6 +2,9 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.database import create_tables
 from app.routes.analytics import router as analytics_router
+from app.routes.schedule import router as schedule_router
+from app.services.report_jobs import report_jobs
+from app.services.rollup_refresh import rollup_refresher
 
 app = FastAPI(
     title="FleetFlow - Page 8: Operational Analytics & Financial Reports",
@@ -22,6 +25,13 @@ app.add_middleware(
 @app.on_event("startup")
 def on_startup():
     create_tables()
+    rollup_refresher.start()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    report_jobs.shutdown()
+    rollup_refresher.stop()
 
 
 @app.get("/")
@@ -40,3 +50,4 @@ def health_check():
 
 # Include routers
 app.include_router(analytics_router)
+app.include_router(schedule_router)
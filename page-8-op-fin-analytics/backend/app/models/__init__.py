@@ -3,3 +3,4 @@ from app.models.vehicle import Vehicle
 from app.models.trip import Trip
 from app.models.fuel_log import FuelLog
 from app.models.expense import Expense
+from app.models.vehicle_daily_stats import VehicleDailyStats, VehicleDailyStatsDirty
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Enum, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Enum, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -7,6 +7,11 @@ from app.models.enums import TripStatus
 
 class Trip(Base):
     __tablename__ = "trips"
+    __table_args__ = (
+        # Overlap checks when scheduling (routes/schedule.py)
+        Index("ix_trips_vehicle_schedule", "vehicle_id", "scheduled_start"),
+        Index("ix_trips_driver_schedule", "driver_name", "scheduled_start"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     vehicle_id = Column(Integer, ForeignKey("vehicles.id"), nullable=False)
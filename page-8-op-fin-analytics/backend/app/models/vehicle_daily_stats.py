@@ -0,0 +1,72 @@
+from sqlalchemy import Column, Integer, Float, Date, ForeignKey
+from datetime import date
+from app.database import Base
+
+
+# Bucket for rows whose report date column is NULL. Unbounded reports still
+# include them (as the raw scans do); any date filter excludes them.
+UNDATED = date(1, 1, 1)
+
+
+class VehicleDailyStats(Base):
+    """
+    Pre-aggregated per-vehicle, per-day totals backing the analytics reports.
+
+    Each source row is counted on the day of the column the reports filter it
+    by, so a report over [start, end] is a plain SUM over the matching days.
+    """
+    __tablename__ = "vehicle_daily_stats"
+
+    vehicle_id = Column(Integer, ForeignKey("vehicles.id"), primary_key=True)
+    stat_date = Column(Date, primary_key=True)
+
+    # Completed trips, bucketed by actual_end (fuel efficiency, ROI)
+    completed_trip_count = Column(Integer, nullable=False, default=0)
+    completed_distance_km = Column(Float, nullable=False, default=0.0)
+    completed_revenue = Column(Float, nullable=False, default=0.0)
+    completed_trip_cost = Column(Float, nullable=False, default=0.0)
+
+    # All trips, bucketed by created_at (dashboard, trip analytics)
+    created_trip_count = Column(Integer, nullable=False, default=0)
+    created_scheduled_count = Column(Integer, nullable=False, default=0)
+    created_in_progress_count = Column(Integer, nullable=False, default=0)
+    created_completed_count = Column(Integer, nullable=False, default=0)
+    created_cancelled_count = Column(Integer, nullable=False, default=0)
+    created_distance_km = Column(Float, nullable=False, default=0.0)
+    created_revenue = Column(Float, nullable=False, default=0.0)
+    created_completed_distance_km = Column(Float, nullable=False, default=0.0)
+    created_completed_revenue = Column(Float, nullable=False, default=0.0)
+    created_completed_trip_cost = Column(Float, nullable=False, default=0.0)
+
+    # Fuel logs, bucketed by fill_date
+    fuel_fill_count = Column(Integer, nullable=False, default=0)
+    fuel_liters = Column(Float, nullable=False, default=0.0)
+    fuel_cost = Column(Float, nullable=False, default=0.0)
+
+    # Expenses, bucketed by expense_date
+    expense_fuel_amount = Column(Float, nullable=False, default=0.0)
+    expense_fuel_count = Column(Integer, nullable=False, default=0)
+    expense_maintenance_amount = Column(Float, nullable=False, default=0.0)
+    expense_maintenance_count = Column(Integer, nullable=False, default=0)
+    expense_insurance_amount = Column(Float, nullable=False, default=0.0)
+    expense_insurance_count = Column(Integer, nullable=False, default=0)
+    expense_toll_amount = Column(Float, nullable=False, default=0.0)
+    expense_toll_count = Column(Integer, nullable=False, default=0)
+    expense_parking_amount = Column(Float, nullable=False, default=0.0)
+    expense_parking_count = Column(Integer, nullable=False, default=0)
+    expense_other_amount = Column(Float, nullable=False, default=0.0)
+    expense_other_count = Column(Integer, nullable=False, default=0)
+
+
+class VehicleDailyStatsDirty(Base):
+    """
+    (vehicle, day) buckets waiting to be recomputed.
+
+    Filled by database triggers on trips, fuel_logs and expenses, so writes
+    from every service land here; drained by services/rollup_refresh.py.
+    """
+    __tablename__ = "vehicle_daily_stats_dirty"
+
+    id = Column(Integer, primary_key=True)
+    vehicle_id = Column(Integer, nullable=False)
+    stat_date = Column(Date, nullable=False)
@@ -1 +1,2 @@
 from app.routes.analytics import router as analytics_router
+from app.routes.schedule import router as schedule_router
@@ -1,39 +1,87 @@
 from fastapi import APIRouter, Depends, Query, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, FileResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, or_
 from typing import Optional, List
 from datetime import datetime, date, timedelta
 import csv
 import io
+import os
 
-from app.database import get_db
+import numpy as np
+
+from app.database import get_db, SessionLocal
 from app.models.vehicle import Vehicle
 from app.models.trip import Trip
-from app.models.fuel_log import FuelLog
-from app.models.expense import Expense
-from app.models.enums import VehicleStatus, TripStatus, ExpenseCategory
+from app.models.enums import VehicleStatus
+from app.models.vehicle_daily_stats import VehicleDailyStats, UNDATED
+from app.services.rollup import EXPENSE_COLUMNS, as_stat_date
+from app.services.fuel_efficiency import fill_efficiency_query, vehicle_efficiency_query, km_per_liter
+from app.services.report_cache import report_cache, CacheScope
+from app.services.report_jobs import report_jobs, JobQueueFull, COMPLETED
+from app.services.gazetteer import get_gazetteer, distance_matrix_km, trip_distances_km
 from app.schemas.analytics import (
     FuelEfficiencyMetric,
     FleetFuelEfficiencyReport,
+    FillEfficiency,
+    VehicleOdometerEfficiency,
+    FleetOdometerEfficiencyReport,
     VehicleROIMetric,
     FleetROIReport,
     ExpenseSummary,
     ExpenseReport,
     TripSummary,
     DashboardSummary,
+    SeriesGranularity,
+    SeriesGroupBy,
+    SeriesPoint,
+    AnalyticsSeries,
+    DistanceMatrixRequest,
+    ResolvedLocation,
+    DistanceMatrix,
+    TripDistanceBackfill,
+    ReportCacheStats,
+    ExportRequest,
+    ReportJobStatus,
 )
 
 router = APIRouter(prefix="/api/analytics", tags=["Analytics & Reports"])
 
 
+def _stats_window(start_date: Optional[date], end_date: Optional[date]) -> list:
+    """Filter conditions restricting rollup buckets to whole report days"""
+    conditions = []
+    if start_date:
+        conditions.append(VehicleDailyStats.stat_date >= start_date)
+    if end_date:
+        conditions.append(VehicleDailyStats.stat_date <= end_date)
+        # Undated rows are only part of unbounded reports
+        conditions.append(VehicleDailyStats.stat_date != UNDATED)
+    return conditions
+
+
+def _sum(column):
+    return func.coalesce(func.sum(column), 0)
+
+
+_expense_amount = sum(
+    getattr(VehicleDailyStats, amount_column)
+    for amount_column, _ in EXPENSE_COLUMNS.values()
+)
+
+
+def _month_start() -> datetime:
+    return datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
 # ==================== DASHBOARD ====================
 
 @router.get("/dashboard", response_model=DashboardSummary)
+@report_cache.cached("dashboard", scope=lambda args: CacheScope(start_date=_month_start().date()))
 def get_dashboard_summary(db: Session = Depends(get_db)):
     """Get overall fleet dashboard summary"""
     now = datetime.utcnow()
-    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month_start = _month_start()
     
     # Vehicle counts
     total_vehicles = db.query(Vehicle).count()
@@ -41,20 +89,22 @@ def get_dashboard_summary(db: Session = Depends(get_db)):
     vehicles_in_use = db.query(Vehicle).filter(Vehicle.status == VehicleStatus.IN_USE).count()
     vehicles_in_shop = db.query(Vehicle).filter(Vehicle.status == VehicleStatus.IN_SHOP).count()
     
-    # Trip stats this month
-    trips_this_month = db.query(Trip).filter(Trip.created_at >= month_start).all()
-    total_trips = len(trips_this_month)
-    total_distance = sum(t.distance_km or 0 for t in trips_this_month)
-    total_revenue = sum(t.revenue or 0 for t in trips_this_month)
-    
-    # Fuel costs this month
-    fuel_logs = db.query(FuelLog).filter(FuelLog.fill_date >= month_start).all()
-    total_fuel_cost = sum(f.fuel_cost or 0 for f in fuel_logs)
-    total_fuel_liters = sum(f.fuel_amount_liters or 0 for f in fuel_logs)
-    
-    # Expenses this month
-    expenses = db.query(Expense).filter(Expense.expense_date >= month_start).all()
-    total_expenses = sum(e.amount or 0 for e in expenses) + total_fuel_cost
+    # Trip, fuel and expense totals this month from the daily rollup
+    month = db.query(
+        _sum(VehicleDailyStats.created_trip_count).label("trips"),
+        _sum(VehicleDailyStats.created_distance_km).label("distance"),
+        _sum(VehicleDailyStats.created_revenue).label("revenue"),
+        _sum(VehicleDailyStats.fuel_cost).label("fuel_cost"),
+        _sum(VehicleDailyStats.fuel_liters).label("fuel_liters"),
+        _sum(_expense_amount).label("expenses"),
+    ).filter(*_stats_window(month_start.date(), None)).one()
+    
+    total_trips = month.trips
+    total_distance = month.distance
+    total_revenue = month.revenue
+    total_fuel_cost = month.fuel_cost
+    total_fuel_liters = month.fuel_liters
+    total_expenses = month.expenses + total_fuel_cost
     
     # Average fuel efficiency
     avg_efficiency = total_distance / total_fuel_liters if total_fuel_liters > 0 else 0
@@ -77,6 +127,7 @@ def get_dashboard_summary(db: Session = Depends(get_db)):
 # ==================== FUEL EFFICIENCY ====================
 
 @router.get("/fuel-efficiency", response_model=FleetFuelEfficiencyReport)
+@report_cache.cached("fuel-efficiency")
 def get_fuel_efficiency_report(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
@@ -85,50 +136,28 @@ def get_fuel_efficiency_report(
 ):
     """Get fuel efficiency metrics (km/L) for fleet or specific vehicle"""
     
-    # Build fuel log query
-    query = db.query(FuelLog)
-    if start_date:
-        query = query.filter(FuelLog.fill_date >= datetime.combine(start_date, datetime.min.time()))
-    if end_date:
-        query = query.filter(FuelLog.fill_date <= datetime.combine(end_date, datetime.max.time()))
-    if vehicle_id:
-        query = query.filter(FuelLog.vehicle_id == vehicle_id)
-    
-    fuel_logs = query.all()
-    
-    # Group by vehicle
-    vehicle_data = {}
-    for log in fuel_logs:
-        vid = log.vehicle_id
-        if vid not in vehicle_data:
-            vehicle_data[vid] = {
-                "fuel_liters": 0,
-                "fuel_cost": 0,
-                "logs": []
-            }
-        vehicle_data[vid]["fuel_liters"] += log.fuel_amount_liters or 0
-        vehicle_data[vid]["fuel_cost"] += log.fuel_cost or 0
-        vehicle_data[vid]["logs"].append(log)
-    
-    # Build trip query for distance
-    trip_query = db.query(Trip).filter(Trip.status == TripStatus.COMPLETED)
-    if start_date:
-        trip_query = trip_query.filter(Trip.actual_end >= datetime.combine(start_date, datetime.min.time()))
-    if end_date:
-        trip_query = trip_query.filter(Trip.actual_end <= datetime.combine(end_date, datetime.max.time()))
+    # Fuel from fills in the period, distance from trips completed in it;
+    # vehicles with neither are left out of the report.
+    query = (
+        db.query(
+            Vehicle.id,
+            Vehicle.registration_number,
+            Vehicle.make,
+            Vehicle.model,
+            _sum(VehicleDailyStats.completed_distance_km).label("distance"),
+            _sum(VehicleDailyStats.fuel_liters).label("fuel_liters"),
+            _sum(VehicleDailyStats.fuel_cost).label("fuel_cost"),
+        )
+        .join(VehicleDailyStats, VehicleDailyStats.vehicle_id == Vehicle.id)
+        .filter(*_stats_window(start_date, end_date))
+        .group_by(Vehicle.id, Vehicle.registration_number, Vehicle.make, Vehicle.model)
+        .having(or_(
+            func.sum(VehicleDailyStats.fuel_fill_count) > 0,
+            func.sum(VehicleDailyStats.completed_trip_count) > 0,
+        ))
+    )
     if vehicle_id:
-        trip_query = trip_query.filter(Trip.vehicle_id == vehicle_id)
-    
-    trips = trip_query.all()
-    
-    # Add distance to vehicle data
-    for trip in trips:
-        vid = trip.vehicle_id
-        if vid not in vehicle_data:
-            vehicle_data[vid] = {"fuel_liters": 0, "fuel_cost": 0, "logs": []}
-        if "distance" not in vehicle_data[vid]:
-            vehicle_data[vid]["distance"] = 0
-        vehicle_data[vid]["distance"] += trip.distance_km or 0
+        query = query.filter(Vehicle.id == vehicle_id)
     
     # Calculate metrics for each vehicle
     vehicle_metrics = []
@@ -136,14 +165,10 @@ def get_fuel_efficiency_report(
     total_fuel = 0
     total_cost = 0
     
-    for vid, data in vehicle_data.items():
-        vehicle = db.query(Vehicle).filter(Vehicle.id == vid).first()
-        if not vehicle:
-            continue
-        
-        distance = data.get("distance", 0)
-        fuel = data["fuel_liters"]
-        cost = data["fuel_cost"]
+    for row in query.order_by(Vehicle.id):
+        distance = row.distance
+        fuel = row.fuel_liters
+        cost = row.fuel_cost
         
         efficiency = distance / fuel if fuel > 0 else 0
         cost_per_km = cost / distance if distance > 0 else 0
@@ -153,10 +178,10 @@ def get_fuel_efficiency_report(
         total_cost += cost
         
         vehicle_metrics.append(FuelEfficiencyMetric(
-            vehicle_id=vid,
-            registration_number=vehicle.registration_number,
-            make=vehicle.make,
-            model=vehicle.model,
+            vehicle_id=row.id,
+            registration_number=row.registration_number,
+            make=row.make,
+            model=row.model,
             total_distance_km=round(distance, 2),
             total_fuel_liters=round(fuel, 2),
             fuel_efficiency_km_per_liter=round(efficiency, 2),
@@ -179,9 +204,89 @@ def get_fuel_efficiency_report(
     )
 
 
+@router.get("/fuel-efficiency/odometer", response_model=FleetOdometerEfficiencyReport)
+# Any earlier fill can be the LAG() baseline of a segment in the period
+@report_cache.cached("fuel-efficiency/odometer", scope=lambda args: CacheScope(
+    vehicle_id=args["vehicle_id"], end_date=args["end_date"]
+))
+def get_odometer_efficiency_report(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    vehicle_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Get fill-to-fill (odometer delta) fuel efficiency per vehicle and for the fleet,
+    plus the trailing 30 days ending at end_date"""
+    
+    rows = db.execute(vehicle_efficiency_query(start_date, end_date, vehicle_id)).all()
+    
+    vehicle_metrics = [
+        VehicleOdometerEfficiency(
+            vehicle_id=row.vehicle_id,
+            registration_number=row.registration_number,
+            make=row.make,
+            model=row.model,
+            distance_km=round(row.distance_km, 2),
+            fuel_liters=round(row.fuel_liters, 2),
+            efficiency_km_per_liter=km_per_liter(row.distance_km, row.fuel_liters),
+            rolling_30d_distance_km=round(row.rolling_distance_km, 2),
+            rolling_30d_fuel_liters=round(row.rolling_fuel_liters, 2),
+            rolling_30d_efficiency_km_per_liter=km_per_liter(row.rolling_distance_km, row.rolling_fuel_liters)
+        )
+        for row in rows
+    ]
+    
+    # Fleet totals come back on every row as window sums
+    fleet = rows[0] if rows else None
+    total_distance = fleet.fleet_distance_km if fleet else 0
+    total_fuel = fleet.fleet_fuel_liters if fleet else 0
+    
+    return FleetOdometerEfficiencyReport(
+        report_date=datetime.utcnow(),
+        period_start=start_date,
+        period_end=end_date,
+        total_vehicles=len(vehicle_metrics),
+        total_distance_km=round(total_distance, 2),
+        total_fuel_liters=round(total_fuel, 2),
+        average_efficiency_km_per_liter=km_per_liter(total_distance, total_fuel),
+        rolling_30d_efficiency_km_per_liter=km_per_liter(
+            fleet.fleet_rolling_distance_km, fleet.fleet_rolling_fuel_liters
+        ) if fleet else 0,
+        vehicles=vehicle_metrics
+    )
+
+
+@router.get("/fuel-efficiency/fills", response_model=List[FillEfficiency])
+def get_fill_efficiency(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    vehicle_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = Query(100, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Get per-fill segment distance and km/L (distance since the vehicle's previous fill)"""
+    
+    query = fill_efficiency_query(start_date, end_date, vehicle_id).offset(skip).limit(limit)
+    return [
+        FillEfficiency(
+            fuel_log_id=row.fuel_log_id,
+            vehicle_id=row.vehicle_id,
+            fill_date=row.fill_date,
+            odometer_at_fill=row.odometer_at_fill,
+            previous_odometer=row.previous_odometer,
+            fuel_liters=row.fuel_amount_liters,
+            distance_km=round(row.distance_km, 2) if row.distance_km is not None else None,
+            efficiency_km_per_liter=round(row.efficiency_km_per_liter, 2) if row.efficiency_km_per_liter is not None else None
+        )
+        for row in db.execute(query)
+    ]
+
+
 # ==================== VEHICLE ROI ====================
 
 @router.get("/vehicle-roi", response_model=FleetROIReport)
+@report_cache.cached("vehicle-roi")
 def get_vehicle_roi_report(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
@@ -190,11 +295,42 @@ def get_vehicle_roi_report(
 ):
     """Get Vehicle ROI (Return on Investment) metrics"""
     
-    # Get vehicles
-    vehicle_query = db.query(Vehicle)
+    # Per-vehicle totals are aggregated in the database from the daily rollup,
+    # so the report is a single round trip whose size only depends on the
+    # number of vehicles, not on how much history they have.
+    totals = (
+        db.query(
+            VehicleDailyStats.vehicle_id.label("vehicle_id"),
+            func.sum(VehicleDailyStats.completed_revenue).label("revenue"),
+            func.sum(VehicleDailyStats.completed_trip_cost).label("trip_cost"),
+            func.sum(VehicleDailyStats.completed_distance_km).label("distance"),
+            func.sum(_expense_amount).label("expense_amount"),
+            func.sum(VehicleDailyStats.fuel_cost).label("fuel_cost"),
+        )
+        .filter(*_stats_window(start_date, end_date))
+        .group_by(VehicleDailyStats.vehicle_id)
+        .subquery()
+    )
+    
+    query = (
+        db.query(
+            Vehicle.id,
+            Vehicle.registration_number,
+            Vehicle.make,
+            Vehicle.model,
+            Vehicle.year,
+            Vehicle.purchase_price,
+            Vehicle.current_value,
+            func.coalesce(totals.c.revenue, 0).label("revenue"),
+            func.coalesce(totals.c.trip_cost, 0).label("trip_cost"),
+            func.coalesce(totals.c.distance, 0).label("distance"),
+            func.coalesce(totals.c.expense_amount, 0).label("expense_amount"),
+            func.coalesce(totals.c.fuel_cost, 0).label("fuel_cost"),
+        )
+        .outerjoin(totals, totals.c.vehicle_id == Vehicle.id)
+    )
     if vehicle_id:
-        vehicle_query = vehicle_query.filter(Vehicle.id == vehicle_id)
-    vehicles = vehicle_query.all()
+        query = query.filter(Vehicle.id == vehicle_id)
     
     vehicle_metrics = []
     total_purchase = 0
@@ -202,43 +338,14 @@ def get_vehicle_roi_report(
     total_revenue = 0
     total_expenses = 0
     
-    for vehicle in vehicles:
-        # Get trips for revenue
-        trip_query = db.query(Trip).filter(Trip.vehicle_id == vehicle.id, Trip.status == TripStatus.COMPLETED)
-        if start_date:
-            trip_query = trip_query.filter(Trip.actual_end >= datetime.combine(start_date, datetime.min.time()))
-        if end_date:
-            trip_query = trip_query.filter(Trip.actual_end <= datetime.combine(end_date, datetime.max.time()))
-        trips = trip_query.all()
-        
-        revenue = sum(t.revenue or 0 for t in trips)
-        trip_costs = sum(t.trip_cost or 0 for t in trips)
-        distance = sum(t.distance_km or 0 for t in trips)
-        
-        # Get expenses
-        expense_query = db.query(Expense).filter(Expense.vehicle_id == vehicle.id)
-        if start_date:
-            expense_query = expense_query.filter(Expense.expense_date >= datetime.combine(start_date, datetime.min.time()))
-        if end_date:
-            expense_query = expense_query.filter(Expense.expense_date <= datetime.combine(end_date, datetime.max.time()))
-        expenses = expense_query.all()
-        
-        expense_total = sum(e.amount or 0 for e in expenses) + trip_costs
-        
-        # Get fuel costs
-        fuel_query = db.query(FuelLog).filter(FuelLog.vehicle_id == vehicle.id)
-        if start_date:
-            fuel_query = fuel_query.filter(FuelLog.fill_date >= datetime.combine(start_date, datetime.min.time()))
-        if end_date:
-            fuel_query = fuel_query.filter(FuelLog.fill_date <= datetime.combine(end_date, datetime.max.time()))
-        fuel_logs = fuel_query.all()
-        
-        fuel_cost = sum(f.fuel_cost or 0 for f in fuel_logs)
-        expense_total += fuel_cost
+    for row in query.order_by(Vehicle.id):
+        revenue = row.revenue
+        distance = row.distance
+        expense_total = row.expense_amount + row.trip_cost + row.fuel_cost
         
         # Calculate metrics
-        purchase_price = vehicle.purchase_price or 0
-        current_value = vehicle.current_value or 0
+        purchase_price = row.purchase_price or 0
+        current_value = row.current_value or 0
         depreciation = purchase_price - current_value
         net_profit = revenue - expense_total
         
@@ -254,11 +361,11 @@ def get_vehicle_roi_report(
         total_expenses += expense_total
         
         vehicle_metrics.append(VehicleROIMetric(
-            vehicle_id=vehicle.id,
-            registration_number=vehicle.registration_number,
-            make=vehicle.make,
-            model=vehicle.model,
-            year=vehicle.year,
+            vehicle_id=row.id,
+            registration_number=row.registration_number,
+            make=row.make,
+            model=row.model,
+            year=row.year,
             purchase_price=round(purchase_price, 2),
             current_value=round(current_value, 2),
             depreciation=round(depreciation, 2),
@@ -293,6 +400,7 @@ def get_vehicle_roi_report(
 # ==================== EXPENSE REPORT ====================
 
 @router.get("/expenses", response_model=ExpenseReport)
+@report_cache.cached("expenses")
 def get_expense_report(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
@@ -301,40 +409,34 @@ def get_expense_report(
 ):
     """Get expense breakdown by category"""
     
-    query = db.query(Expense)
-    if start_date:
-        query = query.filter(Expense.expense_date >= datetime.combine(start_date, datetime.min.time()))
-    if end_date:
-        query = query.filter(Expense.expense_date <= datetime.combine(end_date, datetime.max.time()))
-    if vehicle_id:
-        query = query.filter(Expense.vehicle_id == vehicle_id)
-    
-    expenses = query.all()
+    columns = []
+    for category, (amount_column, count_column) in EXPENSE_COLUMNS.items():
+        columns.append(_sum(getattr(VehicleDailyStats, amount_column)).label(f"{category.value}_total"))
+        columns.append(_sum(getattr(VehicleDailyStats, count_column)).label(f"{category.value}_count"))
     
-    # Also include fuel costs
-    fuel_query = db.query(FuelLog)
-    if start_date:
-        fuel_query = fuel_query.filter(FuelLog.fill_date >= datetime.combine(start_date, datetime.min.time()))
-    if end_date:
-        fuel_query = fuel_query.filter(FuelLog.fill_date <= datetime.combine(end_date, datetime.max.time()))
+    query = db.query(
+        *columns,
+        _sum(VehicleDailyStats.fuel_cost).label("fuel_log_total"),
+        _sum(VehicleDailyStats.fuel_fill_count).label("fuel_log_count"),
+    ).filter(*_stats_window(start_date, end_date))
     if vehicle_id:
-        fuel_query = fuel_query.filter(FuelLog.vehicle_id == vehicle_id)
+        query = query.filter(VehicleDailyStats.vehicle_id == vehicle_id)
     
-    fuel_logs = fuel_query.all()
-    fuel_total = sum(f.fuel_cost or 0 for f in fuel_logs)
+    totals = query.one()._mapping
     
     # Group by category
     category_totals = {}
-    for expense in expenses:
-        cat = expense.category.value
-        if cat not in category_totals:
-            category_totals[cat] = {"total": 0, "count": 0}
-        category_totals[cat]["total"] += expense.amount or 0
-        category_totals[cat]["count"] += 1
-    
-    # Add fuel as a category
+    for category in EXPENSE_COLUMNS:
+        if totals[f"{category.value}_count"]:
+            category_totals[category.value] = {
+                "total": totals[f"{category.value}_total"],
+                "count": totals[f"{category.value}_count"],
+            }
+    
+    # Fuel logs stand in for the fuel category
+    fuel_total = totals["fuel_log_total"]
     if fuel_total > 0:
-        category_totals["fuel"] = {"total": fuel_total, "count": len(fuel_logs)}
+        category_totals["fuel"] = {"total": fuel_total, "count": totals["fuel_log_count"]}
     
     total_expenses = sum(c["total"] for c in category_totals.values())
     
@@ -360,6 +462,7 @@ def get_expense_report(
 # ==================== TRIP ANALYTICS ====================
 
 @router.get("/trips", response_model=TripSummary)
+@report_cache.cached("trips")
 def get_trip_analytics(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
@@ -368,27 +471,29 @@ def get_trip_analytics(
 ):
     """Get trip analytics summary"""
     
-    query = db.query(Trip)
-    if start_date:
-        query = query.filter(Trip.created_at >= datetime.combine(start_date, datetime.min.time()))
-    if end_date:
-        query = query.filter(Trip.created_at <= datetime.combine(end_date, datetime.max.time()))
+    query = db.query(
+        _sum(VehicleDailyStats.created_trip_count).label("total"),
+        _sum(VehicleDailyStats.created_completed_count).label("completed"),
+        _sum(VehicleDailyStats.created_cancelled_count).label("cancelled"),
+        _sum(VehicleDailyStats.created_completed_distance_km).label("distance"),
+        _sum(VehicleDailyStats.created_completed_revenue).label("revenue"),
+        _sum(VehicleDailyStats.created_completed_trip_cost).label("cost"),
+    ).filter(*_stats_window(start_date, end_date))
     if vehicle_id:
-        query = query.filter(Trip.vehicle_id == vehicle_id)
+        query = query.filter(VehicleDailyStats.vehicle_id == vehicle_id)
     
-    trips = query.all()
+    totals = query.one()
     
-    total_trips = len(trips)
-    completed_trips = len([t for t in trips if t.status == TripStatus.COMPLETED])
-    cancelled_trips = len([t for t in trips if t.status == TripStatus.CANCELLED])
+    total_trips = totals.total
+    completed_trips = totals.completed
+    cancelled_trips = totals.cancelled
     
-    completed = [t for t in trips if t.status == TripStatus.COMPLETED]
-    total_distance = sum(t.distance_km or 0 for t in completed)
-    total_revenue = sum(t.revenue or 0 for t in completed)
-    total_cost = sum(t.trip_cost or 0 for t in completed)
+    total_distance = totals.distance
+    total_revenue = totals.revenue
+    total_cost = totals.cost
     
-    avg_distance = total_distance / len(completed) if completed else 0
-    avg_revenue = total_revenue / len(completed) if completed else 0
+    avg_distance = total_distance / completed_trips if completed_trips else 0
+    avg_revenue = total_revenue / completed_trips if completed_trips else 0
     
     return TripSummary(
         total_trips=total_trips,
@@ -402,101 +507,335 @@ def get_trip_analytics(
     )
 
 
-# ==================== CSV EXPORTS ====================
 
-@router.get("/export/fuel-efficiency/csv")
-def export_fuel_efficiency_csv(
+# ==================== DISTANCES ====================
+
+def _resolved(names: List[str]) -> List[ResolvedLocation]:
+    gazetteer = get_gazetteer()
+    locations = []
+    for name in names:
+        place = gazetteer.resolve(name)
+        locations.append(ResolvedLocation(
+            query=name,
+            name=place.name if place else None,
+            latitude=place.latitude if place else None,
+            longitude=place.longitude if place else None,
+        ))
+    return locations
+
+
+@router.post("/distance-matrix", response_model=DistanceMatrix)
+def get_distance_matrix(request: DistanceMatrixRequest):
+    """Straight-line km between every origin and destination, resolved with the offline gazetteer"""
+    matrix = np.round(distance_matrix_km(request.origins, request.destinations), 2)
+    return DistanceMatrix(
+        origins=_resolved(request.origins),
+        destinations=_resolved(request.destinations),
+        distances_km=np.where(np.isnan(matrix), None, matrix).tolist(),
+    )
+
+
+@router.post("/trips/backfill-distances", response_model=TripDistanceBackfill)
+def backfill_trip_distances(
+    overwrite: bool = False,
+    batch_size: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db)
+):
+    """Fill in distance_km of trips whose start and end locations the gazetteer knows.
+
+    Only trips without a distance are touched unless overwrite is set. Trips
+    are updated through the ORM in batches, so the daily rollup and the report
+    cache follow as for any other trip edit.
+    """
+    query = db.query(Trip).filter(Trip.start_location.isnot(None), Trip.end_location.isnot(None))
+    if not overwrite:
+        query = query.filter(or_(Trip.distance_km.is_(None), Trip.distance_km == 0))
+    
+    scanned = updated = 0
+    last_id = 0
+    while True:
+        trips = query.filter(Trip.id > last_id).order_by(Trip.id).limit(batch_size).all()
+        if not trips:
+            break
+        last_id = trips[-1].id
+        scanned += len(trips)
+        distances = trip_distances_km([t.start_location for t in trips], [t.end_location for t in trips])
+        for trip, distance in zip(trips, distances):
+            if not np.isnan(distance):
+                trip.distance_km = round(float(distance), 2)
+                updated += 1
+        db.commit()
+    
+    return TripDistanceBackfill(scanned=scanned, updated=updated, unresolved=scanned - updated)
+
+
+# ==================== TIME SERIES ====================
+
+def _bucket_start(db: Session, granularity: SeriesGranularity):
+    """SQL expression truncating a rollup day to the start of its bucket"""
+    day = VehicleDailyStats.stat_date
+    if granularity == SeriesGranularity.DAY:
+        return day
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date(func.date_trunc(granularity.value, day))
+    # SQLite: weeks start on Monday, like date_trunc('week')
+    if granularity == SeriesGranularity.WEEK:
+        return func.date(day, "weekday 0", "-6 days")
+    return func.date(day, "start of month")
+
+
+def _truncate(day: date, granularity: SeriesGranularity) -> date:
+    if granularity == SeriesGranularity.WEEK:
+        return day - timedelta(days=day.weekday())
+    if granularity == SeriesGranularity.MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(day: date, granularity: SeriesGranularity) -> date:
+    if granularity == SeriesGranularity.WEEK:
+        return day + timedelta(days=7)
+    if granularity == SeriesGranularity.MONTH:
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+@router.get("/series", response_model=AnalyticsSeries)
+@report_cache.cached("series")
+def get_analytics_series(
+    granularity: SeriesGranularity = SeriesGranularity.MONTH,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
+    vehicle_id: Optional[int] = None,
+    group_by: Optional[SeriesGroupBy] = None,
     db: Session = Depends(get_db)
 ):
-    """Export fuel efficiency report as CSV"""
+    """Get per-bucket trip, revenue and cost totals for charting"""
+    
+    # Distance, revenue and trip costs count on the completion day (as in the
+    # ROI report); trip_count counts trips on the day they were created.
+    bucket = _bucket_start(db, granularity).label("bucket")
+    group_columns = []
+    if group_by == SeriesGroupBy.VEHICLE:
+        group_columns = [Vehicle.id.label("vehicle_id"), Vehicle.registration_number]
+    elif group_by == SeriesGroupBy.VEHICLE_TYPE:
+        group_columns = [Vehicle.vehicle_type]
+    
+    query = db.query(
+        bucket,
+        *group_columns,
+        _sum(VehicleDailyStats.created_trip_count).label("trip_count"),
+        _sum(VehicleDailyStats.completed_trip_count).label("completed_trip_count"),
+        _sum(VehicleDailyStats.completed_distance_km).label("distance_km"),
+        _sum(VehicleDailyStats.completed_revenue).label("revenue"),
+        _sum(VehicleDailyStats.fuel_cost).label("fuel_cost"),
+        _sum(
+            _expense_amount + VehicleDailyStats.completed_trip_cost + VehicleDailyStats.fuel_cost
+        ).label("total_expenses"),
+    ).filter(
+        # Undated rows have no place on a time axis
+        VehicleDailyStats.stat_date != UNDATED,
+        *_stats_window(start_date, end_date)
+    )
+    if group_columns:
+        query = query.join(Vehicle, Vehicle.id == VehicleDailyStats.vehicle_id)
+    if vehicle_id:
+        query = query.filter(VehicleDailyStats.vehicle_id == vehicle_id)
+    
+    points = []
+    for row in query.group_by(bucket, *group_columns).order_by(bucket, *group_columns):
+        points.append(SeriesPoint(
+            bucket_start=as_stat_date(row.bucket),
+            vehicle_id=row.vehicle_id if group_by == SeriesGroupBy.VEHICLE else None,
+            registration_number=row.registration_number if group_by == SeriesGroupBy.VEHICLE else None,
+            vehicle_type=row.vehicle_type.value if group_by == SeriesGroupBy.VEHICLE_TYPE else None,
+            trip_count=row.trip_count,
+            completed_trip_count=row.completed_trip_count,
+            distance_km=round(row.distance_km, 2),
+            revenue=round(row.revenue, 2),
+            fuel_cost=round(row.fuel_cost, 2),
+            total_expenses=round(row.total_expenses, 2)
+        ))
     
+    # A single ungrouped series over a closed range gets every bucket, so
+    # charts do not have to fill the gaps themselves
+    if group_by is None and start_date and end_date:
+        by_bucket = {point.bucket_start: point for point in points}
+        points = []
+        current = _truncate(start_date, granularity)
+        while current <= end_date:
+            points.append(by_bucket.get(current) or SeriesPoint(
+                bucket_start=current,
+                trip_count=0,
+                completed_trip_count=0,
+                distance_km=0,
+                revenue=0,
+                fuel_cost=0,
+                total_expenses=0
+            ))
+            current = _next_bucket(current, granularity)
+    
+    return AnalyticsSeries(
+        report_date=datetime.utcnow(),
+        granularity=granularity,
+        group_by=group_by,
+        period_start=start_date,
+        period_end=end_date,
+        points=points
+    )
+
+
+# ==================== REPORT CACHE ====================
+
+@router.get("/cache/stats", response_model=ReportCacheStats)
+def get_report_cache_stats():
+    """Get report cache hit/miss counters and size"""
+    return ReportCacheStats(**report_cache.stats())
+
+
+@router.delete("/cache", status_code=204)
+def clear_report_cache():
+    """Drop every cached report (e.g. after a rollup rebuild)"""
+    report_cache.clear()
+
+
+# ==================== CSV EXPORTS ====================
+
+# Rows encoded per chunk flushed to the client, and rows fetched per
+# round trip from the server-side cursor for row-level exports.
+CSV_CHUNK_ROWS = 500
+EXPORT_FETCH_ROWS = 1000
+
+
+def _csv_chunks(header: list, rows):
+    """Encode rows as CSV incrementally, yielding the header first and then
+    one chunk every CSV_CHUNK_ROWS rows, so memory stays bounded and the
+    first byte goes out before the whole export has been read."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    
+    def flush():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return chunk
+    
+    writer.writerow(header)
+    yield flush()
+    
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= CSV_CHUNK_ROWS:
+            yield flush()
+            pending = 0
+    
+    if pending:
+        yield flush()
+
+
+def _csv_response(name: str, chunks) -> StreamingResponse:
+    filename = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    return StreamingResponse(
+        chunks,
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+def _fuel_efficiency_export(start_date: Optional[date], end_date: Optional[date], db: Session):
     report = get_fuel_efficiency_report(start_date, end_date, None, db)
     
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Header
-    writer.writerow([
+    def rows():
+        for v in report.vehicles:
+            yield [
+                v.vehicle_id, v.registration_number, v.make, v.model,
+                v.total_distance_km, v.total_fuel_liters, v.fuel_efficiency_km_per_liter,
+                v.total_fuel_cost, v.cost_per_km
+            ]
+        
+        # Summary row
+        yield []
+        yield ["TOTAL", "", "", "",
+            report.total_distance_km, report.total_fuel_liters,
+            report.average_efficiency_km_per_liter, report.total_fuel_cost, ""
+        ]
+    
+    header = [
         "Vehicle ID", "Registration", "Make", "Model",
         "Distance (km)", "Fuel (L)", "Efficiency (km/L)",
         "Fuel Cost", "Cost per km"
-    ])
-    
-    # Data rows
-    for v in report.vehicles:
-        writer.writerow([
-            v.vehicle_id, v.registration_number, v.make, v.model,
-            v.total_distance_km, v.total_fuel_liters, v.fuel_efficiency_km_per_liter,
-            v.total_fuel_cost, v.cost_per_km
-        ])
-    
-    # Summary row
-    writer.writerow([])
-    writer.writerow(["TOTAL", "", "", "",
-        report.total_distance_km, report.total_fuel_liters,
-        report.average_efficiency_km_per_liter, report.total_fuel_cost, ""
-    ])
-    
-    output.seek(0)
-    
-    filename = f"fuel_efficiency_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    
-    return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    ]
+    return header, rows()
 
 
-@router.get("/export/vehicle-roi/csv")
-def export_vehicle_roi_csv(
+@router.get("/export/fuel-efficiency/csv")
+def export_fuel_efficiency_csv(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     db: Session = Depends(get_db)
 ):
-    """Export vehicle ROI report as CSV"""
+    """Export fuel efficiency report as CSV"""
     
+    header, rows = _fuel_efficiency_export(start_date, end_date, db)
+    return _csv_response("fuel_efficiency_report", _csv_chunks(header, rows))
+
+
+def _vehicle_roi_export(start_date: Optional[date], end_date: Optional[date], db: Session):
     report = get_vehicle_roi_report(start_date, end_date, None, db)
     
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Header
-    writer.writerow([
+    def rows():
+        for v in report.vehicles:
+            yield [
+                v.vehicle_id, v.registration_number, v.make, v.model, v.year,
+                v.purchase_price, v.current_value, v.depreciation,
+                v.total_revenue, v.total_expenses, v.net_profit, v.roi_percentage,
+                v.cost_per_km, v.revenue_per_km
+            ]
+        
+        # Summary row
+        yield []
+        yield ["FLEET TOTAL", "", "", "", "",
+            report.total_purchase_value, report.total_current_value, report.total_depreciation,
+            report.total_revenue, report.total_expenses, report.fleet_net_profit,
+            report.fleet_roi_percentage, "", ""
+        ]
+    
+    header = [
         "Vehicle ID", "Registration", "Make", "Model", "Year",
         "Purchase Price", "Current Value", "Depreciation",
         "Revenue", "Expenses", "Net Profit", "ROI %",
         "Cost/km", "Revenue/km"
-    ])
-    
-    # Data rows
-    for v in report.vehicles:
-        writer.writerow([
-            v.vehicle_id, v.registration_number, v.make, v.model, v.year,
-            v.purchase_price, v.current_value, v.depreciation,
-            v.total_revenue, v.total_expenses, v.net_profit, v.roi_percentage,
-            v.cost_per_km, v.revenue_per_km
-        ])
-    
-    # Summary row
-    writer.writerow([])
-    writer.writerow(["FLEET TOTAL", "", "", "", "",
-        report.total_purchase_value, report.total_current_value, report.total_depreciation,
-        report.total_revenue, report.total_expenses, report.fleet_net_profit,
-        report.fleet_roi_percentage, "", ""
-    ])
+    ]
+    return header, rows()
+
+
+@router.get("/export/vehicle-roi/csv")
+def export_vehicle_roi_csv(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    """Export vehicle ROI report as CSV"""
     
-    output.seek(0)
+    header, rows = _vehicle_roi_export(start_date, end_date, db)
+    return _csv_response("vehicle_roi_report", _csv_chunks(header, rows))
+
+
+def _expense_export(start_date: Optional[date], end_date: Optional[date], db: Session):
+    report = get_expense_report(start_date, end_date, None, db)
     
-    filename = f"vehicle_roi_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    def rows():
+        for e in report.expense_by_category:
+            yield [e.category, e.total_amount, e.count, f"{e.percentage_of_total}%"]
+        
+        # Summary row
+        yield []
+        yield ["TOTAL", report.total_expenses, "", "100%"]
     
-    return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    header = ["Category", "Total Amount", "Count", "Percentage of Total"]
+    return header, rows()
 
 
 @router.get("/export/expenses/csv")
@@ -507,75 +846,146 @@ def export_expenses_csv(
 ):
     """Export expense report as CSV"""
     
-    report = get_expense_report(start_date, end_date, None, db)
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Header
-    writer.writerow(["Category", "Total Amount", "Count", "Percentage of Total"])
-    
-    # Data rows
-    for e in report.expense_by_category:
-        writer.writerow([e.category, e.total_amount, e.count, f"{e.percentage_of_total}%"])
-    
-    # Summary row
-    writer.writerow([])
-    writer.writerow(["TOTAL", report.total_expenses, "", "100%"])
-    
-    output.seek(0)
-    
-    filename = f"expense_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    
-    return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    header, rows = _expense_export(start_date, end_date, db)
+    return _csv_response("expense_report", _csv_chunks(header, rows))
+
+
+def _iter_trip_rows(start_date: Optional[date], end_date: Optional[date], db: Optional[Session] = None):
+    """Stream trip rows through a server-side cursor, EXPORT_FETCH_ROWS at a time.
+
+    Without a session it runs on its own, because the body of a
+    StreamingResponse is consumed after the request's dependencies may
+    already have been closed. Only plain columns are selected, so no ORM
+    objects accumulate in the identity map however many rows are exported.
+    """
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        query = db.query(
+            Trip.id, Trip.vehicle_id, Trip.driver_name,
+            Trip.start_location, Trip.end_location, Trip.distance_km,
+            Trip.scheduled_start, Trip.scheduled_end, Trip.actual_start, Trip.actual_end,
+            Trip.status, Trip.trip_cost, Trip.revenue
+        )
+        if start_date:
+            query = query.filter(Trip.created_at >= datetime.combine(start_date, datetime.min.time()))
+        if end_date:
+            query = query.filter(Trip.created_at <= datetime.combine(end_date, datetime.max.time()))
+        
+        for t in query.order_by(Trip.id).yield_per(EXPORT_FETCH_ROWS):
+            yield [
+                t.id, t.vehicle_id, t.driver_name,
+                t.start_location, t.end_location, t.distance_km,
+                t.scheduled_start, t.scheduled_end, t.actual_start, t.actual_end,
+                t.status.value if t.status else "", t.trip_cost, t.revenue
+            ]
+    finally:
+        if own_session:
+            db.close()
+
+
+_TRIP_EXPORT_HEADER = [
+    "Trip ID", "Vehicle ID", "Driver Name",
+    "Start Location", "End Location", "Distance (km)",
+    "Scheduled Start", "Scheduled End", "Actual Start", "Actual End",
+    "Status", "Trip Cost", "Revenue"
+]
+
+
+def _trip_export(start_date: Optional[date], end_date: Optional[date], db: Session):
+    return _TRIP_EXPORT_HEADER, _iter_trip_rows(start_date, end_date, db)
 
 
 @router.get("/export/trips/csv")
 def export_trips_csv(
     start_date: Optional[date] = None,
-    end_date: Optional[date] = None,
-    db: Session = Depends(get_db)
+    end_date: Optional[date] = None
 ):
     """Export detailed trip data as CSV for audits/payroll"""
     
-    query = db.query(Trip)
-    if start_date:
-        query = query.filter(Trip.created_at >= datetime.combine(start_date, datetime.min.time()))
-    if end_date:
-        query = query.filter(Trip.created_at <= datetime.combine(end_date, datetime.max.time()))
-    
-    trips = query.all()
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Header
-    writer.writerow([
-        "Trip ID", "Vehicle ID", "Driver Name",
-        "Start Location", "End Location", "Distance (km)",
-        "Scheduled Start", "Scheduled End", "Actual Start", "Actual End",
-        "Status", "Trip Cost", "Revenue"
-    ])
-    
-    # Data rows
-    for t in trips:
-        writer.writerow([
-            t.id, t.vehicle_id, t.driver_name,
-            t.start_location, t.end_location, t.distance_km,
-            t.scheduled_start, t.scheduled_end, t.actual_start, t.actual_end,
-            t.status.value if t.status else "", t.trip_cost, t.revenue
-        ])
-    
-    output.seek(0)
-    
-    filename = f"trips_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    
-    return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    return _csv_response("trips_report", _csv_chunks(_TRIP_EXPORT_HEADER, _iter_trip_rows(start_date, end_date)))
+
+
+# ==================== REPORT JOBS ====================
+
+# ExportRequest.report_type -> (artifact file name, header/rows builder)
+EXPORTS = {
+    "fuel_efficiency": ("fuel_efficiency_report", _fuel_efficiency_export),
+    "roi": ("vehicle_roi_report", _vehicle_roi_export),
+    "expenses": ("expense_report", _expense_export),
+    "trips": ("trips_report", _trip_export),
+}
+
+
+def _job_status(job) -> ReportJobStatus:
+    return ReportJobStatus(
+        job_id=job.id,
+        report_type=job.report_type,
+        status=job.status,
+        reused=job.reused,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        download_url=f"{router.prefix}/jobs/{job.id}/download" if job.status == COMPLETED else None
     )
+
+
+@router.post("/jobs", response_model=ReportJobStatus, status_code=202)
+def submit_report_job(request: ExportRequest):
+    """Queue an export to be built in the background; poll the returned job"""
+    
+    if request.report_type not in EXPORTS:
+        raise HTTPException(status_code=400, detail=f"Unknown report type. Choose from: {', '.join(EXPORTS)}")
+    if request.format != "csv":
+        raise HTTPException(status_code=400, detail="Only CSV exports are supported")
+    if request.vehicle_ids:
+        raise HTTPException(status_code=400, detail="Exports cover the whole fleet; vehicle_ids is not supported")
+    
+    name, build = EXPORTS[request.report_type]
+    start_date, end_date = request.start_date, request.end_date
+    
+    def write(artifact):
+        db = SessionLocal()
+        try:
+            header, rows = build(start_date, end_date, db)
+            for chunk in _csv_chunks(header, rows):
+                artifact.write(chunk)
+        finally:
+            db.close()
+    
+    try:
+        job = report_jobs.submit(
+            request.report_type,
+            {"start_date": start_date, "end_date": end_date},
+            f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            write,
+        )
+    except JobQueueFull:
+        raise HTTPException(status_code=429, detail="Too many report jobs pending, retry later")
+    return _job_status(job)
+
+
+@router.get("/jobs/{job_id}", response_model=ReportJobStatus)
+def get_report_job(job_id: str):
+    """Get the status of a report job"""
+    job = report_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return _job_status(job)
+
+
+@router.get("/jobs/{job_id}/download")
+def download_report_job(job_id: str):
+    """Download the finished artifact of a report job"""
+    job = report_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    if job.status != COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Report job is {job.status}")
+    
+    path = report_jobs.artifact_path(job)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Report artifact has been removed, submit the job again")
+    return FileResponse(path, media_type="text/csv", filename=job.filename)
@@ -0,0 +1,149 @@
+from fastapi import APIRouter, Depends, Query, HTTPException
+from sqlalchemy.orm import Session
+from sqlalchemy import func, or_
+from typing import Optional
+from datetime import datetime, timedelta
+
+from app.database import get_db
+from app.models.vehicle import Vehicle
+from app.models.trip import Trip
+from app.models.enums import TripStatus
+from app.services.schedule_index import schedule_index, as_utc_naive, BOOKED_STATUSES
+from app.schemas.schedule import TripScheduleCreate, ScheduledTrip, Availability, ScheduleSlot
+
+router = APIRouter(prefix="/api/schedule", tags=["Scheduling"])
+
+
+def _require_resource(vehicle_id: Optional[int], driver_name: Optional[str]):
+    if vehicle_id is None and not driver_name:
+        raise HTTPException(status_code=400, detail="Give a vehicle_id, a driver_name or both")
+
+
+def _require_window(start: datetime, end: datetime):
+    if end <= start:
+        raise HTTPException(status_code=400, detail="The window must end after it starts")
+
+
+def _lock_resources(db: Session, vehicle_id: int, driver_name: Optional[str]):
+    """Serialize bookings of the same vehicle or driver until this transaction ends"""
+    if db.get_bind().dialect.name != "postgresql":
+        return  # SQLite runs one writer at a time anyway
+    keys = sorted(filter(None, [f"vehicle:{vehicle_id}", driver_name and f"driver:{driver_name}"]))
+    for key in keys:
+        db.execute(func.pg_advisory_xact_lock(func.hashtext(key)).select())
+
+
+def _booked_in_database(db: Session, vehicle_id: int, driver_name: Optional[str],
+                        start: datetime, end: datetime) -> bool:
+    holder = Trip.vehicle_id == vehicle_id
+    if driver_name:
+        holder = or_(holder, Trip.driver_name == driver_name)
+    return db.query(
+        db.query(Trip.id).filter(
+            holder,
+            Trip.status.in_(BOOKED_STATUSES),
+            Trip.scheduled_start < end,
+            Trip.scheduled_end > start,
+        ).exists()
+    ).scalar()
+
+
+def _conflict_detail(vehicle_conflicts, driver_conflicts) -> str:
+    parts = []
+    if vehicle_conflicts:
+        parts.append(f"vehicle is booked by trip(s) {', '.join(map(str, vehicle_conflicts))}")
+    if driver_conflicts:
+        parts.append(f"driver is booked by trip(s) {', '.join(map(str, driver_conflicts))}")
+    return "Schedule conflict: " + "; ".join(parts)
+
+
+@router.get("/availability", response_model=Availability)
+def check_availability(
+    start: datetime,
+    end: datetime,
+    vehicle_id: Optional[int] = None,
+    driver_name: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Whether the vehicle and/or driver is free for the whole window, and which trips are in the way"""
+    _require_resource(vehicle_id, driver_name)
+    start, end = as_utc_naive(start), as_utc_naive(end)
+    _require_window(start, end)
+
+    schedule_index.ensure_fresh(db)
+    vehicle_conflicts, driver_conflicts = schedule_index.conflicts(vehicle_id, driver_name, start, end)
+    return Availability(
+        start=start,
+        end=end,
+        free=not vehicle_conflicts and not driver_conflicts,
+        vehicle_conflicts=vehicle_conflicts,
+        driver_conflicts=driver_conflicts,
+    )
+
+
+@router.get("/next-slot", response_model=ScheduleSlot)
+def find_next_slot(
+    duration_minutes: int = Query(..., gt=0, le=60 * 24 * 30),
+    after: Optional[datetime] = None,
+    vehicle_id: Optional[int] = None,
+    driver_name: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Earliest window of the given length, starting no sooner than `after` (default now),
+    when the vehicle and/or driver is free"""
+    _require_resource(vehicle_id, driver_name)
+    after = as_utc_naive(after) if after else datetime.utcnow()
+    duration = timedelta(minutes=duration_minutes)
+
+    schedule_index.ensure_fresh(db)
+    start = schedule_index.next_free(vehicle_id, driver_name, after, duration)
+    return ScheduleSlot(start=start, end=start + duration)
+
+
+@router.post("/trips", response_model=ScheduledTrip, status_code=201)
+def schedule_trip(trip: TripScheduleCreate, db: Session = Depends(get_db)):
+    """Book a trip for its scheduled window; 409 if the vehicle or driver is already booked then"""
+    start, end = as_utc_naive(trip.scheduled_start), as_utc_naive(trip.scheduled_end)
+    _require_window(start, end)
+    if not db.query(Vehicle.id).filter(Vehicle.id == trip.vehicle_id).first():
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+
+    _lock_resources(db, trip.vehicle_id, trip.driver_name)
+
+    # The index says who holds the window, but only the database under the
+    # lock decides: other workers' bookings and cancellations reach this
+    # index only when it reloads, so it can be wrong either way
+    schedule_index.ensure_fresh(db)
+    vehicle_conflicts, driver_conflicts = schedule_index.conflicts(trip.vehicle_id, trip.driver_name, start, end)
+    indexed_conflict = bool(vehicle_conflicts or driver_conflicts)
+    booked = _booked_in_database(db, trip.vehicle_id, trip.driver_name, start, end)
+    if booked != indexed_conflict:
+        schedule_index.invalidate()
+    if booked and indexed_conflict:
+        raise HTTPException(status_code=409, detail=_conflict_detail(vehicle_conflicts, driver_conflicts))
+    if booked:
+        raise HTTPException(status_code=409, detail="Schedule conflict: the window was booked by another worker, reload and retry")
+
+    new_trip = Trip(
+        vehicle_id=trip.vehicle_id,
+        driver_name=trip.driver_name,
+        start_location=trip.start_location,
+        end_location=trip.end_location,
+        scheduled_start=start,
+        scheduled_end=end,
+        status=TripStatus.SCHEDULED,
+    )
+    db.add(new_trip)
+    db.commit()
+    db.refresh(new_trip)
+
+    return ScheduledTrip(
+        id=new_trip.id,
+        vehicle_id=new_trip.vehicle_id,
+        driver_name=new_trip.driver_name,
+        start_location=new_trip.start_location,
+        end_location=new_trip.end_location,
+        scheduled_start=new_trip.scheduled_start,
+        scheduled_end=new_trip.scheduled_end,
+        status=new_trip.status.value,
+    )
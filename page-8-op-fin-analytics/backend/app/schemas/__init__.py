@@ -1 +1,2 @@
 from app.schemas.analytics import *
+from app.schemas.schedule import *
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from enum import Enum
 from typing import Optional, List
 from datetime import datetime, date
 
@@ -28,6 +29,43 @@ class FleetFuelEfficiencyReport(BaseModel):
     vehicles: List[FuelEfficiencyMetric]
 
 
+# Fill-to-fill (odometer delta) Fuel Efficiency
+class FillEfficiency(BaseModel):
+    fuel_log_id: int
+    vehicle_id: int
+    fill_date: datetime
+    odometer_at_fill: float
+    previous_odometer: Optional[float] = None
+    fuel_liters: float
+    distance_km: Optional[float] = None
+    efficiency_km_per_liter: Optional[float] = None
+
+
+class VehicleOdometerEfficiency(BaseModel):
+    vehicle_id: int
+    registration_number: str
+    make: str
+    model: str
+    distance_km: float
+    fuel_liters: float
+    efficiency_km_per_liter: float
+    rolling_30d_distance_km: float
+    rolling_30d_fuel_liters: float
+    rolling_30d_efficiency_km_per_liter: float
+
+
+class FleetOdometerEfficiencyReport(BaseModel):
+    report_date: datetime
+    period_start: Optional[date] = None
+    period_end: Optional[date] = None
+    total_vehicles: int
+    total_distance_km: float
+    total_fuel_liters: float
+    average_efficiency_km_per_liter: float
+    rolling_30d_efficiency_km_per_liter: float
+    vehicles: List[VehicleOdometerEfficiency]
+
+
 # Vehicle ROI Metrics
 class VehicleROIMetric(BaseModel):
     vehicle_id: int
@@ -104,6 +142,81 @@ class DashboardSummary(BaseModel):
     average_fleet_efficiency_km_per_liter: float
 
 
+# Time-bucketed Series
+class SeriesGranularity(str, Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+
+class SeriesGroupBy(str, Enum):
+    VEHICLE = "vehicle"
+    VEHICLE_TYPE = "vehicle_type"
+
+
+class SeriesPoint(BaseModel):
+    bucket_start: date
+    vehicle_id: Optional[int] = None
+    registration_number: Optional[str] = None
+    vehicle_type: Optional[str] = None
+    trip_count: int
+    completed_trip_count: int
+    distance_km: float
+    revenue: float
+    fuel_cost: float
+    total_expenses: float
+
+
+class AnalyticsSeries(BaseModel):
+    report_date: datetime
+    granularity: SeriesGranularity
+    group_by: Optional[SeriesGroupBy] = None
+    period_start: Optional[date] = None
+    period_end: Optional[date] = None
+    points: List[SeriesPoint]
+
+
+
+# Distances
+MAX_MATRIX_LOCATIONS = 1000
+
+
+class DistanceMatrixRequest(BaseModel):
+    origins: List[str] = Field(..., min_length=1, max_length=MAX_MATRIX_LOCATIONS)
+    destinations: List[str] = Field(..., min_length=1, max_length=MAX_MATRIX_LOCATIONS)
+
+
+class ResolvedLocation(BaseModel):
+    query: str
+    name: Optional[str] = None  # None when the gazetteer does not know the place
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+
+class DistanceMatrix(BaseModel):
+    origins: List[ResolvedLocation]
+    destinations: List[ResolvedLocation]
+    distances_km: List[List[Optional[float]]]  # [origin][destination], straight-line
+
+
+class TripDistanceBackfill(BaseModel):
+    scanned: int
+    updated: int
+    unresolved: int
+
+
+# Report Cache
+class ReportCacheStats(BaseModel):
+    backend: str
+    entries: int  # Redis backend: live scopes rather than entries
+    hits: int
+    misses: int
+    hit_ratio: float
+    invalidations: int
+    evictions: int
+    ttl_seconds: float
+
+
 # Export Request
 class ExportRequest(BaseModel):
     report_type: str  # "fuel_efficiency", "roi", "expenses", "trips"
@@ -117,3 +230,16 @@ class ExportResponse(BaseModel):
     filename: str
     content_type: str
     download_url: str
+
+
+# Report Jobs
+class ReportJobStatus(BaseModel):
+    job_id: str
+    report_type: str
+    status: str  # "queued", "running", "completed", "failed"
+    reused: bool
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    download_url: Optional[str] = None
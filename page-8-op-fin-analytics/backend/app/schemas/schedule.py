@@ -0,0 +1,36 @@
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import datetime
+
+
+class TripScheduleCreate(BaseModel):
+    vehicle_id: int
+    driver_name: Optional[str] = None
+    start_location: Optional[str] = None
+    end_location: Optional[str] = None
+    scheduled_start: datetime
+    scheduled_end: datetime
+
+
+class ScheduledTrip(BaseModel):
+    id: int
+    vehicle_id: int
+    driver_name: Optional[str] = None
+    start_location: Optional[str] = None
+    end_location: Optional[str] = None
+    scheduled_start: datetime
+    scheduled_end: datetime
+    status: str
+
+
+class Availability(BaseModel):
+    start: datetime
+    end: datetime
+    free: bool
+    vehicle_conflicts: List[int]  # trip ids
+    driver_conflicts: List[int]
+
+
+class ScheduleSlot(BaseModel):
+    start: datetime
+    end: datetime
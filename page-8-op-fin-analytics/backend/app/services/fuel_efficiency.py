@@ -0,0 +1,131 @@
+"""
+Fill-to-fill (odometer delta) fuel efficiency.
+
+Uses the full-tank method: the liters bought at a fill are what the vehicle
+burned since its previous fill, so each fill after the first one yields a
+segment of `odometer_at_fill - previous odometer_at_fill` km over
+`fuel_amount_liters` L. The previous reading comes from a LAG() window per
+vehicle, and segments are summed per vehicle and for the fleet in the same
+statement, so everything is computed by the database in one pass.
+"""
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, case, func, or_, select
+
+from app.models.fuel_log import FuelLog
+from app.models.vehicle import Vehicle
+
+ROLLING_WINDOW_DAYS = 30
+
+
+def fill_segments(end_date: Optional[date] = None, vehicle_id: Optional[int] = None):
+    """Subquery of fuel logs with the vehicle's previous odometer reading.
+
+    Not limited by a start date: the fill just before the period still has to
+    be visible to LAG() so the first segment in the period has a baseline.
+    """
+    previous_odometer = func.lag(FuelLog.odometer_at_fill).over(
+        partition_by=FuelLog.vehicle_id,
+        order_by=(FuelLog.fill_date, FuelLog.id),
+    )
+    query = select(
+        FuelLog.id.label("fuel_log_id"),
+        FuelLog.vehicle_id,
+        FuelLog.fill_date,
+        FuelLog.odometer_at_fill,
+        FuelLog.fuel_amount_liters,
+        previous_odometer.label("previous_odometer"),
+    ).where(FuelLog.fill_date.isnot(None))
+    if end_date:
+        query = query.where(FuelLog.fill_date <= datetime.combine(end_date, datetime.max.time()))
+    if vehicle_id:
+        query = query.where(FuelLog.vehicle_id == vehicle_id)
+    return query.subquery("fill_segments")
+
+
+def _segment_columns(segments):
+    # Odometer resets and out-of-order readings do not form a usable segment
+    valid = and_(
+        segments.c.previous_odometer.isnot(None),
+        segments.c.odometer_at_fill > segments.c.previous_odometer,
+    )
+    distance = segments.c.odometer_at_fill - segments.c.previous_odometer
+    return valid, distance
+
+
+def fill_efficiency_query(start_date: Optional[date] = None, end_date: Optional[date] = None,
+                          vehicle_id: Optional[int] = None):
+    """One row per fill in the period with its segment distance and km/L"""
+    segments = fill_segments(end_date, vehicle_id)
+    valid, distance = _segment_columns(segments)
+    segment_distance = case((valid, distance), else_=None)
+    query = select(
+        segments.c.fuel_log_id,
+        segments.c.vehicle_id,
+        segments.c.fill_date,
+        segments.c.odometer_at_fill,
+        segments.c.previous_odometer,
+        segments.c.fuel_amount_liters,
+        segment_distance.label("distance_km"),
+        case(
+            (and_(valid, segments.c.fuel_amount_liters > 0), distance / segments.c.fuel_amount_liters),
+            else_=None,
+        ).label("efficiency_km_per_liter"),
+    )
+    if start_date:
+        query = query.where(segments.c.fill_date >= datetime.combine(start_date, datetime.min.time()))
+    return query.order_by(segments.c.vehicle_id, segments.c.fill_date, segments.c.fuel_log_id)
+
+
+def vehicle_efficiency_query(start_date: Optional[date] = None, end_date: Optional[date] = None,
+                             vehicle_id: Optional[int] = None):
+    """Per-vehicle segment totals, trailing 30-day totals and fleet totals.
+
+    The rolling window is the 30 days ending on `end_date` (today when
+    open-ended). Fleet totals are window sums over the grouped rows, so they
+    arrive on every row of the same result set.
+    """
+    segments = fill_segments(end_date, vehicle_id)
+    valid, distance = _segment_columns(segments)
+
+    window_end = end_date or datetime.utcnow().date()
+    rolling_start = datetime.combine(window_end - timedelta(days=ROLLING_WINDOW_DAYS - 1), datetime.min.time())
+    rolling = and_(valid, segments.c.fill_date >= rolling_start)
+
+    def total(condition, value):
+        return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+    in_period = valid
+    if start_date:
+        in_period = and_(valid, segments.c.fill_date >= datetime.combine(start_date, datetime.min.time()))
+
+    distance_km = total(in_period, distance)
+    fuel_liters = total(in_period, segments.c.fuel_amount_liters)
+    rolling_distance_km = total(rolling, distance)
+    rolling_fuel_liters = total(rolling, segments.c.fuel_amount_liters)
+
+    return (
+        select(
+            Vehicle.id.label("vehicle_id"),
+            Vehicle.registration_number,
+            Vehicle.make,
+            Vehicle.model,
+            distance_km.label("distance_km"),
+            fuel_liters.label("fuel_liters"),
+            rolling_distance_km.label("rolling_distance_km"),
+            rolling_fuel_liters.label("rolling_fuel_liters"),
+            func.sum(distance_km).over().label("fleet_distance_km"),
+            func.sum(fuel_liters).over().label("fleet_fuel_liters"),
+            func.sum(rolling_distance_km).over().label("fleet_rolling_distance_km"),
+            func.sum(rolling_fuel_liters).over().label("fleet_rolling_fuel_liters"),
+        )
+        .join(segments, segments.c.vehicle_id == Vehicle.id)
+        .group_by(Vehicle.id, Vehicle.registration_number, Vehicle.make, Vehicle.model)
+        .having(func.sum(case((or_(in_period, rolling), 1), else_=0)) > 0)
+        .order_by(Vehicle.id)
+    )
+
+
+def km_per_liter(distance_km: float, fuel_liters: float) -> float:
+    return round(distance_km / fuel_liters, 2) if fuel_liters > 0 else 0
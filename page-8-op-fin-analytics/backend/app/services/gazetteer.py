@@ -0,0 +1,139 @@
+"""
+Offline gazetteer: free-text trip locations to coordinates, and distances.
+
+Place names are normalised (case, accents, punctuation, whitespace) and
+looked up in a local place file, with no external geocoding service. A
+string that does not match as a whole is tried one comma-separated part at
+a time, so "Andheri East, Mumbai" resolves to Mumbai. Resolved names go
+through an LRU cache of GAZETTEER_CACHE_SIZE entries, because trip
+locations repeat heavily.
+
+Place files:
+- app/data/gazetteer.csv (bundled): major Indian cities, with columns
+  name, aliases ("|"-separated), latitude and longitude.
+- Any file of the same shape, or a GeoNames dump (cities500.txt,
+  IN.txt, ...), selected with GAZETTEER_PATH. For GeoNames, the name, ASCII
+  name and alternate names all match, and the most populous place wins.
+
+Distances are great-circle (haversine) kilometres, computed with numpy
+over whole arrays of coordinates. They are straight-line figures and come
+out shorter than the road distance.
+"""
+import csv
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+BUNDLED_GAZETTEER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "gazetteer.csv")
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", BUNDLED_GAZETTEER)
+GAZETTEER_CACHE_SIZE = int(os.getenv("GAZETTEER_CACHE_SIZE", "4096"))
+
+EARTH_RADIUS_KM = 6371.0088
+
+# GeoNames dump columns
+_GEONAMES_NAME, _GEONAMES_ASCII, _GEONAMES_ALTERNATES = 1, 2, 3
+_GEONAMES_LAT, _GEONAMES_LON, _GEONAMES_POPULATION = 4, 5, 14
+
+
+class Place(NamedTuple):
+    name: str
+    latitude: float
+    longitude: float
+
+
+def normalize(name: str) -> str:
+    text = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+
+def _read_csv(path: str) -> Dict[str, Place]:
+    places: Dict[str, Place] = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            place = Place(row["name"], float(row["latitude"]), float(row["longitude"]))
+            for alias in [row["name"], *(row.get("aliases") or "").split("|")]:
+                key = normalize(alias)
+                if key:
+                    places.setdefault(key, place)
+    return places
+
+
+def _read_geonames(path: str) -> Dict[str, Place]:
+    places: Dict[str, Tuple[int, Place]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            population = int(fields[_GEONAMES_POPULATION] or 0)
+            place = Place(fields[_GEONAMES_NAME], float(fields[_GEONAMES_LAT]), float(fields[_GEONAMES_LON]))
+            names = [fields[_GEONAMES_NAME], fields[_GEONAMES_ASCII], *fields[_GEONAMES_ALTERNATES].split(",")]
+            for alias in names:
+                key = normalize(alias)
+                if key and (key not in places or places[key][0] < population):
+                    places[key] = (population, place)
+    return {key: place for key, (_, place) in places.items()}
+
+
+class Gazetteer:
+    def __init__(self, places: Dict[str, Place], cache_size: int = GAZETTEER_CACHE_SIZE):
+        self._places = places  # normalised name -> place
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+
+    @classmethod
+    def from_file(cls, path: str, cache_size: int = GAZETTEER_CACHE_SIZE) -> "Gazetteer":
+        reader = _read_csv if path.lower().endswith(".csv") else _read_geonames
+        return cls(reader(path), cache_size)
+
+    def __len__(self):
+        return len(self._places)
+
+    def _resolve(self, name: Optional[str]) -> Optional[Place]:
+        """The place a location string refers to, or None"""
+        if not name:
+            return None
+        place = self._places.get(normalize(name))
+        if place is None:
+            for part in name.split(","):
+                place = self._places.get(normalize(part))
+                if place is not None:
+                    break
+        return place
+
+    def coordinates(self, names: Iterable[Optional[str]]) -> np.ndarray:
+        """(n, 2) array of latitude/longitude; NaN rows for names that do not resolve"""
+        points = [self.resolve(name) for name in names]
+        return np.array(
+            [(p.latitude, p.longitude) if p else (np.nan, np.nan) for p in points],
+            dtype=float,
+        ).reshape(-1, 2)
+
+
+@lru_cache(maxsize=None)
+def get_gazetteer() -> Gazetteer:
+    """The gazetteer loaded from GAZETTEER_PATH, read on first use"""
+    return Gazetteer.from_file(GAZETTEER_PATH)
+
+
+def haversine_km(origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+    """Great-circle distances between (..., 2) latitude/longitude arrays; broadcasts, NaN in -> NaN out"""
+    lat1, lon1 = np.radians(origins[..., 0]), np.radians(origins[..., 1])
+    lat2, lon2 = np.radians(destinations[..., 0]), np.radians(destinations[..., 1])
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def trip_distances_km(starts: Sequence[Optional[str]], ends: Sequence[Optional[str]],
+                      gazetteer: Optional[Gazetteer] = None) -> np.ndarray:
+    """Distance of each (start, end) pair; NaN where either end does not resolve"""
+    gazetteer = gazetteer or get_gazetteer()
+    return haversine_km(gazetteer.coordinates(starts), gazetteer.coordinates(ends))
+
+
+def distance_matrix_km(origins: Sequence[Optional[str]], destinations: Sequence[Optional[str]],
+                       gazetteer: Optional[Gazetteer] = None) -> np.ndarray:
+    """len(origins) x len(destinations) distances; NaN where a name does not resolve"""
+    gazetteer = gazetteer or get_gazetteer()
+    return haversine_km(gazetteer.coordinates(origins)[:, None, :], gazetteer.coordinates(destinations)[None, :, :])
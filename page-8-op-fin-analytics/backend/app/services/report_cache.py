@@ -0,0 +1,411 @@
+"""
+Report result cache for the analytics endpoints.
+
+Results are cached per endpoint and parameter set, together with the scope
+they were computed over (vehicle filter and date range). When a Trip,
+FuelLog or Expense is committed, only the entries whose scope covers the
+written (vehicle, day) are dropped; a Vehicle write drops the entries for
+that vehicle and the fleet-wide ones.
+
+Backends:
+- MemoryCacheBackend (default): per-process LRU with TTL.
+- RedisCacheBackend: shared across workers, selected with
+  REPORT_CACHE_URL=redis://host:6379/0 (needs the `redis` package).
+  Configure `maxmemory-policy allkeys-lru` on the server for LRU eviction.
+
+With the memory backend, writes made by other processes are only picked up
+when entries expire, so keep REPORT_CACHE_TTL short in multi-worker setups.
+
+A report computed while a write commits may hold pre-commit data, and the
+invalidation can run before the report is stored. So the cache takes a
+token from the backend before computing (begin) and the backend stores the
+result only if no invalidation covering its scope has happened since.
+"""
+import inspect
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import date
+from functools import wraps
+from itertools import chain
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.vehicle import Vehicle
+from app.services.rollup import touched_buckets
+
+REPORT_CACHE_URL = os.getenv("REPORT_CACHE_URL")
+REPORT_CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", "300"))
+REPORT_CACHE_MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "512"))
+
+# (vehicle_id, day); day None means every date of that vehicle
+TouchedKey = Tuple[int, Optional[date]]
+
+
+@dataclass(frozen=True)
+class CacheScope:
+    """The slice of data a cached report was computed from (None = unbounded)"""
+    vehicle_id: Optional[int] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+    def covers(self, vehicle_id: int, day: Optional[date]) -> bool:
+        if self.vehicle_id is not None and self.vehicle_id != vehicle_id:
+            return False
+        if day is None:
+            return True
+        if self.start_date is not None and day < self.start_date:
+            return False
+        if self.end_date is not None and day > self.end_date:
+            return False
+        return True
+
+    def token(self) -> str:
+        return "|".join("" if part is None else str(part) for part in (self.vehicle_id, self.start_date, self.end_date))
+
+    @classmethod
+    def from_token(cls, token: str) -> "CacheScope":
+        vehicle_id, start_date, end_date = token.split("|")
+        return cls(
+            vehicle_id=int(vehicle_id) if vehicle_id else None,
+            start_date=date.fromisoformat(start_date) if start_date else None,
+            end_date=date.fromisoformat(end_date) if end_date else None,
+        )
+
+
+@dataclass
+class CacheEntry:
+    value: object
+    scope: CacheScope
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with a per-entry TTL.
+
+    Tokens are invalidation sequence numbers. The last invalidations are kept
+    so set() can tell whether one of them covered the entry's scope; a token
+    older than that log is refused.
+    """
+    name = "memory"
+
+    def __init__(self, max_entries: int = REPORT_CACHE_MAX_ENTRIES, recent_invalidations: int = 256):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[float, CacheEntry]]" = OrderedDict()
+        self._sequence = 0
+        self._recent: deque = deque(maxlen=recent_invalidations)  # (sequence, touched)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def begin(self, scope: CacheScope, ttl: float) -> int:
+        with self._lock:
+            return self._sequence
+
+    def _invalidated_since(self, token: int, scope: CacheScope) -> bool:
+        if token == self._sequence:
+            return False
+        if token < self._sequence - len(self._recent):
+            return True  # fell out of the log; assume the worst
+        return any(
+            sequence > token and any(scope.covers(vehicle_id, day) for vehicle_id, day in touched)
+            for sequence, touched in self._recent
+        )
+
+    def set(self, key: str, entry: CacheEntry, ttl: float, token: int) -> bool:
+        with self._lock:
+            if self._invalidated_since(token, entry.scope):
+                return False
+            self._entries[key] = (time.monotonic() + ttl, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, touched: Set[TouchedKey]) -> int:
+        with self._lock:
+            self._sequence += 1
+            self._recent.append((self._sequence, frozenset(touched)))
+            stale = [
+                key for key, (_, entry) in self._entries.items()
+                if any(entry.scope.covers(vehicle_id, day) for vehicle_id, day in touched)
+            ]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sequence += 1
+            self._recent.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """Shared cache on a Redis server; TTL via PX, LRU via the server's maxmemory policy.
+
+    Each scope has a generation counter. Entries are hashes holding the value
+    and the generation of their scope when it was computed; an entry whose
+    generation is behind is a miss. Invalidation bumps the counters of the
+    covering scopes instead of deleting entries, so it never needs their keys.
+
+    The live scopes sit in a sorted set scored by when their last entry
+    expires (server time), so the set, the counters and the entries all
+    expire together. begin() registers the scope and reads its generation
+    before the report is computed, and set() stores the entry only if the
+    generation is unchanged, both in Lua scripts.
+    """
+    name = "redis"
+
+    # KEYS: scopes, generation; ARGV: scope token, ttl ms
+    BEGIN = """
+    local now = redis.call('TIME')
+    local expires = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000) + tonumber(ARGV[2])
+    local current = redis.call('ZSCORE', KEYS[1], ARGV[1])
+    if not current or tonumber(current) < expires then
+        redis.call('ZADD', KEYS[1], expires, ARGV[1])
+    end
+    return redis.call('GET', KEYS[2]) or '0'
+    """
+
+    # KEYS: entry, generation, scopes; ARGV: generation, value, ttl ms, scope token
+    SET = """
+    if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+        return 0
+    end
+    local now = redis.call('TIME')
+    local expires = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000) + tonumber(ARGV[3])
+    local current = redis.call('ZSCORE', KEYS[3], ARGV[4])
+    if not current or tonumber(current) < expires then
+        redis.call('ZADD', KEYS[3], expires, ARGV[4])
+    end
+    if redis.call('PTTL', KEYS[2]) >= 0 then
+        redis.call('PEXPIREAT', KEYS[2], expires)
+    end
+    redis.call('DEL', KEYS[1])
+    redis.call('HSET', KEYS[1], 'generation', ARGV[1], 'value', ARGV[2])
+    redis.call('PEXPIRE', KEYS[1], ARGV[3])
+    return 1
+    """
+
+    # KEYS: entry, generation
+    GET = """
+    local values = redis.call('HMGET', KEYS[1], 'generation', 'value')
+    if not values[1] or values[1] ~= (redis.call('GET', KEYS[2]) or '0') then
+        return false
+    end
+    return values[2]
+    """
+
+    # KEYS: scopes; returns the scopes that may still have entries
+    LIVE_SCOPES = """
+    local now = redis.call('TIME')
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000))
+    return redis.call('ZRANGE', KEYS[1], 0, -1)
+    """
+
+    # KEYS: scopes; ARGV: generation key prefix, scope tokens
+    BUMP = """
+    for i = 2, #ARGV do
+        local expires = redis.call('ZSCORE', KEYS[1], ARGV[i])
+        if expires then
+            local key = ARGV[1] .. ARGV[i]
+            redis.call('INCR', key)
+            redis.call('PEXPIREAT', key, expires)
+        end
+    end
+    return #ARGV - 1
+    """
+
+    def __init__(self, url: str, prefix: str = "fleetflow:report_cache"):
+        import redis
+
+        self.client = client = redis.from_url(url)
+        self.prefix = prefix
+        self.scopes_key = f"{prefix}:scopes"
+        self.evictions = 0
+        self._begin = client.register_script(self.BEGIN)
+        self._set = client.register_script(self.SET)
+        self._get = client.register_script(self.GET)
+        self._live_scopes = client.register_script(self.LIVE_SCOPES)
+        self._bump = client.register_script(self.BUMP)
+
+    def _entry_key(self, key: str) -> str:
+        return f"{self.prefix}:entry:{key}"
+
+    def _generation_key(self, scope: CacheScope) -> str:
+        return f"{self.prefix}:generation:{scope.token()}"
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        # The scope is part of the cache key, after the last "#"
+        scope = CacheScope.from_token(key.rsplit("#", 1)[1])
+        payload = self._get(keys=[self._entry_key(key), self._generation_key(scope)])
+        if payload is None:
+            return None
+        return pickle.loads(payload)
+
+    def begin(self, scope: CacheScope, ttl: float) -> str:
+        generation = self._begin(keys=[self.scopes_key, self._generation_key(scope)], args=[scope.token(), int(ttl * 1000)])
+        return generation.decode() if isinstance(generation, bytes) else str(generation)
+
+    def set(self, key: str, entry: CacheEntry, ttl: float, token: str) -> bool:
+        return bool(self._set(
+            keys=[self._entry_key(key), self._generation_key(entry.scope), self.scopes_key],
+            args=[token, pickle.dumps(entry), int(ttl * 1000), entry.scope.token()],
+        ))
+
+    def invalidate(self, touched: Set[TouchedKey]) -> int:
+        stale = []
+        for token in self._live_scopes(keys=[self.scopes_key]):
+            token = token.decode() if isinstance(token, bytes) else token
+            scope = CacheScope.from_token(token)
+            if any(scope.covers(vehicle_id, day) for vehicle_id, day in touched):
+                stale.append(token)
+        if stale:
+            self._bump(keys=[self.scopes_key], args=[f"{self.prefix}:generation:", *stale])
+        return len(stale)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(f"{self.prefix}:*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def __len__(self):
+        """Live scopes; entries themselves are not counted"""
+        return self.client.zcard(self.scopes_key)
+
+
+def _default_scope(arguments: dict) -> CacheScope:
+    return CacheScope(
+        vehicle_id=arguments.get("vehicle_id"),
+        start_date=arguments.get("start_date"),
+        end_date=arguments.get("end_date"),
+    )
+
+
+class ReportCache:
+    def __init__(self, backend, ttl: float = REPORT_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def cached(self, endpoint: str, scope: Callable[[dict], CacheScope] = _default_scope):
+        """Cache a report function by endpoint + arguments (the `db` session excluded)"""
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                arguments = {name: value for name, value in bound.arguments.items() if name != "db"}
+                entry_scope = scope(arguments)
+                key = self._key(endpoint, arguments, entry_scope)
+
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self._count("hits")
+                    return entry.value
+
+                self._count("misses")
+                # Taken before computing: an invalidation after this point keeps the result out
+                token = self.backend.begin(entry_scope, self.ttl)
+                value = func(*args, **kwargs)
+                self.backend.set(key, CacheEntry(value=value, scope=entry_scope), self.ttl, token)
+                return value
+
+            return wrapper
+        return decorator
+
+    def invalidate(self, touched: Iterable[TouchedKey]):
+        touched = set(touched)
+        if touched:
+            dropped = self.backend.invalidate(touched)
+            self._count("invalidations", dropped)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, object]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "evictions": self.backend.evictions,
+            "ttl_seconds": self.ttl,
+        }
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    @staticmethod
+    def _key(endpoint: str, arguments: dict, scope: CacheScope) -> str:
+        params = "&".join(f"{name}={arguments[name]}" for name in sorted(arguments))
+        return f"{endpoint}?{params}#{scope.token()}"
+
+
+def _create_backend():
+    if REPORT_CACHE_URL:
+        return RedisCacheBackend(REPORT_CACHE_URL)
+    return MemoryCacheBackend()
+
+
+report_cache = ReportCache(_create_backend())
+
+
+# ---- Write-driven invalidation ----
+# Touched keys are collected at flush time and applied only once the
+# transaction commits, so a reader that starts after the invalidation sees the
+# new data. A reader that computed before the commit is refused by set(),
+# because the invalidation came after its begin().
+
+_TOUCHED_INFO_KEY = "report_cache_touched"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_touched(session, flush_context):
+    touched = session.info.setdefault(_TOUCHED_INFO_KEY, set())
+    touched.update(touched_buckets(session))
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Vehicle) and obj.id is not None:
+            touched.add((obj.id, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    touched = session.info.pop(_TOUCHED_INFO_KEY, None)
+    if touched:
+        report_cache.invalidate(touched)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop(_TOUCHED_INFO_KEY, None)
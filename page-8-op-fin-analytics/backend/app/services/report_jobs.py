@@ -0,0 +1,182 @@
+"""
+Background report jobs with on-disk artifacts.
+
+Large exports are submitted as jobs, run on a bounded worker pool and written
+to REPORT_ARTIFACT_DIR, so the request that asked for them returns at once
+and no worker or DB connection is held while the client waits.
+
+Artifacts are named after a hash of the report type and parameters. A
+request with the same parameters reuses the finished file while it is
+younger than REPORT_ARTIFACT_MAX_AGE seconds, or joins the job that is
+already producing it. Artifacts older than that are deleted by a sweep
+that submit() runs at most every REPORT_ARTIFACT_SWEEP_SECONDS.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, IO, Optional
+
+REPORT_ARTIFACT_DIR = os.getenv("REPORT_ARTIFACT_DIR", os.path.join(tempfile.gettempdir(), "fleetflow_reports"))
+REPORT_ARTIFACT_MAX_AGE = float(os.getenv("REPORT_ARTIFACT_MAX_AGE", "3600"))
+REPORT_ARTIFACT_SWEEP_SECONDS = float(os.getenv("REPORT_ARTIFACT_SWEEP_SECONDS", "300"))
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "2"))
+REPORT_JOB_MAX_PENDING = int(os.getenv("REPORT_JOB_MAX_PENDING", "20"))
+REPORT_JOB_HISTORY = 500
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    """Raised when REPORT_JOB_MAX_PENDING jobs are already waiting or running"""
+
+
+@dataclass
+class ReportJob:
+    id: str
+    report_type: str
+    params: dict
+    artifact_key: str
+    filename: str
+    status: str = QUEUED
+    reused: bool = False
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class ReportJobRunner:
+    def __init__(self, artifact_dir: str = REPORT_ARTIFACT_DIR, max_workers: int = REPORT_JOB_WORKERS,
+                 max_pending: int = REPORT_JOB_MAX_PENDING, max_age: float = REPORT_ARTIFACT_MAX_AGE):
+        self.artifact_dir = artifact_dir
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-job")
+        self._jobs: "OrderedDict[str, ReportJob]" = OrderedDict()
+        self._active: Dict[str, ReportJob] = {}  # artifact key -> queued/running job
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def submit(self, report_type: str, params: dict, filename: str,
+               write: Callable[[IO[str]], None]) -> ReportJob:
+        """Queue `write(file)` unless a fresh artifact or an active job already covers the request"""
+        key = self.artifact_key(report_type, params)
+        self._sweep_if_due()
+        with self._lock:
+            active = self._active.get(key)
+            if active is not None:
+                return active
+
+            job = ReportJob(
+                id=uuid.uuid4().hex,
+                report_type=report_type,
+                params=params,
+                artifact_key=key,
+                filename=filename,
+            )
+            if self._is_fresh(self.artifact_path(job)):
+                job.status = COMPLETED
+                job.reused = True
+                job.finished_at = job.created_at
+            else:
+                if len(self._active) >= self.max_pending:
+                    raise JobQueueFull(f"{len(self._active)} report jobs already pending")
+                self._active[key] = job
+                self._executor.submit(self._run, job, write)
+            self._remember(job)
+            return job
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def artifact_path(self, job: ReportJob) -> str:
+        return os.path.join(self.artifact_dir, f"{job.artifact_key}.csv")
+
+    @staticmethod
+    def artifact_key(report_type: str, params: dict) -> str:
+        payload = json.dumps({"report_type": report_type, **params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _is_fresh(self, path: str) -> bool:
+        try:
+            return time.time() - os.path.getmtime(path) < self.max_age
+        except OSError:
+            return False
+
+    def sweep(self) -> int:
+        """Delete artifacts (and leftover temp files) older than max_age; returns how many"""
+        with self._lock:
+            active = set(self._active)
+        removed = 0
+        try:
+            names = os.listdir(self.artifact_dir)
+        except OSError:
+            return 0
+        for name in names:
+            if name.split(".", 1)[0] in active:
+                continue  # being rewritten right now
+            path = os.path.join(self.artifact_dir, name)
+            if not self._is_fresh(path):
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def _sweep_if_due(self):
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_sweep:
+                return
+            self._next_sweep = now + REPORT_ARTIFACT_SWEEP_SECONDS
+        self.sweep()
+
+    def _remember(self, job: ReportJob):
+        self._jobs[job.id] = job
+        excess = len(self._jobs) - REPORT_JOB_HISTORY
+        if excess <= 0:
+            return
+        # Oldest finished jobs go first; queued and running ones are kept
+        for job_id in [job_id for job_id, old in self._jobs.items() if old.status not in (QUEUED, RUNNING)][:excess]:
+            del self._jobs[job_id]
+
+    def _run(self, job: ReportJob, write: Callable[[IO[str]], None]):
+        job.status = RUNNING
+        job.started_at = datetime.utcnow()
+        path = self.artifact_path(job)
+        # Write next to the final path and rename, so a download never sees a partial file
+        tmp_path = f"{path}.{job.id}.tmp"
+        try:
+            os.makedirs(self.artifact_dir, exist_ok=True)
+            with open(tmp_path, "w", newline="", encoding="utf-8") as artifact:
+                write(artifact)
+            os.replace(tmp_path, path)
+            job.status = COMPLETED
+        except Exception as exc:
+            job.status = FAILED
+            job.error = str(exc)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        finally:
+            job.finished_at = datetime.utcnow()
+            with self._lock:
+                self._active.pop(job.artifact_key, None)
+
+
+report_jobs = ReportJobRunner()
@@ -0,0 +1,333 @@
+"""
+Daily per-vehicle rollup (`vehicle_daily_stats`) maintenance.
+
+The analytics reports read pre-aggregated day buckets instead of rescanning
+`trips`, `fuel_logs` and `expenses`. Buckets are kept current by a session
+`after_flush` hook: every (vehicle, day) bucket touched by a flushed Trip,
+FuelLog or Expense is recomputed from the raw rows inside the same
+transaction, so inserts, updates and deletes are all reflected exactly.
+The hook only sees this service's ORM writes. Writes from the main backend,
+Page 4 and bulk statements (`query.update()`, raw SQL) are picked up on
+PostgreSQL by database triggers that queue the touched buckets, which
+services/rollup_refresh.py drains in the background. On other databases run
+a rebuild after those.
+
+Backfill / rebuild from the command line (from page-8-op-fin-analytics/backend):
+    python -m app.services.rollup rebuild
+    python -m app.services.rollup check
+"""
+import argparse
+from datetime import date, datetime, timedelta
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, case, delete, event, func, inspect, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.vehicle import Vehicle
+from app.models.trip import Trip
+from app.models.fuel_log import FuelLog
+from app.models.expense import Expense
+from app.models.enums import TripStatus, ExpenseCategory
+from app.models.vehicle_daily_stats import VehicleDailyStats, UNDATED
+
+BucketKey = Tuple[int, date]
+
+# Source models and the datetime columns their rows are bucketed by
+TRACKED_DATE_COLUMNS = {
+    Trip: ("actual_end", "created_at"),
+    FuelLog: ("fill_date",),
+    Expense: ("expense_date",),
+}
+
+STAT_COLUMNS = [
+    c.name for c in VehicleDailyStats.__table__.columns
+    if c.name not in ("vehicle_id", "stat_date")
+]
+
+COUNT_COLUMNS = [name for name in STAT_COLUMNS if name.endswith("_count")]
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+EXPENSE_COLUMNS = {
+    category: (f"expense_{category.value}_amount", f"expense_{category.value}_count")
+    for category in ExpenseCategory
+}
+
+
+def as_stat_date(value) -> date:
+    """Normalise a datetime / DB date value to its bucket day"""
+    if value is None:
+        return UNDATED
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def _day_conditions(column, days: Set[date]):
+    """Restrict a datetime column to the given bucket days"""
+    conditions = []
+    for day in days:
+        if day == UNDATED:
+            conditions.append(column.is_(None))
+        else:
+            start = datetime.combine(day, datetime.min.time())
+            conditions.append(and_(column >= start, column < start + timedelta(days=1)))
+    return or_(*conditions)
+
+
+def _filters(column, vehicle_column, vehicle_ids, days):
+    conditions = []
+    if vehicle_ids is not None:
+        conditions.append(vehicle_column.in_(vehicle_ids))
+    if days is not None:
+        conditions.append(_day_conditions(column, days))
+    return conditions
+
+
+def _aggregate(connection, vehicle_ids: Optional[Iterable[int]] = None,
+               days: Optional[Set[date]] = None) -> Dict[BucketKey, dict]:
+    """Aggregate raw rows into day buckets with one grouped query per source"""
+    if vehicle_ids is not None:
+        vehicle_ids = list(vehicle_ids)
+    buckets: Dict[BucketKey, dict] = {}
+
+    def bucket(vehicle_id, day) -> dict:
+        key = (vehicle_id, as_stat_date(day))
+        if key not in buckets:
+            buckets[key] = dict.fromkeys(STAT_COLUMNS, 0)
+        return buckets[key]
+
+    completed = Trip.status == TripStatus.COMPLETED
+
+    def when(condition, value):
+        return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+    day = func.date(Trip.actual_end)
+    completed_trips = (
+        select(
+            Trip.vehicle_id,
+            day.label("day"),
+            func.count().label("completed_trip_count"),
+            func.coalesce(func.sum(Trip.distance_km), 0).label("completed_distance_km"),
+            func.coalesce(func.sum(Trip.revenue), 0).label("completed_revenue"),
+            func.coalesce(func.sum(Trip.trip_cost), 0).label("completed_trip_cost"),
+        )
+        .where(completed, *_filters(Trip.actual_end, Trip.vehicle_id, vehicle_ids, days))
+        .group_by(Trip.vehicle_id, day)
+    )
+    for row in connection.execute(completed_trips).mappings():
+        bucket(row["vehicle_id"], row["day"]).update({k: row[k] for k in row.keys() if k not in ("vehicle_id", "day")})
+
+    day = func.date(Trip.created_at)
+    created_trips = (
+        select(
+            Trip.vehicle_id,
+            day.label("day"),
+            func.count().label("created_trip_count"),
+            when(Trip.status == TripStatus.SCHEDULED, 1).label("created_scheduled_count"),
+            when(Trip.status == TripStatus.IN_PROGRESS, 1).label("created_in_progress_count"),
+            when(completed, 1).label("created_completed_count"),
+            when(Trip.status == TripStatus.CANCELLED, 1).label("created_cancelled_count"),
+            func.coalesce(func.sum(Trip.distance_km), 0).label("created_distance_km"),
+            func.coalesce(func.sum(Trip.revenue), 0).label("created_revenue"),
+            when(completed, func.coalesce(Trip.distance_km, 0)).label("created_completed_distance_km"),
+            when(completed, func.coalesce(Trip.revenue, 0)).label("created_completed_revenue"),
+            when(completed, func.coalesce(Trip.trip_cost, 0)).label("created_completed_trip_cost"),
+        )
+        .where(*_filters(Trip.created_at, Trip.vehicle_id, vehicle_ids, days))
+        .group_by(Trip.vehicle_id, day)
+    )
+    for row in connection.execute(created_trips).mappings():
+        bucket(row["vehicle_id"], row["day"]).update({k: row[k] for k in row.keys() if k not in ("vehicle_id", "day")})
+
+    day = func.date(FuelLog.fill_date)
+    fuel = (
+        select(
+            FuelLog.vehicle_id,
+            day.label("day"),
+            func.count().label("fuel_fill_count"),
+            func.coalesce(func.sum(FuelLog.fuel_amount_liters), 0).label("fuel_liters"),
+            func.coalesce(func.sum(FuelLog.fuel_cost), 0).label("fuel_cost"),
+        )
+        .where(*_filters(FuelLog.fill_date, FuelLog.vehicle_id, vehicle_ids, days))
+        .group_by(FuelLog.vehicle_id, day)
+    )
+    for row in connection.execute(fuel).mappings():
+        bucket(row["vehicle_id"], row["day"]).update({k: row[k] for k in row.keys() if k not in ("vehicle_id", "day")})
+
+    day = func.date(Expense.expense_date)
+    expenses = (
+        select(
+            Expense.vehicle_id,
+            day.label("day"),
+            Expense.category,
+            func.count().label("count"),
+            func.coalesce(func.sum(Expense.amount), 0).label("amount"),
+        )
+        .where(*_filters(Expense.expense_date, Expense.vehicle_id, vehicle_ids, days))
+        .group_by(Expense.vehicle_id, day, Expense.category)
+    )
+    for row in connection.execute(expenses):
+        amount_column, count_column = EXPENSE_COLUMNS[ExpenseCategory(row.category)]
+        stats = bucket(row.vehicle_id, row.day)
+        stats[amount_column] = row.amount
+        stats[count_column] = row.count
+
+    return buckets
+
+
+def _live_rows(buckets: Dict[BucketKey, dict]) -> List[dict]:
+    """Rows for the buckets that still count something, in key order"""
+    return [
+        {"vehicle_id": vehicle_id, "stat_date": stat_date, **stats}
+        for (vehicle_id, stat_date), stats in sorted(buckets.items())
+        if any(stats[name] for name in COUNT_COLUMNS)
+    ]
+
+
+def _write(connection, buckets: Dict[BucketKey, dict]):
+    rows = _live_rows(buckets)
+    if rows:
+        connection.execute(VehicleDailyStats.__table__.insert(), rows)
+
+
+def _upsert(connection, rows: List[dict]):
+    """Insert or overwrite bucket rows without failing on a concurrent writer"""
+    insert = UPSERT_INSERTS[connection.dialect.name]
+    statement = insert(VehicleDailyStats.__table__)
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=["vehicle_id", "stat_date"],
+            set_={name: statement.excluded[name] for name in STAT_COLUMNS},
+        ),
+        rows,
+    )
+
+
+def refresh_buckets(connection, keys: Set[BucketKey]):
+    """Recompute the given (vehicle_id, day) buckets from the raw tables
+
+    A request's after_flush hook and the background refresher can recompute
+    the same bucket at once, so live buckets are upserted (in key order, to
+    keep row locks from deadlocking) and only the emptied ones are deleted.
+    Whichever transaction writes last may hold a stale view, but the other's
+    write also queued the bucket, so the next refresh settles it.
+    """
+    if not keys:
+        return
+    buckets = _aggregate(
+        connection,
+        vehicle_ids={vehicle_id for vehicle_id, _ in keys},
+        days={stat_date for _, stat_date in keys},
+    )
+    rows = _live_rows({key: stats for key, stats in buckets.items() if key in keys})
+    if rows:
+        _upsert(connection, rows)
+    emptied = keys - {(row["vehicle_id"], row["stat_date"]) for row in rows}
+    if emptied:
+        table = VehicleDailyStats.__table__
+        connection.execute(delete(table).where(or_(*(
+            and_(table.c.vehicle_id == vehicle_id, table.c.stat_date == stat_date)
+            for vehicle_id, stat_date in sorted(emptied)
+        ))))
+
+
+def rebuild_vehicle_daily_stats(db: Session, batch_size: int = 500) -> int:
+    """Backfill / rebuild the whole rollup, a batch of vehicles at a time"""
+    connection = db.connection()
+    connection.execute(delete(VehicleDailyStats.__table__))
+    vehicle_ids = [vid for (vid,) in connection.execute(select(Vehicle.id).order_by(Vehicle.id))]
+    written = 0
+    for i in range(0, len(vehicle_ids), batch_size):
+        buckets = _aggregate(connection, vehicle_ids=vehicle_ids[i:i + batch_size])
+        _write(connection, buckets)
+        written += len(buckets)
+    db.commit()
+    return written
+
+
+def check_vehicle_daily_stats(db: Session, batch_size: int = 500) -> int:
+    """Compare the stored rollup with a fresh aggregation; returns mismatching buckets"""
+    connection = db.connection()
+    vehicle_ids = [vid for (vid,) in connection.execute(select(Vehicle.id).order_by(Vehicle.id))]
+    mismatches = 0
+    for i in range(0, len(vehicle_ids), batch_size):
+        batch = vehicle_ids[i:i + batch_size]
+        expected = {
+            key: stats for key, stats in _aggregate(connection, vehicle_ids=batch).items()
+            if any(stats[name] for name in COUNT_COLUMNS)
+        }
+        stored = {
+            (row.vehicle_id, as_stat_date(row.stat_date)): {name: getattr(row, name) for name in STAT_COLUMNS}
+            for row in connection.execute(
+                select(VehicleDailyStats.__table__).where(VehicleDailyStats.vehicle_id.in_(batch))
+            )
+        }
+        for key in expected.keys() | stored.keys():
+            want, have = expected.get(key), stored.get(key)
+            if want is None or have is None or any(
+                abs((want[name] or 0) - (have[name] or 0)) > 1e-6 for name in STAT_COLUMNS
+            ):
+                mismatches += 1
+    return mismatches
+
+
+def touched_buckets(session: Session) -> Set[BucketKey]:
+    """(vehicle_id, day) buckets affected by the pending new/dirty/deleted rows"""
+    keys: Set[BucketKey] = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        date_columns = TRACKED_DATE_COLUMNS.get(type(obj))
+        if date_columns is None:
+            continue
+        state = inspect(obj)
+
+        def values(attr):
+            history = state.attrs[attr].history
+            current = [getattr(obj, attr)]
+            return set(chain(current, history.deleted or ()))
+
+        vehicle_ids = {vid for vid in values("vehicle_id") if vid is not None}
+        days = {as_stat_date(value) for column in date_columns for value in values(column)}
+        keys.update((vid, day) for vid in vehicle_ids for day in days)
+    return keys
+
+
+@event.listens_for(Session, "after_flush")
+def _refresh_touched_buckets(session, flush_context):
+    keys = touched_buckets(session)
+    if keys:
+        refresh_buckets(session.connection(), keys)
+
+
+def main():
+    from app.database import SessionLocal, create_tables
+
+    parser = argparse.ArgumentParser(description="Maintain the vehicle_daily_stats rollup")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            written = rebuild_vehicle_daily_stats(db, args.batch_size)
+            print(f"Rebuilt vehicle_daily_stats: {written} buckets written.")
+        else:
+            mismatches = check_vehicle_daily_stats(db, args.batch_size)
+            print(f"vehicle_daily_stats check: {mismatches} mismatching buckets.")
+            raise SystemExit(1 if mismatches else 0)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
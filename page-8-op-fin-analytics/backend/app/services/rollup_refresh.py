@@ -0,0 +1,158 @@
+"""
+Keeps `vehicle_daily_stats` current under writes made by other services.
+
+The after_flush hook in services/rollup.py only sees this service's ORM
+writes. The main backend and Page 4 write trips, fuel logs and expenses too,
+so on PostgreSQL the rollup is also maintained from the database side:
+
+- statement-level triggers on the source tables insert every (vehicle, day)
+  bucket a statement touches, old and new values alike, into
+  `vehicle_daily_stats_dirty`, in the writer's own transaction;
+- RollupRefresher drains that queue every ROLLUP_REFRESH_SECONDS. It claims
+  up to ROLLUP_REFRESH_BATCH_ROWS rows with FOR UPDATE SKIP LOCKED, deletes
+  them, recomputes their buckets in the same transaction, and then drops the
+  cached reports over those buckets.
+
+The queue works like an outbox: an entry exists once its write commits, and
+a failed refresh rolls back, so the rows are claimed again on the next run.
+Several workers can drain at once. Writes made through this service are
+queued as well; refreshing them a second time is harmless.
+
+Other databases get no triggers. There, run `python -m app.services.rollup
+rebuild` after writes from other services.
+"""
+import logging
+import os
+import threading
+from typing import Optional, Set
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.database import SessionLocal
+from app.models.vehicle_daily_stats import VehicleDailyStatsDirty, UNDATED
+from app.services.report_cache import report_cache
+from app.services.rollup import TRACKED_DATE_COLUMNS, BucketKey, as_stat_date, refresh_buckets
+
+ROLLUP_REFRESH_SECONDS = float(os.getenv("ROLLUP_REFRESH_SECONDS", "30"))
+ROLLUP_REFRESH_BATCH_ROWS = int(os.getenv("ROLLUP_REFRESH_BATCH_ROWS", "5000"))
+
+logger = logging.getLogger(__name__)
+
+QUEUE_TABLE = VehicleDailyStatsDirty.__tablename__
+
+# Transition tables need one trigger per event
+TRIGGER_EVENTS = {
+    "insert": ("INSERT", "NEW TABLE AS new_rows"),
+    "update": ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+    "delete": ("DELETE", "OLD TABLE AS old_rows"),
+}
+
+
+def _queued_buckets(rows: str, date_columns) -> str:
+    return " UNION ".join(
+        f"SELECT vehicle_id, COALESCE(CAST({column} AS DATE), DATE '{UNDATED.isoformat()}') "
+        f"FROM {rows} WHERE vehicle_id IS NOT NULL"
+        for column in date_columns
+    )
+
+
+def _trigger_function(table: str, date_columns) -> str:
+    return f"""
+    CREATE OR REPLACE FUNCTION {QUEUE_TABLE}_{table}() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            INSERT INTO {QUEUE_TABLE} (vehicle_id, stat_date) {_queued_buckets("old_rows", date_columns)};
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO {QUEUE_TABLE} (vehicle_id, stat_date) {_queued_buckets("new_rows", date_columns)};
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """
+
+
+def install_change_triggers(connection) -> int:
+    """Create the queueing triggers that are missing (PostgreSQL only); returns how many"""
+    existing = set(connection.execute(text("SELECT tgname FROM pg_trigger WHERE NOT tgisinternal")).scalars())
+    created = 0
+    for model, date_columns in TRACKED_DATE_COLUMNS.items():
+        table = model.__table__.name
+        connection.execute(text(_trigger_function(table, date_columns)))
+        for suffix, (operation, transitions) in TRIGGER_EVENTS.items():
+            name = f"{QUEUE_TABLE}_{table}_{suffix}"
+            if name in existing:
+                continue
+            connection.execute(text(
+                f"CREATE TRIGGER {name} AFTER {operation} ON {table} "
+                f"REFERENCING {transitions} FOR EACH STATEMENT "
+                f"EXECUTE FUNCTION {QUEUE_TABLE}_{table}()"
+            ))
+            created += 1
+    return created
+
+
+class RollupRefresher:
+    def __init__(self, session_factory, interval: float = ROLLUP_REFRESH_SECONDS,
+                 batch_rows: int = ROLLUP_REFRESH_BATCH_ROWS):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.batch_rows = batch_rows
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Install the triggers and start draining the queue in the background (PostgreSQL only)"""
+        if self._thread and self._thread.is_alive():
+            return
+        db = self.session_factory()
+        try:
+            if db.get_bind().dialect.name != "postgresql":
+                return   # no triggers, nothing is ever queued
+            created = install_change_triggers(db.connection())
+            db.commit()
+            if created:
+                logger.info("Installed %d rollup change trigger(s)", created)
+        finally:
+            db.close()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rollup-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self) -> int:
+        """Refresh one batch of queued buckets; returns how many queue rows it took"""
+        queue = VehicleDailyStatsDirty.__table__
+        db = self.session_factory()
+        try:
+            connection = db.connection()
+            claimed = (
+                select(queue.c.id).order_by(queue.c.id).limit(self.batch_rows)
+                .with_for_update(skip_locked=True)
+            )
+            rows = connection.execute(
+                delete(queue).where(queue.c.id.in_(claimed)).returning(queue.c.vehicle_id, queue.c.stat_date)
+            ).all()
+            keys: Set[BucketKey] = {(row.vehicle_id, as_stat_date(row.stat_date)) for row in rows}
+            refresh_buckets(connection, keys)
+            db.commit()
+        finally:
+            db.close()
+        report_cache.invalidate(keys)
+        return len(rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                while self.run_once() >= self.batch_rows and not self._stop.is_set():
+                    pass
+            except SQLAlchemyError:
+                # e.g. a lost connection; the rows are claimed again next time
+                logger.exception("Rollup refresh failed")
+            self._stop.wait(self.interval)
+
+
+rollup_refresher = RollupRefresher(SessionLocal)
@@ -0,0 +1,429 @@
+"""
+Scheduling index: when each vehicle and driver is booked.
+
+Page 8 knows drivers only by name. For every vehicle and every driver, the
+index holds the upcoming trips: SCHEDULED and IN_PROGRESS trips that have
+both a scheduled_start and a scheduled_end and that end after the index
+was loaded. Overlapping trips merge into one busy block, and the disjoint
+blocks sit in a treap ordered by start. Each node also records the idle gap
+before its block and the largest gap in its subtree. That answers:
+
+- "is [T1, T2) free?" with one descent, because only the last block that
+  starts before T2 can reach past T1;
+- "next free slot of length D at or after T" with a descent to T plus a
+  search for the leftmost gap >= D, guided by the subtree maxima.
+
+Both are O(log n) in the number of blocks. Booking or cancelling a trip
+splits out the blocks it touches, re-merges them and joins the treap back
+together. That is also O(log n), plus the trips that share those blocks.
+
+Trip writes are collected from the ORM flush and applied when the
+transaction commits, like the rollup and report cache hooks. Writes from
+other workers show up when the index is reloaded, every
+SCHEDULE_INDEX_RELOAD_SECONDS. Creating a trip therefore checks the
+database before it accepts or rejects a window, and drops the index when the
+two disagree (see routes/schedule.py).
+"""
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import chain
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.trip import Trip
+from app.models.enums import TripStatus
+
+SCHEDULE_INDEX_RELOAD_SECONDS = float(os.getenv("SCHEDULE_INDEX_RELOAD_SECONDS", "60"))
+
+# Trips that occupy their vehicle and driver for the scheduled window
+BOOKED_STATUSES = (TripStatus.SCHEDULED, TripStatus.IN_PROGRESS)
+
+INF = float("inf")
+EPOCH = datetime(1970, 1, 1)
+
+Span = Tuple[float, float]  # (start, end) in seconds since EPOCH
+
+
+def as_utc_naive(value: datetime) -> datetime:
+    """Trip times are stored as naive UTC"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def to_seconds(value: datetime) -> float:
+    return (as_utc_naive(value) - EPOCH).total_seconds()
+
+
+def from_seconds(value: float) -> datetime:
+    return EPOCH + timedelta(seconds=value)
+
+
+# ---- Treap of disjoint busy blocks ----
+
+class _Block:
+    __slots__ = ("start", "end", "trips", "gap", "max_gap", "priority", "left", "right")
+
+    def __init__(self, start: float, end: float, trips: Dict[int, Span]):
+        self.start = start
+        self.end = end
+        self.trips = trips      # trip id -> span, the trips merged into this block
+        self.gap = INF          # idle time since the previous block; INF for the first one
+        self.max_gap = INF      # largest gap in this subtree
+        self.priority = random.random()
+        self.left: Optional["_Block"] = None
+        self.right: Optional["_Block"] = None
+
+
+def _update(node: _Block):
+    node.max_gap = max(
+        node.gap,
+        node.left.max_gap if node.left else -INF,
+        node.right.max_gap if node.right else -INF,
+    )
+
+
+def _split(node: Optional[_Block], key: float, inclusive: bool = False):
+    """(blocks starting before key [or at it], the rest)"""
+    if node is None:
+        return None, None
+    if node.start < key or (inclusive and node.start == key):
+        node.right, rest = _split(node.right, key, inclusive)
+        _update(node)
+        return node, rest
+    rest, node.left = _split(node.left, key, inclusive)
+    _update(node)
+    return rest, node
+
+
+def _merge(a: Optional[_Block], b: Optional[_Block]) -> Optional[_Block]:
+    """Join two treaps; every block of a starts before every block of b"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a.priority > b.priority:
+        a.right = _merge(a.right, b)
+        _update(a)
+        return a
+    b.left = _merge(a, b.left)
+    _update(b)
+    return b
+
+
+def _first(node: _Block) -> _Block:
+    while node.left is not None:
+        node = node.left
+    return node
+
+
+def _last(node: _Block) -> _Block:
+    while node.right is not None:
+        node = node.right
+    return node
+
+
+def _set_first_gap(node: _Block, gap: float) -> _Block:
+    if node.left is None:
+        node.gap = gap
+    else:
+        _set_first_gap(node.left, gap)
+    _update(node)
+    return node
+
+
+def _walk(node: Optional[_Block]):
+    if node is not None:
+        yield from _walk(node.left)
+        yield node
+        yield from _walk(node.right)
+
+
+def _range(node: Optional[_Block], low: float, high: float):
+    """Blocks starting in [low, high), in order"""
+    if node is None:
+        return
+    if node.start >= low:
+        yield from _range(node.left, low, high)
+        if node.start < high:
+            yield node
+    if node.start < high:
+        yield from _range(node.right, low, high)
+
+
+def _floor(node: Optional[_Block], key: float, inclusive: bool = False) -> Optional[_Block]:
+    """Last block starting before key (or at it)"""
+    found = None
+    while node is not None:
+        if node.start < key or (inclusive and node.start == key):
+            found, node = node, node.right
+        else:
+            node = node.left
+    return found
+
+
+def _ceil(node: Optional[_Block], key: float) -> Optional[_Block]:
+    """First block starting at or after key"""
+    found = None
+    while node is not None:
+        if node.start >= key:
+            found, node = node, node.left
+        else:
+            node = node.right
+    return found
+
+
+def _first_gap(node: Optional[_Block], key: float, length: float) -> Optional[_Block]:
+    """Leftmost block starting after key whose preceding gap is at least length"""
+    if node is None or node.max_gap < length:
+        return None
+    if node.start > key:
+        found = _first_gap(node.left, key, length)
+        if found is not None:
+            return found
+        if node.gap >= length:
+            return node
+    return _first_gap(node.right, key, length)
+
+
+def _build_blocks(trips: Dict[int, Span]) -> List[_Block]:
+    """Merge spans into disjoint blocks, in order"""
+    blocks: List[_Block] = []
+    for trip_id, (start, end) in sorted(trips.items(), key=lambda item: item[1]):
+        if blocks and start < blocks[-1].end:
+            block = blocks[-1]
+            block.end = max(block.end, end)
+            block.trips[trip_id] = (start, end)
+        else:
+            blocks.append(_Block(start, end, {trip_id: (start, end)}))
+    return blocks
+
+
+class Timeline:
+    """Busy time of one vehicle or driver"""
+
+    def __init__(self):
+        self._root: Optional[_Block] = None
+        self._trips: Dict[int, Span] = {}
+
+    def __len__(self):
+        return len(self._trips)
+
+    def _join(self, before: Optional[_Block], blocks: List[_Block], after: Optional[_Block]):
+        previous_end = _last(before).end if before is not None else None
+        root = before
+        for block in blocks:
+            block.gap = block.start - previous_end if previous_end is not None else INF
+            block.max_gap = block.gap
+            previous_end = block.end
+            root = _merge(root, block)
+        if after is not None:
+            after = _set_first_gap(after, _first(after).start - previous_end if previous_end is not None else INF)
+        self._root = _merge(root, after)
+
+    def add(self, trip_id: int, start: float, end: float):
+        self.remove(trip_id)
+        if end <= start:
+            return
+        self._trips[trip_id] = (start, end)
+
+        before, after = _split(self._root, start)
+        touching = None
+        if before is not None and _last(before).end > start:
+            # The last block starting before the trip reaches into it
+            before, touching = _split(before, _last(before).start)
+        inside, after = _split(after, end)
+
+        trips = {trip_id: (start, end)}
+        for block in chain(_walk(touching), _walk(inside)):
+            trips.update(block.trips)
+        self._join(before, _build_blocks(trips), after)
+
+    def remove(self, trip_id: int):
+        span = self._trips.pop(trip_id, None)
+        if span is None:
+            return
+        start, _ = span
+        before, after = _split(self._root, start, inclusive=True)
+        before, block = _split(before, _last(before).start)
+        block.trips.pop(trip_id, None)
+        self._join(before, _build_blocks(block.trips), after)
+
+    def is_free(self, start: float, end: float) -> bool:
+        block = _floor(self._root, end)
+        return block is None or block.end <= start
+
+    def conflicts(self, start: float, end: float) -> List[int]:
+        """Trips overlapping [start, end)"""
+        if self.is_free(start, end):
+            return []
+        first = _floor(self._root, start, inclusive=True)
+        low = first.start if first is not None else start
+        return sorted(
+            trip_id
+            for block in _range(self._root, low, end)
+            for trip_id, (s, e) in block.trips.items()
+            if s < end and e > start
+        )
+
+    def next_free(self, after: float, length: float) -> float:
+        """Earliest t >= after such that [t, t + length) is free"""
+        t = after
+        block = _floor(self._root, t, inclusive=True)
+        if block is not None and block.end > t:
+            t = block.end
+        following = _ceil(self._root, t)
+        if following is None or following.start - t >= length:
+            return t
+        gap_block = _first_gap(self._root, following.start, length)
+        if gap_block is None:
+            return _last(self._root).end
+        return gap_block.start - gap_block.gap  # end of the block before the gap
+
+
+# ---- Per vehicle / per driver index ----
+
+_EMPTY = Timeline()
+
+
+class ScheduleIndex:
+    def __init__(self, reload_seconds: float = SCHEDULE_INDEX_RELOAD_SECONDS, clock=time.monotonic):
+        self.reload_seconds = reload_seconds
+        self._clock = clock
+        self._vehicles: Dict[int, Timeline] = {}
+        self._drivers: Dict[str, Timeline] = {}
+        self._booked: Dict[int, Tuple[int, Optional[str]]] = {}  # trip id -> (vehicle id, driver name)
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def load(self, db: Session):
+        rows = db.query(
+            Trip.id, Trip.vehicle_id, Trip.driver_name, Trip.scheduled_start, Trip.scheduled_end
+        ).filter(
+            Trip.status.in_(BOOKED_STATUSES),
+            Trip.scheduled_start.isnot(None),
+            Trip.scheduled_end > datetime.utcnow(),
+        ).all()
+        with self._lock:
+            self._vehicles, self._drivers, self._booked = {}, {}, {}
+            for row in rows:
+                self._book(row.id, row.vehicle_id, row.driver_name, row.scheduled_start, row.scheduled_end)
+            self._loaded_at = self._clock()
+
+    def ensure_fresh(self, db: Session):
+        if not self.loaded or self._clock() - self._loaded_at >= self.reload_seconds:
+            self.load(db)
+
+    def invalidate(self):
+        """Reload on next use (e.g. the database showed a booking the index missed)"""
+        self._loaded_at = None
+
+    def _book(self, trip_id, vehicle_id, driver_name, start: datetime, end: datetime):
+        span = (to_seconds(start), to_seconds(end))
+        self._vehicles.setdefault(vehicle_id, Timeline()).add(trip_id, *span)
+        if driver_name:
+            self._drivers.setdefault(driver_name, Timeline()).add(trip_id, *span)
+        self._booked[trip_id] = (vehicle_id, driver_name)
+
+    def _unbook(self, trip_id):
+        booked = self._booked.pop(trip_id, None)
+        if booked is None:
+            return
+        vehicle_id, driver_name = booked
+        for timelines, key in ((self._vehicles, vehicle_id), (self._drivers, driver_name)):
+            timeline = timelines.get(key)
+            if timeline is not None:
+                timeline.remove(trip_id)
+                if not timeline:
+                    del timelines[key]
+
+    def update(self, trip_id: int, booking: Optional[tuple]):
+        """Place the trip at (vehicle_id, driver_name, start, end), or drop it when booking is None"""
+        with self._lock:
+            self._unbook(trip_id)
+            if booking is not None:
+                self._book(trip_id, *booking)
+
+    def _timelines(self, vehicle_id: Optional[int], driver_name: Optional[str]) -> List[Timeline]:
+        timelines = []
+        if vehicle_id is not None:
+            timelines.append(self._vehicles.get(vehicle_id, _EMPTY))
+        if driver_name:
+            timelines.append(self._drivers.get(driver_name, _EMPTY))
+        return timelines
+
+    def conflicts(self, vehicle_id: Optional[int], driver_name: Optional[str],
+                  start: datetime, end: datetime) -> Tuple[List[int], List[int]]:
+        """(trips holding the vehicle, trips holding the driver) during [start, end)"""
+        span = (to_seconds(start), to_seconds(end))
+        with self._lock:
+            vehicle = self._vehicles.get(vehicle_id, _EMPTY).conflicts(*span) if vehicle_id is not None else []
+            driver = self._drivers.get(driver_name, _EMPTY).conflicts(*span) if driver_name else []
+        return vehicle, driver
+
+    def is_free(self, vehicle_id: Optional[int], driver_name: Optional[str], start: datetime, end: datetime) -> bool:
+        span = (to_seconds(start), to_seconds(end))
+        with self._lock:
+            return all(timeline.is_free(*span) for timeline in self._timelines(vehicle_id, driver_name))
+
+    def next_free(self, vehicle_id: Optional[int], driver_name: Optional[str],
+                  after: datetime, duration: timedelta) -> datetime:
+        """Earliest start at or after `after` when the vehicle and the driver are both free for duration"""
+        t, length = to_seconds(after), duration.total_seconds()
+        with self._lock:
+            timelines = self._timelines(vehicle_id, driver_name)
+            # Each round moves t past a busy block of one of them, until both agree
+            while True:
+                candidate = t
+                for timeline in timelines:
+                    candidate = timeline.next_free(candidate, length)
+                if candidate == t:
+                    return from_seconds(t)
+                t = candidate
+
+
+schedule_index = ScheduleIndex()
+
+
+# ---- Keeping the index in sync ----
+
+_PENDING_INFO_KEY = "schedule_index_changes"
+
+
+def _booking(trip: Trip) -> Optional[tuple]:
+    if trip.status not in BOOKED_STATUSES or trip.scheduled_start is None or trip.scheduled_end is None:
+        return None
+    return trip.vehicle_id, trip.driver_name, trip.scheduled_start, trip.scheduled_end
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_trip_changes(session, flush_context):
+    changes = None
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, Trip):
+            continue
+        if changes is None:
+            changes = session.info.setdefault(_PENDING_INFO_KEY, {})
+        changes[obj.id] = None if obj in session.deleted else _booking(obj)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_trip_changes(session):
+    changes = session.info.pop(_PENDING_INFO_KEY, None)
+    if changes and schedule_index.loaded:
+        for trip_id, booking in changes.items():
+            schedule_index.update(trip_id, booking)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_trip_changes(session):
+    session.info.pop(_PENDING_INFO_KEY, None)
@@ -0,0 +1 @@
+# Benchmarks for Page 8 analytics
@@ -0,0 +1,171 @@
+"""
+Benchmark: Vehicle ROI report, per-vehicle queries vs. grouped aggregation.
+
+Seeds a throwaway database with a synthetic fleet, builds the daily rollup,
+and times the old per-vehicle implementation (three queries and full ORM
+hydration per vehicle) against the current `get_vehicle_roi_report`, counting
+the SQL statements each one issues.
+
+Usage (from page-8-op-fin-analytics/backend):
+    python -m benchmarks.bench_vehicle_roi --vehicles 4000 --trips 20 --fuel 10 --expenses 5
+
+DATABASE_URL defaults to a local SQLite file so the script never touches a
+shared database by accident.
+"""
+import argparse
+import os
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench_analytics.db")
+
+from sqlalchemy import event
+
+from app.database import Base, SessionLocal, engine
+from app.models import Vehicle, Trip, FuelLog, Expense, VehicleType, TripStatus, ExpenseCategory
+from app.routes.analytics import get_vehicle_roi_report
+from app.services.rollup import rebuild_vehicle_daily_stats
+
+
+def seed(db, vehicles: int, trips: int, fuel: int, expenses: int):
+    """Populate a fresh schema with a deterministic synthetic fleet"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    rng = random.Random(42)
+    epoch = datetime(2025, 1, 1)
+    categories = [c for c in ExpenseCategory if c != ExpenseCategory.FUEL]
+
+    db.bulk_insert_mappings(Vehicle, [
+        {
+            "id": vid,
+            "registration_number": f"BENCH-{vid:06d}",
+            "make": "Make",
+            "model": "Model",
+            "year": 2020,
+            "vehicle_type": VehicleType.TRUCK,
+            "purchase_price": rng.uniform(20000, 90000),
+            "current_value": rng.uniform(5000, 20000),
+        }
+        for vid in range(1, vehicles + 1)
+    ])
+
+    trip_rows, fuel_rows, expense_rows = [], [], []
+    for vid in range(1, vehicles + 1):
+        for _ in range(trips):
+            end = epoch + timedelta(minutes=rng.randrange(365 * 24 * 60))
+            trip_rows.append({
+                "vehicle_id": vid,
+                "distance_km": rng.uniform(5, 800),
+                "actual_start": end - timedelta(hours=6),
+                "actual_end": end,
+                "status": rng.choice([TripStatus.COMPLETED] * 4 + [TripStatus.CANCELLED]),
+                "trip_cost": rng.uniform(10, 300),
+                "revenue": rng.uniform(100, 2000),
+                "created_at": end - timedelta(days=1),
+            })
+        for _ in range(fuel):
+            fuel_rows.append({
+                "vehicle_id": vid,
+                "fuel_amount_liters": rng.uniform(20, 200),
+                "fuel_cost": rng.uniform(30, 400),
+                "odometer_at_fill": rng.uniform(0, 200000),
+                "fill_date": epoch + timedelta(minutes=rng.randrange(365 * 24 * 60)),
+            })
+        for _ in range(expenses):
+            expense_rows.append({
+                "vehicle_id": vid,
+                "category": rng.choice(categories),
+                "amount": rng.uniform(5, 1500),
+                "expense_date": epoch + timedelta(minutes=rng.randrange(365 * 24 * 60)),
+            })
+
+    db.bulk_insert_mappings(Trip, trip_rows)
+    db.bulk_insert_mappings(FuelLog, fuel_rows)
+    db.bulk_insert_mappings(Expense, expense_rows)
+    db.commit()
+    rebuild_vehicle_daily_stats(db)
+
+
+def legacy_vehicle_roi(db, start_date, end_date):
+    """The previous implementation: three queries per vehicle, summed in Python"""
+    result = []
+    for vehicle in db.query(Vehicle).all():
+        trip_query = db.query(Trip).filter(Trip.vehicle_id == vehicle.id, Trip.status == TripStatus.COMPLETED)
+        expense_query = db.query(Expense).filter(Expense.vehicle_id == vehicle.id)
+        fuel_query = db.query(FuelLog).filter(FuelLog.vehicle_id == vehicle.id)
+        if start_date:
+            trip_query = trip_query.filter(Trip.actual_end >= datetime.combine(start_date, datetime.min.time()))
+            expense_query = expense_query.filter(Expense.expense_date >= datetime.combine(start_date, datetime.min.time()))
+            fuel_query = fuel_query.filter(FuelLog.fill_date >= datetime.combine(start_date, datetime.min.time()))
+        if end_date:
+            trip_query = trip_query.filter(Trip.actual_end <= datetime.combine(end_date, datetime.max.time()))
+            expense_query = expense_query.filter(Expense.expense_date <= datetime.combine(end_date, datetime.max.time()))
+            fuel_query = fuel_query.filter(FuelLog.fill_date <= datetime.combine(end_date, datetime.max.time()))
+
+        trips = trip_query.all()
+        revenue = sum(t.revenue or 0 for t in trips)
+        expense_total = (
+            sum(t.trip_cost or 0 for t in trips)
+            + sum(e.amount or 0 for e in expense_query.all())
+            + sum(f.fuel_cost or 0 for f in fuel_query.all())
+        )
+        result.append((vehicle.id, round(revenue, 2), round(expense_total, 2)))
+    return result
+
+
+@contextmanager
+def count_queries():
+    counter = {"queries": 0}
+
+    def before_cursor_execute(*args):
+        counter["queries"] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def measure(label, fn):
+    with count_queries() as counter:
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+    print(f"{label:<28} {counter['queries']:>8} queries {elapsed * 1000:>10.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vehicles", type=int, default=500)
+    parser.add_argument("--trips", type=int, default=20, help="trips per vehicle")
+    parser.add_argument("--fuel", type=int, default=10, help="fuel logs per vehicle")
+    parser.add_argument("--expenses", type=int, default=5, help="expenses per vehicle")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        print(f"Seeding {args.vehicles} vehicles into {engine.url} ...")
+        seed(db, args.vehicles, args.trips, args.fuel, args.expenses)
+
+        start, end = date(2025, 3, 1), date(2025, 9, 30)
+        legacy = measure("before (per-vehicle)", lambda: legacy_vehicle_roi(db, start, end))
+        db.expire_all()
+        report = measure("after (grouped)", lambda: get_vehicle_roi_report(start, end, None, db))
+
+        current = [(v.vehicle_id, v.total_revenue, v.total_expenses) for v in report.vehicles]
+        mismatches = sum(
+            1 for old, new in zip(sorted(legacy), current)
+            if abs(old[1] - new[1]) > 0.01 or abs(old[2] - new[2]) > 0.01
+        )
+        print(f"vehicles compared: {len(current)}, mismatches: {mismatches}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()